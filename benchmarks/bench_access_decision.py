@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Access Decision Benchmark
+Compares the original dict/list-scan access check with the compiled-matrix
+decide_access path (and check_user_access, which now delegates to it).
+
+Usage: python -m benchmarks.bench_access_decision [--users N] [--doors N]
+"""
+import argparse
+import json
+import random
+import tempfile
+
+from benchmarks.common import load_service, time_calls
+from benchmarks.generate_dataset import generate_dataset
+
+
+def legacy_check_user_access(service, user_id: str, door_id: str) -> dict:
+    """The pre-matrix check_user_access, kept as the benchmark baseline."""
+    if user_id not in service.users:
+        return {"authorized": False, "reason": "User not found"}
+    if door_id not in service.doors:
+        return {"authorized": False, "reason": "Door not found"}
+    user = service.users[user_id]
+    door = service.doors[door_id]
+    if not user.is_active:
+        return {"authorized": False, "reason": "User account is inactive"}
+    if not user.face_registered:
+        return {"authorized": False, "reason": "Face not registered"}
+    if hasattr(user, 'authorized_doors') and user.authorized_doors:
+        if door_id in user.authorized_doors:
+            return {"authorized": True, "user": user, "door": door,
+                    "building": service.buildings.get(door.building_id)}
+    return {"authorized": False, "reason": "User not authorized for this door"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--buildings", type=int, default=50)
+    parser.add_argument("--doors", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--samples", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_dataset(data_dir, args.buildings, args.doors, args.users)
+        service = load_service(data_dir)
+
+        rng = random.Random(7)
+        user_ids = list(service.users)
+        door_ids = list(service.doors)
+        pairs = []
+        for _ in range(args.samples):
+            user_id = rng.choice(user_ids)
+            authorized = service.users[user_id].authorized_doors
+            # Half granted, half random (mostly denied) pairs
+            if authorized and rng.random() < 0.5:
+                pairs.append((user_id, rng.choice(authorized)))
+            else:
+                pairs.append((user_id, rng.choice(door_ids)))
+
+        mismatches = sum(
+            1 for u, d in pairs
+            if legacy_check_user_access(service, u, d)["authorized"] != (service.decide_access(u, d).value == "granted")
+        )
+        results = {
+            "legacy_check_user_access": time_calls(lambda u, d: legacy_check_user_access(service, u, d), pairs),
+            "check_user_access": time_calls(service.check_user_access, pairs),
+            "decide_access": time_calls(service.decide_access, pairs),
+            "mismatches": mismatches,
+        }
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
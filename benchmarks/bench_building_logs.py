@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-Building Log Saves Benchmark
+Runs several worker processes over one data directory, each recording
+face recognition events (append + save) as fast as it can, first with
+every worker on a door of the same building and then with each worker in
+its own building. Access logs are saved per building under per-building
+locks, so the second run should scale with the number of workers while
+the first serializes on one building's lock and file.
+
+Usage: python -m benchmarks.bench_building_logs [--workers N] [--seconds N]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.common import load_service
+from benchmarks.generate_dataset import generate_dataset
+
+
+def worker(data_dir: str, door_id: str, user_id: str, seconds: float, start_at: float, results):
+    logging.disable(logging.CRITICAL)
+    service = load_service(data_dir)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    events = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        service.process_face_recognition_access(user_id, 0.9, door_id)
+        events += 1
+    results.put(events)
+
+
+def run(data_dir: str, placements: List[Dict[str, str]], seconds: float) -> Dict[str, float]:
+    results = multiprocessing.Queue()
+    # Start together once every worker has loaded the service
+    start_at = time.time() + 3.0
+    processes = [multiprocessing.Process(target=worker, args=(data_dir, p["door_id"], p["user_id"],
+                                                              seconds, start_at, results))
+                 for p in placements]
+    for process in processes:
+        process.start()
+    counts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {"workers": len(processes), "events": sum(counts),
+            "events_per_second": round(sum(counts) / seconds, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--logs", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_dataset(data_dir, buildings=args.workers, doors=args.workers * 10, users=args.users,
+                         logs=args.logs)
+        service = load_service(data_dir)
+        # One granted user/door pair per building
+        placements = {}
+        for user in service.users.values():
+            for door_id in user.authorized_doors:
+                building_id = service.doors[door_id].building_id
+                placements.setdefault(building_id, {"door_id": door_id, "user_id": user.id})
+        placements = list(placements.values())[:args.workers]
+
+        results = {
+            "same_building": run(data_dir, [placements[0]] * args.workers, args.seconds),
+            "separate_buildings": run(data_dir, placements, args.seconds),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cold Start Benchmark
+Compares service start-up from the JSON data files with start-up from the
+latest snapshot plus a journal tail, and times decoding users.json record
+by record (json.load, then one model per row) against decoding and
+validating it in one pass in pydantic-core, as the service does.
+
+Usage: python -m benchmarks.bench_cold_start [--users N] [--doors N] [--tail N]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from benchmarks.common import load_service
+from benchmarks.generate_dataset import generate_dataset
+from src.app.core.config import settings
+from src.app.models.door_access import User
+
+
+def time_start(data_dir: str, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load_service(data_dir)
+        runs.append(time.perf_counter() - start)
+    return {"seconds_median": statistics.median(runs), "seconds_min": min(runs)}
+
+
+def time_decode(path: str, repeat: int) -> dict:
+    adapter = TypeAdapter(List[User])
+
+    def per_record():
+        with open(path, 'r') as f:
+            return [User(**row) for row in json.load(f)]
+
+    def one_pass():
+        with open(path, 'rb') as f:
+            return adapter.validate_json(f.read())
+
+    results = {}
+    for name, decode in (("per_record", per_record), ("one_pass", one_pass)):
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            decode()
+            runs.append(time.perf_counter() - start)
+        results[name] = {"seconds_median": statistics.median(runs), "seconds_min": min(runs)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--buildings", type=int, default=50)
+    parser.add_argument("--doors", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--tail", type=int, default=500, help="journal events after the snapshot")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_dataset(data_dir, args.buildings, args.doors, args.users)
+
+        decode_users = time_decode(os.path.join(data_dir, "users.json"), args.repeat)
+        settings.journal_enabled = False
+        json_files = time_start(data_dir, args.repeat)
+
+        # First journaled start writes the baseline snapshot; then build a tail
+        settings.journal_enabled = True
+        settings.journal_snapshot_interval = args.tail + 1
+        service = load_service(data_dir)
+        rng = random.Random(3)
+        user_ids, door_ids = list(service.users), list(service.doors)
+        with service.batch():
+            for _ in range(args.tail):
+                service.authorize_user_for_doors(rng.choice(user_ids), rng.sample(door_ids, 3))
+        snapshot_tail = time_start(data_dir, args.repeat)
+
+        print(json.dumps({
+            "dataset": {"buildings": args.buildings, "doors": args.doors, "users": args.users},
+            "tail_events": service._journal.pending,
+            "json_files": json_files,
+            "snapshot_plus_tail": snapshot_tail,
+            "decode_users": decode_users,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
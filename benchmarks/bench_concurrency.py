@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrency Stress Benchmark
+Runs reader threads against writer threads that create, re-authorize and
+delete users, and reports throughput, errors and consistency violations.
+Readers go through the service's published read views; a "legacy" reader
+iterates the writers' working collections the way the service used to, to
+show the races the views remove.
+
+Usage: python -m benchmarks.bench_concurrency [--seconds N] [--readers N] [--writers N]
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.common import load_service
+from benchmarks.generate_dataset import generate_dataset
+
+
+def legacy_registered_faces(service) -> int:
+    """The pre-view dashboard count, iterating the live users dict."""
+    return sum(1 for u in service.users.values() if u.face_registered)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--buildings", type=int, default=10)
+    parser.add_argument("--doors", type=int, default=200)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    # Switch threads far more often than the default 5ms to provoke races
+    sys.setswitchinterval(1e-5)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_dataset(data_dir, args.buildings, args.doors, args.users)
+        service = load_service(data_dir)
+        building_ids = list(service.buildings)
+        door_ids = list(service.doors)
+        # Doors never move during the run, so this mapping stays valid
+        building_doors = {b: {d.id for d in service.get_doors_by_building(b)} for b in building_ids}
+
+        stop = threading.Event()
+        ops: Counter = Counter()
+        errors: Counter = Counter()
+        violations: Counter = Counter()
+
+        def reader(seed: int):
+            rng = random.Random(seed)
+            while not stop.is_set():
+                building_id = rng.choice(building_ids)
+                door_id = rng.choice(door_ids)
+                try:
+                    users = service.get_users_by_building(building_id)
+                    if any(not building_doors[building_id].intersection(u.authorized_doors) for u in users):
+                        violations["get_users_by_building"] += 1
+                    ops["get_users_by_building"] += 1
+
+                    stats = service.get_dashboard_stats()
+                    if stats["registered_faces"] > stats["total_users"]:
+                        violations["get_dashboard_stats"] += 1
+                    ops["get_dashboard_stats"] += 1
+
+                    allow_list = service.get_door_allow_list(door_id)
+                    if allow_list and any(service.decide_access(u, door_id).value == "user_not_found"
+                                          and service.get_user(u) is not None
+                                          for u in allow_list["user_ids"][:10]):
+                        violations["get_door_allow_list"] += 1
+                    ops["get_door_allow_list"] += 1
+
+                    service.get_access_logs(limit=20, door_id=door_id)
+                    ops["get_access_logs"] += 1
+                except Exception as e:
+                    errors[f"{type(e).__name__}: {e}"] += 1
+
+                try:
+                    legacy_registered_faces(service)
+                    ops["legacy_registered_faces"] += 1
+                except RuntimeError as e:
+                    errors[f"legacy: {e}"] += 1
+
+        def writer(tag: str, seed: int):
+            rng = random.Random(seed)
+            created = []
+            i = 0
+            while not stop.is_set():
+                action = rng.random()
+                if action < 0.4 or not created:
+                    user_id = f"stress_{tag}_{i}"
+                    i += 1
+                    service.create_user(user_id, f"Stress {tag} {i}")
+                    service.authorize_user_for_doors(user_id, rng.sample(door_ids, 3))
+                    created.append(user_id)
+                    ops["write:create_user"] += 1
+                elif action < 0.7:
+                    service.authorize_user_for_doors(rng.choice(created), rng.sample(door_ids, 3))
+                    ops["write:authorize_user_for_doors"] += 1
+                elif action < 0.85:
+                    service.process_face_recognition_access(rng.choice(created), 0.9, rng.choice(door_ids))
+                    ops["write:process_face_recognition_access"] += 1
+                else:
+                    service.delete_user(created.pop(rng.randrange(len(created))))
+                    ops["write:delete_user"] += 1
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(f"w{n}", 100 + n)) for n in range(args.writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        legacy_errors = sum(n for k, n in errors.items() if k.startswith("legacy: "))
+        results = {
+            "seconds": round(elapsed, 2),
+            "ops_per_second": {k: round(n / elapsed, 1) for k, n in sorted(ops.items())},
+            "view_read_errors": sum(errors.values()) - legacy_errors,
+            "legacy_read_errors": legacy_errors,
+            "consistency_violations": dict(violations),
+            "errors": dict(errors.most_common(5)),
+        }
+        print(json.dumps(results, indent=2))
+        if results["view_read_errors"] or violations:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Helpers
+Shared utilities for loading an isolated service and timing calls.
+"""
+import statistics
+import time
+from typing import Callable, Dict, Sequence
+
+from src.app.core.config import settings
+from src.app.services import door_access_service
+from src.app.services.door_access_service import DoorAccessService
+
+
+def load_service(data_dir: str) -> DoorAccessService:
+    """Construct a fresh DoorAccessService over data_dir, bypassing the cached singleton."""
+    settings.data_dir = data_dir
+    DoorAccessService._instance = None
+    door_access_service._door_access_service = None
+    return door_access_service.get_door_access_service()
+
+
+def time_calls(fn: Callable, args: Sequence[tuple], repeat: int = 5) -> Dict[str, float]:
+    """Call fn(*a) for every a in args, `repeat` times. Returns per-call nanoseconds."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for a in args:
+            fn(*a)
+        runs.append((time.perf_counter_ns() - start) / len(args))
+    return {"ns_per_call_median": statistics.median(runs), "ns_per_call_min": min(runs)}
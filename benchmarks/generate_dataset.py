@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic Dataset Generator
+Writes realistic Data/door_access JSON files for benchmarks.
+"""
+import argparse
+import json
+import os
+import random
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Sequence, Tuple
+from urllib.parse import quote
+
+DEPARTMENTS = ["Engineering", "Operations", "Finance", "HR", "Sales", "Security", "IT", "Legal"]
+ROLES = ["employee", "employee", "employee", "manager", "contractor", "admin"]
+
+
+def generate_dataset(data_dir: str, buildings: int = 50, doors: int = 2000, users: int = 50000,
+                     logs: int = 0, max_doors_per_user: int = 8, seed: int = 42,
+                     controllers: Sequence[Tuple[str, int]] = (), log_retention: int = 1000) -> dict:
+    """
+    Write buildings.json, doors.json, users.json and access_logs/<building>.json
+    into data_dir in the same format DoorAccessService saves them. Returns the
+    generated counts. `logs` entries are generated, of which the service (and
+    so the files) keeps the last `log_retention` per building.
+    Doors are assigned round-robin to the (host, port) `controllers`, if given.
+    """
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    now = datetime(2026, 1, 5, 8, 0, 0)
+    stamp = now.isoformat()
+
+    building_rows = []
+    for i in range(buildings):
+        building_rows.append({
+            "id": f"bld_{i:08x}",
+            "name": f"Building {i + 1}",
+            "description": "",
+            "color": "#667eea",
+            "icon": "building",
+            "doors": [],
+            "created_at": stamp,
+            "updated_at": stamp,
+        })
+
+    door_rows = []
+    for i in range(doors):
+        building = building_rows[i % buildings]
+        door_id = f"door_{i:08x}"
+        building["doors"].append(door_id)
+        host, port = controllers[i % len(controllers)] if controllers else ("", 80)
+        door_rows.append({
+            "id": door_id,
+            "name": f"Door {i + 1}",
+            "location": f"Floor {rng.randint(1, 12)}",
+            "ip_address": host,
+            "port": port,
+            "status": "online" if rng.random() > 0.02 else "offline",
+            "is_locked": True,
+            "building_id": building["id"],
+            "created_at": stamp,
+            "updated_at": stamp,
+        })
+
+    user_rows = []
+    for i in range(users):
+        # Users mostly work in one building, so grants cluster per building
+        home = building_rows[rng.randrange(buildings)]["doors"] or [d["id"] for d in door_rows]
+        granted = rng.sample(home, min(len(home), rng.randint(1, max_doors_per_user)))
+        user_rows.append({
+            "id": f"EMP{i:06d}",
+            "name": f"Employee {i}",
+            "email": f"employee{i}@example.com",
+            "department": rng.choice(DEPARTMENTS),
+            "role": rng.choice(ROLES),
+            "face_registered": rng.random() > 0.01,
+            "is_active": rng.random() > 0.03,
+            "authorized_doors": granted,
+            "created_at": stamp,
+            "updated_at": stamp,
+        })
+
+    for name, rows in (("buildings.json", building_rows), ("doors.json", door_rows),
+                       ("users.json", user_rows)):
+        with open(os.path.join(data_dir, name), 'w') as f:
+            json.dump(rows, f, indent=2)
+
+    # Logs can run to millions of rows; only the retained tail of each building is held
+    log_count = 0
+    retained: Dict[str, Deque[dict]] = {}
+    for i in range(logs if doors else 0):
+        user = user_rows[rng.randrange(users)] if users else None
+        door = door_rows[rng.randrange(doors)]
+        granted = user is not None and door["id"] in user["authorized_doors"]
+        score = round(rng.uniform(0.55, 0.99), 4)
+        row = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "timestamp": (now + timedelta(seconds=i * 7)).isoformat(),
+            "door_id": door["id"],
+            "user_id": user["id"] if user else None,
+            "user_name": user["name"] if user else None,
+            "event_type": "granted" if granted else "denied",
+            "similarity_score": score,
+            "building_id": door["building_id"],
+            "details": "Face recognition access granted" if granted else "Access denied",
+        }
+        tail = retained.get(door["building_id"])
+        if tail is None:
+            tail = retained[door["building_id"]] = deque(maxlen=log_retention)
+        tail.append(row)
+        log_count += 1
+
+    log_dir = os.path.join(data_dir, "access_logs")
+    os.makedirs(log_dir, exist_ok=True)
+    for building_id, rows in retained.items():
+        with open(os.path.join(log_dir, f"{quote(building_id, safe='')}.json"), 'w') as f:
+            json.dump(list(rows), f, indent=2)
+
+    return {"buildings": buildings, "doors": doors, "users": users, "logs": log_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic door access dataset")
+    parser.add_argument("data_dir")
+    parser.add_argument("--buildings", type=int, default=50)
+    parser.add_argument("--doors", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--logs", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    counts = generate_dataset(args.data_dir, args.buildings, args.doors, args.users, args.logs, seed=args.seed)
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-End Load Test
+Starts a fleet of stand-in door controllers (local aiohttp servers with
+configurable latency and failure rate), points the generated doors at
+them, serves the app with uvicorn and drives concurrent face-recognition
+and door-open traffic over real HTTP. Reports throughput and latency
+percentiles per endpoint, plus what the controllers saw.
+
+The controllers, the app server and the load generator each run their own
+event loop on their own thread, so a slow controller or a blocked app loop
+shows up in the latencies instead of stalling the client.
+
+Usage:
+    python -m benchmarks.load_test [--controllers N] [--concurrency N] [--seconds N]
+        [--controller-latency-ms MS] [--controller-jitter-ms MS] [--failure-rate P]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.common import load_service
+from benchmarks.generate_dataset import generate_dataset
+
+API_PREFIX = "/api/v1/door-access"
+
+
+class FakeController:
+    """Stand-in door controller answering POST /unlock after a simulated delay."""
+
+    def __init__(self, latency: float, jitter: float, failure_rate: float, rng: random.Random):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = rng
+        self.requests: Counter = Counter()
+        self.port = 0
+        self._runner = None
+
+    async def unlock(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+        if self.rng.random() < self.failure_rate:
+            self.requests["failed"] += 1
+            return web.Response(status=503, text="controller busy")
+        self.requests["ok"] += 1
+        return web.json_response({"status": "unlocked"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/unlock", self.unlock)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class LoopThread:
+    """An event loop running forever on a daemon thread."""
+
+    def __init__(self, name: str):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout: float = 30.0):
+        """Run a coroutine on this loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+def start_app_server() -> Tuple[Any, threading.Thread, int]:
+    """Serve src.app.main:app with uvicorn on a free local port from a background thread."""
+    import uvicorn
+    from src.app.main import app
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False, lifespan="on"))
+    thread = threading.Thread(target=lambda: asyncio.run(server.serve(sockets=[sock])),
+                              name="app-server", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, port
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    if not samples:
+        return {}
+    samples = sorted(samples)
+    count = len(samples)
+
+    def pick(q: float) -> float:
+        return round(samples[min(count - 1, int(count * q))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p99_ms": pick(0.99),
+            "p999_ms": pick(0.999), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+async def drive(base_url: str, pairs: List[Tuple[str, str]], door_ids: List[str], args) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` clients each send one request at a time until time runs out."""
+    latencies: Dict[str, List[float]] = {"face-recognition": [], "door-open": []}
+    statuses: Dict[str, Counter] = {name: Counter() for name in latencies}
+    deadline = time.perf_counter() + args.seconds
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def client(seed: int):
+            rng = random.Random(seed)
+            # Each client is its own camera, as far as admission control is concerned
+            headers = {"X-Camera-Id": f"camera-{seed}"}
+            while time.perf_counter() < deadline:
+                if rng.random() < args.open_ratio:
+                    name = "door-open"
+                    url = f"{base_url}{API_PREFIX}/doors/{rng.choice(door_ids)}/open"
+                    params = None
+                else:
+                    name = "face-recognition"
+                    user_id, door_id = rng.choice(pairs)
+                    url = f"{base_url}{API_PREFIX}/access/face-recognition"
+                    params = {"user_id": user_id, "door_id": door_id,
+                              "similarity_score": round(rng.uniform(0.6, 0.99), 3)}
+                start = time.perf_counter()
+                try:
+                    async with session.post(url, params=params, headers=headers) as response:
+                        body = await response.json()
+                        outcome = str(response.status)
+                        if body.get("queued"):
+                            outcome += " (queued for retry)"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    outcome = type(e).__name__
+                latencies[name].append(time.perf_counter() - start)
+                statuses[name][outcome] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(args.seed + i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(samples) for samples in latencies.values())
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "endpoints": {
+            name: {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 1),
+                "statuses": dict(statuses[name]),
+                **percentiles(samples),
+            }
+            for name, samples in latencies.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--controllers", type=int, default=20, help="fake door controllers")
+    parser.add_argument("--controller-latency-ms", type=float, default=20.0)
+    parser.add_argument("--controller-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="fraction of unlocks answered with 503")
+    parser.add_argument("--buildings", type=int, default=10)
+    parser.add_argument("--doors", type=int, default=200)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--logs", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=50, help="simultaneous clients")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--open-ratio", type=float, default=0.3,
+                        help="fraction of requests that are /doors/{id}/open (the rest are face recognition)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # Keep per-request service logging (including controller warnings) out of the timings
+    logging.basicConfig(level=logging.ERROR)
+
+    rng = random.Random(args.seed)
+    fleet_loop = LoopThread("controller-fleet")
+    fleet = [FakeController(args.controller_latency_ms / 1000, args.controller_jitter_ms / 1000,
+                            args.failure_rate, random.Random(rng.random()))
+             for _ in range(args.controllers)]
+    for controller in fleet:
+        fleet_loop.run(controller.start())
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_dataset(data_dir, args.buildings, args.doors, args.users, args.logs, seed=args.seed,
+                         controllers=[("127.0.0.1", c.port) for c in fleet])
+        service = load_service(data_dir)
+        door_ids = list(service.doors)
+        # Mostly authorized pairs, like a real entrance rush, with some denials mixed in
+        pairs = []
+        for user in list(service.users.values())[:5000]:
+            if user.authorized_doors and rng.random() < 0.9:
+                pairs.append((user.id, rng.choice(user.authorized_doors)))
+            else:
+                pairs.append((user.id, rng.choice(door_ids)))
+
+        server, server_thread, port = start_app_server()
+        try:
+            report = asyncio.run(drive(f"http://127.0.0.1:{port}", pairs, door_ids, args))
+            # Unlocks the controllers refused, as left in the outbox when the load stopped
+            report["outbox"] = service.outbox.stats()
+        finally:
+            server.should_exit = True
+            server_thread.join()
+            for controller in fleet:
+                fleet_loop.run(controller.stop())
+            fleet_loop.stop()
+
+    controller_totals: Counter = Counter()
+    for controller in fleet:
+        controller_totals.update(controller.requests)
+    report["controllers"] = {
+        "count": args.controllers,
+        "latency_ms": args.controller_latency_ms,
+        "jitter_ms": args.controller_jitter_ms,
+        "failure_rate": args.failure_rate,
+        "unlock_requests": dict(controller_totals),
+    }
+    report["config"] = {"concurrency": args.concurrency, "seconds": args.seconds, "open_ratio": args.open_ratio,
+                        "dataset": {"buildings": args.buildings, "doors": args.doors,
+                                    "users": args.users, "logs": args.logs}}
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if not report["requests"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Suite
+Generates a synthetic dataset, then times data loading, every collection
+save, the access-control hot paths, the read queries (including user
+search), the main API routes
+(through an in-process ASGI client) and access decisions with and without
+schedules. Results are written as JSON
+so two runs can be compared for regressions.
+
+Usage:
+    python -m benchmarks.run_suite [--users N] [--logs N] [--output results.json]
+    python -m benchmarks.run_suite --compare baseline.json [--threshold 0.25]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+from benchmarks.common import load_service
+from src.app.core.config import settings
+from benchmarks.generate_dataset import generate_dataset
+
+API_PREFIX = "/api/v1/door-access"
+
+
+def summarize(samples_ns: List[int]) -> Dict[str, float]:
+    """Per-call statistics in microseconds."""
+    samples_ns = sorted(samples_ns)
+    count = len(samples_ns)
+    return {
+        "calls": count,
+        "median_us": round(samples_ns[count // 2] / 1000, 3),
+        "p95_us": round(samples_ns[min(count - 1, int(count * 0.95))] / 1000, 3),
+        "min_us": round(samples_ns[0] / 1000, 3),
+        "ops_per_second": round(count / (sum(samples_ns) / 1e9), 1),
+    }
+
+
+def measure(fn: Callable, calls: Sequence[tuple], repeat: int = 1) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        for args in calls:
+            start = time.perf_counter_ns()
+            fn(*args)
+            samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+async def measure_async(fn: Callable[..., Awaitable], calls: Sequence[tuple]) -> Dict[str, float]:
+    samples = []
+    for args in calls:
+        start = time.perf_counter_ns()
+        await fn(*args)
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ==================== Benchmarks ====================
+
+def bench_loading(data_dir: str, repeat: int) -> Dict[str, Any]:
+    results = {}
+    start = time.perf_counter_ns()
+    service = load_service(data_dir)
+    # The first start reads the JSON files and writes the baseline snapshot
+    results["cold_start_json_files"] = summarize([time.perf_counter_ns() - start])
+    results["cold_start_snapshot"] = measure(lambda: load_service(data_dir), [()] * repeat)
+
+    service = load_service(data_dir)
+
+    def load_data():
+        with service._file_lock:
+            service._load_data()
+    results["_load_data"] = measure(load_data, [()] * repeat)
+    return results
+
+
+def bench_saves(service, repeat: int) -> Dict[str, Any]:
+    results = {
+        name: measure(getattr(service, name), [()] * repeat)
+        for name in ("_save_buildings", "_save_doors", "_save_users", "_save_access_groups",
+                     "_save_schedules", "_save_score_stats")
+    }
+    # Access logs are saved per building; time the save after one building's event
+    shard = service._log_shards.shard(next(iter(service.buildings), None))
+
+    def save_access_logs():
+        service._log_shards.mark_dirty(shard)
+        service._save_access_logs()
+    results["_save_access_logs"] = measure(save_access_logs, [()] * repeat)
+    return results
+
+
+def bench_queries(service, rng: random.Random, samples: int, writes: int) -> Dict[str, Any]:
+    user_ids = list(service.users)
+    door_ids = list(service.doors)
+    building_ids = list(service.buildings)
+    pairs = []
+    for _ in range(samples):
+        user_id = rng.choice(user_ids)
+        authorized = service.users[user_id].authorized_doors
+        pairs.append((user_id, rng.choice(authorized) if authorized and rng.random() < 0.5 else rng.choice(door_ids)))
+    # What an operator types into the employee picker: part of an ID, a name or a name and department
+    searches = []
+    for user_id, _ in pairs[:200]:
+        user = service.users[user_id]
+        searches.append((rng.choice([user_id[:rng.randint(3, len(user_id))], user.name,
+                                     f"{user.name.split()[0]} {user.department}"]),))
+    service.search_users("warm up")
+
+    return {
+        "check_user_access": measure(service.check_user_access, pairs),
+        "decide_access": measure(service.decide_access, pairs),
+        "process_face_recognition_access": measure(
+            lambda u, d: service.process_face_recognition_access(u, 0.9, d), pairs[:writes]),
+        "get_users_by_building": measure(service.get_users_by_building, [(b,) for b in building_ids]),
+        "get_access_logs": measure(lambda: service.get_access_logs(limit=100), [()] * 50),
+        "get_access_logs_by_door": measure(
+            lambda d: service.get_access_logs(limit=100, door_id=d), [(d,) for _, d in pairs[:200]]),
+        "get_access_logs_by_user": measure(
+            lambda u: service.get_access_logs(limit=100, user_id=u), [(u,) for u, _ in pairs[:200]]),
+        "get_dashboard_stats": measure(service.get_dashboard_stats, [()] * 50),
+        "get_occupancy": measure(service.get_occupancy, [()] * 50),
+        "search_users": measure(service.search_users, searches),
+    }
+
+
+def bench_schedules(service, rng: random.Random, samples: int) -> Dict[str, Any]:
+    """
+    decide_access on granted user/door pairs, then again with every sampled
+    door and user limited to a schedule. The schedule is deleted afterwards,
+    which lifts it from the doors and users again.
+    """
+    users = [u for u in service.users.values() if u.authorized_doors]
+    if not users:
+        return {"skipped": "no user holds a door grant"}
+    pairs = []
+    for _ in range(samples):
+        user = rng.choice(users)
+        pairs.append((user.id, rng.choice(user.authorized_doors)))
+    results = {"decide_access_unscheduled": measure(service.decide_access, pairs)}
+
+    schedule = service.create_schedule("Benchmark", windows=[
+        {"days": list(range(7)), "start": "00:00", "end": "24:00"}])
+    with service.batch():
+        for door_id in {d for _, d in pairs}:
+            service.update_door(door_id, schedule_id=schedule.id)
+        for user_id in {u for u, _ in pairs}:
+            service.update_user(user_id, schedule_id=schedule.id)
+    results["decide_access_scheduled"] = measure(service.decide_access, pairs)
+    service.delete_schedule(schedule.id)
+    return results
+
+
+async def bench_api(service, rng: random.Random, samples: int, writes: int) -> Dict[str, Any]:
+    try:
+        import httpx
+    except ImportError:
+        return {"skipped": "httpx is required for the API benchmarks"}
+    from src.app.main import app
+
+    user_ids = list(service.users)
+    door_ids = list(service.doors)
+    building_ids = list(service.buildings)
+    pairs = [(rng.choice(user_ids), rng.choice(door_ids)) for _ in range(samples)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get(path: str, params: Dict[str, Any] = None):
+            response = await client.get(API_PREFIX + path, params=params)
+            response.raise_for_status()
+
+        async def post(path: str, params: Dict[str, Any] = None):
+            response = await client.post(API_PREFIX + path, params=params)
+            response.raise_for_status()
+
+        return {
+            "GET /stats": await measure_async(get, [("/stats",)] * 50),
+            "GET /buildings": await measure_async(get, [("/buildings",)] * 50),
+            "GET /doors?building_id": await measure_async(
+                get, [("/doors", {"building_id": b}) for b in building_ids]),
+            "GET /users?building_id": await measure_async(
+                get, [("/users", {"building_id": b}) for b in building_ids[:10]]),
+            "GET /users": await measure_async(get, [("/users",)] * 3),
+            "GET /users/{user_id}": await measure_async(get, [(f"/users/{u}",) for u, _ in pairs]),
+            "GET /users/search": await measure_async(
+                get, [("/users/search", {"q": service.users[u].name}) for u, _ in pairs[:200]]),
+            "GET /access-logs": await measure_async(get, [("/access-logs", {"limit": 100})] * 50),
+            "POST /access/check": await measure_async(
+                post, [("/access/check", {"user_id": u, "door_id": d}) for u, d in pairs]),
+            "POST /access/decide": await measure_async(
+                post, [("/access/decide", {"user_id": u, "door_id": d}) for u, d in pairs]),
+            "POST /access/face-recognition": await measure_async(
+                post, [("/access/face-recognition", {"user_id": u, "similarity_score": 0.9, "door_id": d})
+                       for u, d in pairs[:writes]]),
+        }
+
+
+# ==================== Comparison ====================
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print median changes per benchmark. Returns the names that regressed beyond threshold."""
+    regressions = []
+    print(f"{'benchmark':<45} {'baseline_us':>12} {'current_us':>12} {'change':>8}")
+    for group, results in current["results"].items():
+        for name, stats in results.items():
+            before = baseline.get("results", {}).get(group, {}).get(name)
+            if not isinstance(stats, dict) or not isinstance(before, dict) or "median_us" not in before:
+                continue
+            change = stats["median_us"] / before["median_us"] - 1 if before["median_us"] else 0.0
+            flag = "  REGRESSION" if change > threshold else ""
+            print(f"{group + ': ' + name:<45} {before['median_us']:>12.1f} {stats['median_us']:>12.1f} "
+                  f"{change:>+8.1%}{flag}")
+            if flag:
+                regressions.append(f"{group}: {name}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buildings", type=int, default=50)
+    parser.add_argument("--doors", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--logs", type=int, default=1000000)
+    parser.add_argument("--samples", type=int, default=2000, help="calls per read benchmark")
+    parser.add_argument("--writes", type=int, default=100, help="calls per benchmark that saves")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of load and save benchmarks")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", help="reuse or keep the generated dataset here")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="median slowdown counted as a regression (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    # Keep the service's INFO logging out of the timings
+    logging.basicConfig(level=logging.WARNING)
+    # The API benchmarks measure handler cost; don't let admission control shed them
+    settings.admission_door_rate = settings.admission_source_rate = 0
+
+    with tempfile.TemporaryDirectory() as scratch:
+        data_dir = args.data_dir or os.path.join(scratch, "door_access")
+        dataset = {"buildings": args.buildings, "doors": args.doors, "users": args.users, "logs": args.logs}
+        if not os.path.exists(os.path.join(data_dir, "users.json")):
+            start = time.perf_counter()
+            generate_dataset(data_dir, args.buildings, args.doors, args.users, args.logs, seed=args.seed)
+            print(f"Generated dataset in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        rng = random.Random(args.seed)
+        results: Dict[str, Any] = {"loading": bench_loading(data_dir, args.repeat)}
+        service = load_service(data_dir)
+        results["saves"] = bench_saves(service, args.repeat)
+        results["service"] = bench_queries(service, rng, args.samples, args.writes)
+        results["api"] = asyncio.run(bench_api(service, rng, args.samples, args.writes))
+        results["schedules"] = bench_schedules(service, rng, args.samples)
+
+    document = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": dataset,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(json.dumps(document, indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(document, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
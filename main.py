@@ -1,10 +1,35 @@
+"""
+Server entrypoint.
+
+    python main.py                # production: no reloader, preloaded state
+    python main.py --reload       # development: restart on code changes
+    python main.py --workers 4    # several worker processes sharing the data directory
+"""
 if __name__ == "__main__":
-    import uvicorn
+    import argparse
+    import importlib.util
     import os
-    
+
+    import uvicorn
+
+    from src.app.core.config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reload", action="store_true", default=settings.reload,
+                        help="restart on code changes (single worker)")
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    args = parser.parse_args()
+
     # Ensure directories exist
-    os.makedirs("Data/door_access", exist_ok=True)
-    os.makedirs("logs", exist_ok=True)
-    
+    os.makedirs(settings.data_dir, exist_ok=True)
+    os.makedirs(settings.log_dir, exist_ok=True)
+
+    # Fastest event loop and HTTP parser installed (pip install uvloop httptools)
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
     # Run the application
-    uvicorn.run("src.app.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("src.app.main:app", host=args.host, port=args.port, reload=args.reload,
+                workers=1 if args.reload else args.workers, loop=loop, http=http)
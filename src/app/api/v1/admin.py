@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Admin API Routes
+Operational endpoints for diagnosing performance in a running server.
+"""
+import asyncio
+import logging
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from src.app.core.config import settings
+from src.app.services.door_access_service import get_door_access_service
+from src.utils.profiler import SamplingProfiler
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=settings.profiler_max_seconds),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+):
+    """
+    Sample every thread's stack for `seconds` and return collapsed stacks
+    ("frame;frame;frame count" lines) for flamegraph.pl or speedscope.
+    The server keeps handling requests while the profile runs.
+    """
+    profiler = SamplingProfiler(interval_ms / 1000)
+    if not profiler.start():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    logger.info(f"Profiling for {seconds}s at {interval_ms}ms intervals")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    return PlainTextResponse(profiler.collapsed(), headers={"X-Profile-Samples": str(profiler.sample_count)})
+
+
+@router.get("/outbox")
+async def outbox_status():
+    """Queued outbound calls per destination and their backoff state."""
+    return get_door_access_service().outbox.stats()
+
+
+@router.get("/outbox/dead-letters")
+async def outbox_dead_letters(limit: int = Query(100, ge=1, le=1000)):
+    """Most recent messages the outbox gave up on, newest first."""
+    return get_door_access_service().outbox.dead_letters(limit)
+
+
+@router.get("/startup")
+async def startup_timings(request: Request):
+    """How long this worker took to start, per phase, and the event loop it runs on."""
+    return getattr(request.app.state, "startup", {})
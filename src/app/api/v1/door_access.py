@@ -4,20 +4,60 @@
 Door Access Control API Routes
 RESTful API endpoints for managing door access control.
 """
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Literal, Optional
 import logging
 
 from src.app.models.door_access import (
-    Door, User, Building, AccessLog, 
+    Door, User, Building, AccessLog, AccessLogType,
     BuildingCreate, DoorCreate, UserCreate, 
-    DoorAuthorizationUpdate, DoorOpenRequest
+    DoorAuthorizationUpdate, DoorOpenRequest, AccessReason, BatchRequest,
+    FaceEmbeddingUpdate, FaceMatchRequest, AccessGroupCreate, AccessScheduleCreate
 )
-from src.app.services.door_access_service import get_door_access_service
+from src.app.core.config import settings
+from src.app.services.admission import AdmissionController, AdmissionRejected, retry_after_header
+from src.app.services.change_journal import current_actor
+from src.app.services.door_access_service import get_door_access_service, BatchError
+from src.utils.timing import TimedRoute
 
-router = APIRouter()
+
+async def bind_actor(x_actor: Optional[str] = Header(default=None)):
+    """Attribute journaled changes made by this request to the X-Actor header."""
+    current_actor.set(x_actor or "api")
+
+
+router = APIRouter(dependencies=[Depends(bind_actor)], route_class=TimedRoute)
 logger = logging.getLogger(__name__)
 
+# Shared by the face recognition endpoints of this worker
+face_admission = AdmissionController(
+    door_rate=settings.admission_door_rate, door_burst=settings.admission_door_burst,
+    source_rate=settings.admission_source_rate, source_burst=settings.admission_source_burst,
+    max_in_flight=settings.admission_max_in_flight)
+
+
+@contextmanager
+def admit_face_event(request: Request, door_id: Optional[str]) -> Iterator[None]:
+    """
+    Admit a face recognition event or answer 429. Sources are identified by
+    the X-Camera-Id header, else the client address; unknown door IDs
+    share one bucket so clients can't mint new ones, and events without a
+    door are limited by their source only.
+    """
+    if door_id is None:
+        door_key = None
+    else:
+        door_key = door_id if get_door_access_service().get_door(door_id) else "<unknown>"
+    source = request.headers.get("x-camera-id") or (request.client.host if request.client else "<unknown>")
+    try:
+        with face_admission.admit(door_key, source):
+            yield
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": retry_after_header(e.retry_after)})
+
 
 # ==================== Dashboard & Stats ====================
 
@@ -28,6 +68,36 @@ async def get_dashboard_stats():
     return service.get_dashboard_stats()
 
 
+@router.get("/stats/traffic")
+async def get_traffic_stats(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    interval: Literal["hour", "day", "week"] = "day",
+    group_by: Optional[Literal["door", "building"]] = None,
+    door_id: Optional[str] = None,
+    building_id: Optional[str] = None
+):
+    """Access event counts and denial rates over a time range (default: last 7 days), from hourly rollups."""
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    service = get_door_access_service()
+    return service.get_traffic_stats(start, end, interval=interval, group_by=group_by,
+                                     door_id=door_id, building_id=building_id)
+
+
+# ==================== Batch ====================
+
+@router.post("/batch")
+async def apply_batch(batch_data: BatchRequest):
+    """Apply several create/update/delete operations as one transaction."""
+    service = get_door_access_service()
+    try:
+        results = service.apply_batch([op.model_dump() for op in batch_data.operations])
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "results": results}
+
+
 # ==================== Buildings ====================
 
 @router.get("/buildings", response_model=List[dict])
@@ -35,6 +105,7 @@ async def get_all_buildings():
     """Get all buildings with door and user counts."""
     service = get_door_access_service()
     buildings = service.get_all_buildings()
+    inside = {b['building_id']: b['inside'] for b in service.get_occupancy()['buildings']}
     result = []
     for b in buildings:
         building_dict = b.model_dump(mode='json')
@@ -42,10 +113,21 @@ async def get_all_buildings():
         # Use service method to get accurate count including door-level authorization
         users = service.get_users_by_building(b.id)
         building_dict['user_count'] = len(users)
+        building_dict['inside_count'] = inside.get(b.id, 0)
         result.append(building_dict)
     return result
 
 
+@router.get("/buildings/{building_id}/occupancy")
+async def get_building_occupancy(building_id: str, limit: int = Query(100, ge=0, le=10000)):
+    """How many users are inside a building, and which (up to limit)."""
+    service = get_door_access_service()
+    occupancy = service.get_building_occupancy(building_id, limit=limit)
+    if occupancy is None:
+        raise HTTPException(status_code=404, detail="Building not found")
+    return occupancy
+
+
 @router.get("/buildings/{building_id}")
 async def get_building(building_id: str):
     """Get a specific building by ID."""
@@ -82,7 +164,10 @@ async def create_building(building_data: BuildingCreate):
 async def update_building(building_id: str, building_data: dict):
     """Update an existing building."""
     service = get_door_access_service()
-    building = service.update_building(building_id, **building_data)
+    try:
+        building = service.update_building(building_id, **building_data)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not building:
         raise HTTPException(status_code=404, detail="Building not found")
     return {"success": True, "building": building.model_dump(mode='json')}
@@ -137,13 +222,18 @@ async def get_door(door_id: str):
 async def create_door(door_data: DoorCreate):
     """Create a new door."""
     service = get_door_access_service()
-    door = service.create_door(
-        name=door_data.name,
-        building_id=door_data.building_id,
-        location=door_data.location,
-        ip_address=door_data.ip_address,
-        port=door_data.port
-    )
+    try:
+        door = service.create_door(
+            name=door_data.name,
+            building_id=door_data.building_id,
+            location=door_data.location,
+            ip_address=door_data.ip_address,
+            port=door_data.port,
+            schedule_id=door_data.schedule_id,
+            direction=door_data.direction
+        )
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not door:
         raise HTTPException(status_code=400, detail="Invalid building ID")
     return {"success": True, "door": door.model_dump(mode='json')}
@@ -153,7 +243,10 @@ async def create_door(door_data: DoorCreate):
 async def update_door(door_id: str, door_data: dict):
     """Update an existing door."""
     service = get_door_access_service()
-    door = service.update_door(door_id, **door_data)
+    try:
+        door = service.update_door(door_id, **door_data)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not door:
         raise HTTPException(status_code=404, detail="Door not found")
     return {"success": True, "door": door.model_dump(mode='json')}
@@ -186,9 +279,6 @@ async def verify_user_exists(user_id: str):
     Verify if a user exists in the central Visage server.
     This is called before adding a user to ensure they're registered.
     """
-    import aiohttp
-    from src.app.core.config import settings
-    
     logger.info(f"Verifying employee ID: {user_id}")
     
     # Check if already exists locally
@@ -203,59 +293,44 @@ async def verify_user_exists(user_id: str):
     
     # Try to verify against central server
     try:
-        # Use the remote API to check if user exists
-        # We'll make a lightweight request to verify the employee
-        headers = {
-            "api": settings.validation_api_key,
-            "user": settings.validation_api_user,
-            "uname": user_id
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            # Try the attendance update endpoint as a way to verify if user exists
-            async with session.post(
-                settings.validation_api_url,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    msg = result.get("msg", "")
-                    
-                    # Check validation messages
-                    # "Username found" means the user is already registered -> Success for us (we want to add existing users)
-                    # "Username Available" means the user is NOT registered -> Fail for us
-                    
-                    if "Username found" in msg:
-                        # User verification success
-                        return {
-                            "exists": True,
-                            "message": "Employee verified successfully"
-                        }
-                    elif "Username Available" in msg:
-                        return {
-                            "exists": False,
-                            "message": "Employee not found in central server. Please register first at the main Visage portal."
-                        }
-                    else:
-                        # Fallback for other messages
-                        logger.warning(f"Unexpected validation response: {msg}")
-                        return {
-                            "exists": False,
-                            "message": f"Verification failed: {msg}"
-                        }
-                
-                # Server error
-                logger.error(f"Validation API returned status {response.status}")
+        status, msg = await service.request_user_validation(user_id)
+        if status == 200:
+            # Check validation messages
+            # "Username found" means the user is already registered -> Success for us (we want to add existing users)
+            # "Username Available" means the user is NOT registered -> Fail for us
+            
+            if "Username found" in msg:
+                # User verification success
+                return {
+                    "exists": True,
+                    "message": "Employee verified successfully"
+                }
+            elif "Username Available" in msg:
+                return {
+                    "exists": False,
+                    "message": "Employee not found in central server. Please register first at the main Visage portal."
+                }
+            else:
+                # Fallback for other messages
+                logger.warning(f"Unexpected validation response: {msg}")
                 return {
                     "exists": False,
-                    "message": f"Central server verification failed (Status {response.status})"
+                    "message": f"Verification failed: {msg}"
                 }
+        
+        # Server error
+        logger.error(f"Validation API returned status {status}")
+        return {
+            "exists": False,
+            "message": f"Central server verification failed (Status {status})"
+        }
                 
     except Exception as e:
         logger.warning(f"Could not verify user against central server: {e}")
         # If we can't reach central server, allow user to be added
-        # This is a fallback for offline scenarios
+        # This is a fallback for offline scenarios; the check is
+        # queued and repeated once the server is reachable again
+        service.queue_user_verification(user_id, str(e) or type(e).__name__)
         
         return {
             "exists": True,
@@ -280,6 +355,26 @@ async def get_all_users(building_id: Optional[str] = None):
     return result
 
 
+@router.get("/users/search", response_model=List[dict])
+async def search_users(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=200)):
+    """
+    Search users by ID, name, email or department. Every word of q must
+    start a word of one of those fields; the best matches come first.
+    """
+    service = get_door_access_service()
+    return [u.model_dump(mode='json') for u in service.search_users(q, limit)]
+
+
+@router.get("/users/{user_id:path}/location")
+async def get_user_location(user_id: str):
+    """The building and door a user last passed, and whether they are inside."""
+    service = get_door_access_service()
+    location = service.get_user_location(user_id)
+    if location is None:
+        raise HTTPException(status_code=404, detail="No passages recorded for this user")
+    return location
+
+
 @router.get("/users/{user_id:path}")
 async def get_user(user_id: str):
     """Get a specific user by ID."""
@@ -292,6 +387,8 @@ async def get_user(user_id: str):
     # Ensure authorized_doors is included
     if 'authorized_doors' not in user_dict:
         user_dict['authorized_doors'] = []
+    # Direct grants plus those of the user's access groups
+    user_dict['effective_doors'] = service.get_effective_doors(user_id) or []
     return user_dict
 
 
@@ -318,7 +415,10 @@ async def create_user(user_data: UserCreate):
 async def update_user(user_id: str, user_data: dict):
     """Update an existing user."""
     service = get_door_access_service()
-    user = service.update_user(user_id, **user_data)
+    try:
+        user = service.update_user(user_id, **user_data)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"success": True, "user": user.model_dump(mode='json')}
@@ -351,6 +451,126 @@ async def set_face_registered(user_id: str, registered: bool = True):
     raise HTTPException(status_code=404, detail="User not found")
 
 
+@router.post("/users/{user_id:path}/face-embedding")
+async def register_face_embedding(user_id: str, data: FaceEmbeddingUpdate):
+    """Register a user's face embedding for matching."""
+    service = get_door_access_service()
+    try:
+        registered = service.register_face_embedding(user_id, data.embedding)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if registered:
+        return {"success": True, "message": "Face embedding registered"}
+    raise HTTPException(status_code=404, detail="User not found")
+
+
+# ==================== Access Groups ====================
+
+@router.get("/access-groups", response_model=List[dict])
+async def get_all_access_groups():
+    """Get all access groups."""
+    service = get_door_access_service()
+    return [g.model_dump(mode='json') for g in service.get_all_access_groups()]
+
+
+@router.get("/access-groups/{group_id}")
+async def get_access_group(group_id: str):
+    """Get a specific access group with the IDs of the users it applies to."""
+    service = get_door_access_service()
+    group = service.get_access_group(group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Access group not found")
+    
+    group_dict = group.model_dump(mode='json')
+    group_dict['member_ids'] = service.get_access_group_members(group_id) or []
+    return group_dict
+
+
+@router.post("/access-groups")
+async def create_access_group(group_data: AccessGroupCreate):
+    """Create a new access group."""
+    service = get_door_access_service()
+    try:
+        group = service.create_access_group(**group_data.model_dump())
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "access_group": group.model_dump(mode='json')}
+
+
+@router.put("/access-groups/{group_id}")
+async def update_access_group(group_id: str, group_data: dict):
+    """Update an access group; its members' grants are recompiled in one operation."""
+    service = get_door_access_service()
+    try:
+        group = service.update_access_group(group_id, **group_data)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not group:
+        raise HTTPException(status_code=404, detail="Access group not found")
+    return {"success": True, "access_group": group.model_dump(mode='json')}
+
+
+@router.delete("/access-groups/{group_id}")
+async def delete_access_group(group_id: str):
+    """Delete an access group."""
+    service = get_door_access_service()
+    if service.delete_access_group(group_id):
+        return {"success": True, "message": "Access group deleted"}
+    raise HTTPException(status_code=404, detail="Access group not found")
+
+
+# ==================== Schedules ====================
+
+@router.get("/schedules", response_model=List[dict])
+async def get_all_schedules():
+    """Get all access schedules."""
+    service = get_door_access_service()
+    return [s.model_dump(mode='json') for s in service.get_all_schedules()]
+
+
+@router.get("/schedules/{schedule_id}")
+async def get_schedule(schedule_id: str):
+    """Get a specific access schedule by ID."""
+    service = get_door_access_service()
+    schedule = service.get_schedule(schedule_id)
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return schedule.model_dump(mode='json')
+
+
+@router.post("/schedules")
+async def create_schedule(schedule_data: AccessScheduleCreate):
+    """Create a new access schedule."""
+    service = get_door_access_service()
+    try:
+        schedule = service.create_schedule(**schedule_data.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "schedule": schedule.model_dump(mode='json')}
+
+
+@router.put("/schedules/{schedule_id}")
+async def update_schedule(schedule_id: str, schedule_data: dict):
+    """Update an access schedule; doors and grants using it follow immediately."""
+    service = get_door_access_service()
+    try:
+        schedule = service.update_schedule(schedule_id, **schedule_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return {"success": True, "schedule": schedule.model_dump(mode='json')}
+
+
+@router.delete("/schedules/{schedule_id}")
+async def delete_schedule(schedule_id: str):
+    """Delete an access schedule and lift it from everything using it."""
+    service = get_door_access_service()
+    if service.delete_schedule(schedule_id):
+        return {"success": True, "message": "Schedule deleted"}
+    raise HTTPException(status_code=404, detail="Schedule not found")
+
+
 # ==================== Access Control ====================
 
 @router.post("/access/check")
@@ -361,17 +581,83 @@ async def check_access(user_id: str, door_id: str):
     return result
 
 
+@router.post("/access/decide")
+async def decide_access(user_id: str, door_id: str):
+    """Fast allow/deny decision with a reason code."""
+    service = get_door_access_service()
+    reason = service.decide_access(user_id, door_id)
+    return {"allowed": reason == AccessReason.GRANTED, "reason": reason.value}
+
+
 @router.post("/access/face-recognition")
-async def process_face_recognition(user_id: str, similarity_score: float, 
+async def process_face_recognition(request: Request, user_id: str, similarity_score: float, 
                                    door_id: Optional[str] = None):
     """Process a face recognition event for door access."""
     service = get_door_access_service()
-    result = service.process_face_recognition_access(user_id, similarity_score, door_id)
+    with admit_face_event(request, door_id):
+        result = service.process_face_recognition_access(user_id, similarity_score, door_id)
+    return result
+
+
+@router.post("/access/face-embedding")
+async def match_face_embedding(request: Request, data: FaceMatchRequest):
+    """Match a face embedding against registered users and decide access."""
+    service = get_door_access_service()
+    with admit_face_event(request, data.door_id):
+        try:
+            return service.match_face_embedding(data.embedding, data.door_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/occupancy")
+async def get_occupancy():
+    """Live headcount of every building."""
+    service = get_door_access_service()
+    return service.get_occupancy()
+
+
+# ==================== Edge Sync ====================
+
+@router.get("/changes")
+async def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    collection: Optional[str] = None
+):
+    """Get changes after a version, for edge controllers keeping a local cache."""
+    service = get_door_access_service()
+    return service.get_changes(since, limit=limit, collection=collection)
+
+
+@router.get("/doors/{door_id}/allow-list")
+async def get_door_allow_list(door_id: str, since: Optional[int] = Query(None, ge=0)):
+    """Get the user IDs allowed through a door, or the delta since a version."""
+    service = get_door_access_service()
+    result = service.get_door_allow_list(door_id, since)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Door not found")
     return result
 
 
 # ==================== Access Logs ====================
 
+@router.get("/access/score-stats")
+async def get_score_stats(
+    door_id: Optional[str] = None,
+    building_id: Optional[str] = None,
+    event_type: Optional[AccessLogType] = None,
+    buckets: int = Query(20, ge=1, le=400)
+):
+    """Similarity score distribution over all logged events, for threshold tuning."""
+    service = get_door_access_service()
+    try:
+        return service.get_score_stats(door_id=door_id, building_id=building_id,
+                                       event_type=event_type.value if event_type else None, buckets=buckets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/access-logs", response_model=List[dict])
 async def get_access_logs(
     limit: int = Query(100, ge=1, le=1000),
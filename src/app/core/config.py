@@ -8,11 +8,53 @@ class Settings(BaseSettings):
     log_level: str = "debug"
     host: str = "0.0.0.0"
     port: int = 8000
-    reload: bool = False
+    reload: bool = False  # Restart on code changes (development; forces a single worker)
+    workers: int = 1  # Worker processes started by main.py
+
+    # Data settings
+    data_dir: str = "Data/door_access"
+    journal_enabled: bool = True
+    journal_snapshot_interval: int = 1000  # Journal events between snapshots
+    sync_interval: float = 0.05  # Seconds between checks for other workers' changes
+    score_stats_save_interval: float = 30.0  # Seconds between saves of the score sketches
+    rollup_interval: float = 60.0  # Seconds between folds of new access logs into hourly rollups
+    access_log_retention: int = 1000  # Most recent access log entries kept per building
+    data_watch_interval: float = 2.0  # Seconds between checks for externally edited data files (0 = off)
+    anti_passback: bool = False  # Deny entering a building while inside it, and exiting twice in a row
+    occupancy_timeout: float = 57600.0  # Seconds (16 h) after which a user not seen leaving stops counting as inside
+    
+    # Outbox: background retry of failed controller and central-server calls
+    outbox_base_delay: float = 1.0  # First backoff after a destination fails, doubling per failure
+    outbox_max_delay: float = 300.0
+    outbox_max_attempts: int = 10  # Attempts before a message is dead-lettered
+    outbox_batch_size: int = 50  # Messages sent per destination per pass
+    outbox_unlock_ttl: float = 15.0  # Seconds a queued unlock stays worth delivering
+    outbox_verify_ttl: float = 3600.0  # Seconds a queued employee check waits for the user to be added
+    
+    # Admission control for face recognition events (rate 0 = unlimited)
+    admission_door_rate: float = 10.0  # Events per second per door
+    admission_door_burst: float = 20.0
+    admission_source_rate: float = 20.0  # Events per second per camera (X-Camera-Id or client address)
+    admission_source_burst: float = 40.0
+    admission_max_in_flight: int = 8  # Events processed at once per door (0 = unlimited)
+    
+    # Face embedding matching
+    embedding_dim: int = 512
+    embedding_match_threshold: float = 0.6  # Minimum cosine similarity for a match
+    embedding_ivf_lists: int = 0  # Partition the gallery into this many lists (0 = brute force)
+    embedding_ivf_probes: int = 8  # Lists scanned per search when partitioned
 
     # Logging settings
     log_dir: str = "logs"
     log_format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    log_json: bool = False  # One JSON object per line instead of log_format
+    log_max_bytes: int = 10 * 1024 * 1024  # Rotate application.log at this size (0 = never)
+    log_rotate_when: str = ""  # Rotate by time instead, e.g. "midnight" or "H"
+    log_backup_count: int = 5  # Rotated log files to keep
+
+    # Diagnostics
+    server_timing_enabled: bool = True  # Add a Server-Timing phase breakdown to responses
+    profiler_max_seconds: float = 60.0  # Longest run accepted by POST /api/v1/admin/profile
 
     # Remote API settings (Defaults if needed, can be overridden by env vars)
     remote_api_get_username_endpoint: str = ""
@@ -1,21 +1,77 @@
+import time
+# Start of the app import, for the start-up timings
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import gc
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 import os
 import logging
-from src.app.api.v1 import door_access
+from src.app.api.v1 import admin, door_access
 from src.app.core.config import settings
+from src.app.services.door_access_service import get_door_access_service
 from src.utils.logger import Logger
+from src.utils.metrics import REGISTRY, MetricsMiddleware
+from src.utils.timing import ServerTimingMiddleware
 
 # Initialize logger
 Logger()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timings = {"import": time.perf_counter() - _IMPORT_STARTED}
+    mark = time.perf_counter()
+    # Load all state before accepting requests, so the first gate event doesn't wait for it
+    service = get_door_access_service()
+    timings["service"], mark = time.perf_counter() - mark, time.perf_counter()
+    # Retry outbound calls that failed while controllers or the central server were down
+    await service.outbox.start()
+    tasks = [asyncio.create_task(service.run_history_compaction())]
+    if settings.data_watch_interval > 0:
+        # Pick up data files edited or restored while running
+        tasks.append(asyncio.create_task(service.run_file_watcher()))
+    timings["background_tasks"], mark = time.perf_counter() - mark, time.perf_counter()
+    # The loaded state lives as long as the process; freezing it keeps the
+    # cyclic GC from traversing it again in every full collection
+    gc.collect()
+    gc.freeze()
+    timings["gc_freeze"] = time.perf_counter() - mark
+    app.state.startup = {
+        "event_loop": type(asyncio.get_running_loop()).__module__.split(".")[0],
+        "seconds": {name: round(seconds, 4) for name, seconds in timings.items()},
+        "service_seconds": {name: round(seconds, 4) for name, seconds in service.load_timings.items()},
+        "frozen_objects": gc.get_freeze_count(),
+    }
+    logger.info(
+        f"Started in {sum(timings.values()):.2f}s on the {app.state.startup['event_loop']} event loop: "
+        + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items())
+        + " (service: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in service.load_timings.items())
+        + ")")
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await service.outbox.stop()
+
 app = FastAPI(
     title=settings.app_name,
-    version=settings.app_version
+    version=settings.app_version,
+    lifespan=lifespan
 )
+app.add_middleware(MetricsMiddleware)
+if settings.server_timing_enabled:
+    app.add_middleware(ServerTimingMiddleware)
 
 # Mount static files if they exist (for images etc)
 static_path = os.path.join(os.path.dirname(__file__), "static")
@@ -29,6 +85,7 @@ templates = Jinja2Templates(directory=templates_path)
 
 # Include router
 app.include_router(door_access.router, prefix="/api/v1/door-access", tags=["Door Access"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["Admin"])
 
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
@@ -37,3 +94,8 @@ async def dashboard(request: Request):
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard_alias(request: Request):
     return templates.TemplateResponse("dashboard.html", {"request": request})
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (per worker process)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
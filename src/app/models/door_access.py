@@ -4,9 +4,9 @@
 Door Access Control Models
 Defines data structures for groups, doors, and user access permissions.
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, conint
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
 
@@ -19,6 +19,13 @@ class DoorStatus(str, Enum):
     ERROR = "error"
 
 
+class DoorDirection(str, Enum):
+    """Which way a door leads, for occupancy tracking."""
+    INTERNAL = "internal"
+    ENTRY = "entry"
+    EXIT = "exit"
+
+
 class AccessLogType(str, Enum):
     """Access log event types."""
     GRANTED = "granted"
@@ -29,6 +36,18 @@ class AccessLogType(str, Enum):
     EMERGENCY = "emergency"
 
 
+class AccessReason(str, Enum):
+    """Reason codes for access decisions."""
+    GRANTED = "granted"
+    USER_NOT_FOUND = "user_not_found"
+    DOOR_NOT_FOUND = "door_not_found"
+    USER_INACTIVE = "user_inactive"
+    FACE_NOT_REGISTERED = "face_not_registered"
+    NOT_AUTHORIZED = "not_authorized"
+    OUTSIDE_SCHEDULE = "outside_schedule"
+    ANTI_PASSBACK = "anti_passback"
+
+
 class Door(BaseModel):
     """Represents a physical door with access control."""
     id: str = Field(..., description="Unique door identifier")
@@ -39,6 +58,8 @@ class Door(BaseModel):
     status: DoorStatus = Field(default=DoorStatus.ONLINE)
     is_locked: bool = Field(default=True)
     building_id: str = Field(..., description="Building this door belongs to")
+    schedule_id: Optional[str] = Field(default=None, description="Schedule outside which the door admits no one")
+    direction: DoorDirection = Field(default=DoorDirection.INTERNAL, description="Entry or exit door of its building")
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     
@@ -56,6 +77,7 @@ class User(BaseModel):
     face_registered: bool = Field(default=True)
     is_active: bool = Field(default=True)
     authorized_doors: List[str] = Field(default_factory=list, description="Specific doors user can access")
+    schedule_id: Optional[str] = Field(default=None, description="Schedule limiting the user's authorized_doors")
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     
@@ -78,6 +100,47 @@ class Building(BaseModel):
         json_encoders = {datetime: lambda v: v.isoformat()}
 
 
+class AccessGroup(BaseModel):
+    """
+    Grants a set of doors to every user matching any of the group's roles
+    or departments, or listed as an explicit member.
+    """
+    id: str = Field(..., description="Unique access group identifier")
+    name: str = Field(..., description="Access group display name")
+    description: str = Field(default="", description="Access group description")
+    roles: List[str] = Field(default_factory=list, description="Users with any of these roles are members")
+    departments: List[str] = Field(default_factory=list, description="Users in any of these departments are members")
+    members: List[str] = Field(default_factory=list, description="User IDs that are members explicitly")
+    door_ids: List[str] = Field(default_factory=list, description="Doors granted to every member")
+    schedule_id: Optional[str] = Field(default=None, description="Schedule limiting this group's grants")
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+    
+    class Config:
+        json_encoders = {datetime: lambda v: v.isoformat()}
+
+
+class ScheduleWindow(BaseModel):
+    """A daily time window on some weekdays (0 = Monday). An end not after the start runs past midnight."""
+    days: List[conint(ge=0, le=6)] = Field(..., description="Weekdays, 0 = Monday ... 6 = Sunday")
+    start: str = Field(..., description="Start time, HH:MM")
+    end: str = Field(..., description="End time, HH:MM (24:00 for end of day)")
+
+
+class AccessSchedule(BaseModel):
+    """Weekly time windows, closed on the listed holidays."""
+    id: str = Field(..., description="Unique schedule identifier")
+    name: str = Field(..., description="Schedule display name")
+    description: str = Field(default="", description="Schedule description")
+    windows: List[ScheduleWindow] = Field(default_factory=list, description="When the schedule is open")
+    holidays: List[date] = Field(default_factory=list, description="Dates on which the schedule is closed")
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+    
+    class Config:
+        json_encoders = {datetime: lambda v: v.isoformat()}
+
+
 class AccessLog(BaseModel):
     """Represents an access attempt or door event."""
     id: str = Field(..., description="Unique log identifier")
@@ -89,6 +152,7 @@ class AccessLog(BaseModel):
     similarity_score: Optional[float] = Field(default=None, description="Face match score")
     building_id: Optional[str] = Field(default=None, description="Building context")
     details: str = Field(default="", description="Additional details")
+    multi_door: bool = Field(default=False, description="One of several doors granted by an event without a door")
     
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat()}
@@ -101,6 +165,17 @@ class DoorOpenRequest(BaseModel):
     reason: str = "manual"
 
 
+class FaceEmbeddingUpdate(BaseModel):
+    """Request to register a user's face embedding."""
+    embedding: List[float]
+
+
+class FaceMatchRequest(BaseModel):
+    """Face embedding from a camera to match against registered users."""
+    embedding: List[float]
+    door_id: Optional[str] = None
+
+
 class BuildingCreate(BaseModel):
     """Request to create a new building."""
     name: str
@@ -116,6 +191,8 @@ class DoorCreate(BaseModel):
     ip_address: str = ""
     port: int = 80
     building_id: str
+    schedule_id: Optional[str] = None
+    direction: DoorDirection = DoorDirection.INTERNAL
 
 
 class UserCreate(BaseModel):
@@ -127,7 +204,37 @@ class UserCreate(BaseModel):
     role: str = "employee"
 
 
+class AccessGroupCreate(BaseModel):
+    """Request to create a new access group."""
+    name: str
+    description: str = ""
+    roles: List[str] = []
+    departments: List[str] = []
+    members: List[str] = []
+    door_ids: List[str] = []
+    schedule_id: Optional[str] = None
+
+
+class AccessScheduleCreate(BaseModel):
+    """Request to create a new access schedule."""
+    name: str
+    description: str = ""
+    windows: List[ScheduleWindow] = []
+    holidays: List[date] = []
+
+
 class DoorAuthorizationUpdate(BaseModel):
     """Request to update user authorization for specific doors."""
     user_id: str
     door_ids: List[str]
+
+
+class BatchOperation(BaseModel):
+    """A single service operation inside a batch request."""
+    op: str = Field(..., description="Service operation, e.g. create_door or authorize_user_for_doors")
+    args: Dict[str, Any] = Field(default_factory=dict, description="Keyword arguments; \"$N\" refers to the ID produced by operation N")
+
+
+class BatchRequest(BaseModel):
+    """Request to apply several mutations as one transaction."""
+    operations: List[BatchOperation]
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compiled Authorization Matrix
+Per-door bitsets over interned user handles for constant-time access decisions.
+"""
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from src.app.models.door_access import AccessReason
+from src.app.services.schedules import CompiledSchedule, union
+
+# Per-user flag bits
+_PRESENT = 0x1
+_ACTIVE = 0x2
+_FACE_REGISTERED = 0x4
+_ELIGIBLE = _PRESENT | _ACTIVE | _FACE_REGISTERED
+
+# Enum attribute access is slow on the hot path; bind the members once
+_GRANTED = AccessReason.GRANTED
+_USER_NOT_FOUND = AccessReason.USER_NOT_FOUND
+_DOOR_NOT_FOUND = AccessReason.DOOR_NOT_FOUND
+_USER_INACTIVE = AccessReason.USER_INACTIVE
+_FACE_NOT_REGISTERED = AccessReason.FACE_NOT_REGISTERED
+_NOT_AUTHORIZED = AccessReason.NOT_AUTHORIZED
+_OUTSIDE_SCHEDULE = AccessReason.OUTSIDE_SCHEDULE
+
+
+class AccessMatrix:
+    """
+    User x door authorization matrix.
+
+    Each door owns a bitset (a bytearray indexed by user handle) in which a
+    bit is set only if the user is present, active, face-registered and
+    granted that door. A decision is therefore two handle lookups and a bit
+    test; the per-user flags are consulted only to explain a denial.
+
+    Doors and grants can be limited to schedules. A set bit then also
+    requires the door's schedule and, for a grant held only through
+    scheduled grants, the union of those schedules to be open. Each set of
+    schedule IDs in use is precompiled into one bitmap, so this adds at
+    most two dict lookups and two bit tests, and nothing while no
+    schedules are attached.
+
+    snapshot() returns a read-only matrix that shares its rows with this
+    one. Shared rows are copied before they are next modified, so readers
+    of a snapshot never observe later writes.
+    """
+
+    def __init__(self):
+        self._rows: Dict[int, bytearray] = {}
+        self._user_flags = bytearray()
+        # Door handles whose row currently has the user's bit set
+        self._lit: Dict[int, Set[int]] = {}
+        # Schedule windows: compiled schedules by ID, their unions by set of
+        # IDs, and the set limiting each door and each scheduled grant
+        self._schedules: Dict[str, CompiledSchedule] = {}
+        self._unions: Dict[FrozenSet[str], CompiledSchedule] = {}
+        self._door_windows: Dict[int, FrozenSet[str]] = {}
+        self._grant_windows: Dict[Tuple[int, int], FrozenSet[str]] = {}
+        # Door handles of each user's scheduled grants (writer bookkeeping)
+        self._user_windows: Dict[int, Set[int]] = {}
+        # Copy-on-write bookkeeping for snapshot()
+        self._snapshot: Optional["AccessMatrix"] = None
+        self._shared_rows: Set[int] = set()
+        self._flags_shared = False
+        self._windows_shared = False
+
+    # ==================== Decisions ====================
+
+    def decide(self, user_handle: Optional[int], door_handle: Optional[int],
+               when: Optional[datetime] = None) -> AccessReason:
+        """Return the access decision for a user/door handle pair at `when` (default: now)."""
+        flags = self._user_flags
+        if user_handle is None or user_handle >= len(flags) or not flags[user_handle] & _PRESENT:
+            return _USER_NOT_FOUND
+        row = self._rows.get(door_handle)
+        if row is None:
+            return _DOOR_NOT_FOUND
+        index = user_handle >> 3
+        if index < len(row) and row[index] & (1 << (user_handle & 7)):
+            if self._door_windows or self._grant_windows:
+                return _GRANTED if self.within_schedule(user_handle, door_handle, when) else _OUTSIDE_SCHEDULE
+            return _GRANTED
+
+        user_flags = flags[user_handle]
+        if not user_flags & _ACTIVE:
+            return _USER_INACTIVE
+        if not user_flags & _FACE_REGISTERED:
+            return _FACE_NOT_REGISTERED
+        return _NOT_AUTHORIZED
+
+    def within_schedule(self, user_handle: int, door_handle: int, when: Optional[datetime] = None) -> bool:
+        """Whether the schedules limiting a user's grant of a door (if any) are open at `when`."""
+        grant_key = self._grant_windows.get((user_handle, door_handle))
+        door_key = self._door_windows.get(door_handle)
+        if grant_key is None and door_key is None:
+            return True
+        if when is None:
+            when = datetime.now()
+        if grant_key is not None and not self._unions[grant_key].is_open(when):
+            return False
+        return door_key is None or self._unions[door_key].is_open(when)
+
+    def is_allowed(self, user_handle: int, door_handle: int) -> bool:
+        """Return True if the user's bit is set in the door's row."""
+        row = self._rows.get(door_handle)
+        if row is None:
+            return False
+        index = user_handle >> 3
+        return index < len(row) and bool(row[index] & (1 << (user_handle & 7)))
+
+    def allowed_users(self, door_handle: int) -> Iterable[int]:
+        """Yield the handles of users allowed through a door."""
+        row = self._rows.get(door_handle)
+        if row is None:
+            return
+        for index, byte in enumerate(row):
+            while byte:
+                low = byte & -byte
+                yield (index << 3) | (low.bit_length() - 1)
+                byte ^= low
+
+    # ==================== Snapshots ====================
+
+    def snapshot(self) -> "AccessMatrix":
+        """Return a read-only view of the current matrix (O(doors), rows are shared)."""
+        if self._snapshot is None:
+            view = AccessMatrix()
+            view._rows = dict(self._rows)
+            view._user_flags = self._user_flags
+            view._unions = self._unions
+            view._door_windows = self._door_windows
+            view._grant_windows = self._grant_windows
+            self._shared_rows = set(self._rows)
+            self._flags_shared = True
+            self._windows_shared = True
+            self._snapshot = view
+        return self._snapshot
+
+    def _writable_row(self, door_handle: int) -> bytearray:
+        """Return a door's row for modification, copying it if a snapshot shares it."""
+        self._snapshot = None
+        row = self._rows[door_handle]
+        if door_handle in self._shared_rows:
+            self._shared_rows.discard(door_handle)
+            row = self._rows[door_handle] = bytearray(row)
+        return row
+
+    def _writable_flags(self) -> bytearray:
+        """Return the user flags for modification, copying them if a snapshot shares them."""
+        self._snapshot = None
+        if self._flags_shared:
+            self._flags_shared = False
+            self._user_flags = bytearray(self._user_flags)
+        return self._user_flags
+
+    def _writable_windows(self):
+        """Copy the schedule tables before modifying them if a snapshot shares them."""
+        self._snapshot = None
+        if self._windows_shared:
+            self._windows_shared = False
+            self._unions = dict(self._unions)
+            self._door_windows = dict(self._door_windows)
+            self._grant_windows = dict(self._grant_windows)
+
+    def _ensure_union(self, key: FrozenSet[str]):
+        if key not in self._unions:
+            self._unions[key] = union(self._schedules.get(schedule_id) for schedule_id in key)
+
+    # ==================== Maintenance ====================
+
+    def set_schedule(self, schedule_id: str, compiled: Optional[CompiledSchedule]):
+        """Replace (or with None, remove) a compiled schedule and every union containing it."""
+        self._writable_windows()
+        if compiled is None:
+            self._schedules.pop(schedule_id, None)
+        else:
+            self._schedules[schedule_id] = compiled
+        for key in [key for key in self._unions if schedule_id in key]:
+            del self._unions[key]
+            self._ensure_union(key)
+
+    def set_door_schedule(self, door_handle: int, schedule_id: Optional[str]):
+        """Limit every grant of a door to a schedule (None lifts the limit)."""
+        current = self._door_windows.get(door_handle)
+        key = frozenset((schedule_id,)) if schedule_id is not None else None
+        if current == key:
+            return
+        self._writable_windows()
+        if key is None:
+            del self._door_windows[door_handle]
+        else:
+            self._ensure_union(key)
+            self._door_windows[door_handle] = key
+
+    def _set_grant_windows(self, user_handle: int, windows: Optional[Dict[int, FrozenSet[str]]]):
+        old = self._user_windows.get(user_handle)
+        if not old and not windows:
+            return
+        self._writable_windows()
+        grant_windows = self._grant_windows
+        for door_handle in old or ():
+            del grant_windows[(user_handle, door_handle)]
+        if windows:
+            for door_handle, key in windows.items():
+                self._ensure_union(key)
+                grant_windows[(user_handle, door_handle)] = key
+            self._user_windows[user_handle] = set(windows)
+        else:
+            del self._user_windows[user_handle]
+
+    def set_user(self, user_handle: int, is_active: bool, face_registered: bool,
+                 door_handles: Iterable[int], windows: Optional[Dict[int, FrozenSet[str]]] = None):
+        """
+        Recompile a user's column from their flags and granted doors.
+        `windows` maps the doors granted only under schedules to those schedules' IDs.
+        """
+        self._set_grant_windows(user_handle, windows)
+        user_flags = self._writable_flags()
+        if user_handle >= len(user_flags):
+            user_flags.extend(bytes(user_handle + 1 - len(user_flags)))
+        flags = _PRESENT
+        if is_active:
+            flags |= _ACTIVE
+        if face_registered:
+            flags |= _FACE_REGISTERED
+        user_flags[user_handle] = flags
+
+        rows = self._rows
+        wanted = {d for d in door_handles if d in rows} if flags == _ELIGIBLE else set()
+        lit = self._lit.get(user_handle)
+        if lit:
+            for door_handle in lit - wanted:
+                self._clear_bit(door_handle, user_handle)
+            wanted_new = wanted - lit
+        else:
+            wanted_new = wanted
+        for door_handle in wanted_new:
+            self._set_bit(door_handle, user_handle)
+        if wanted:
+            self._lit[user_handle] = wanted
+        else:
+            self._lit.pop(user_handle, None)
+
+    def remove_user(self, user_handle: int):
+        """Clear a user's column and mark the handle as unknown."""
+        for door_handle in self._lit.pop(user_handle, ()):
+            self._clear_bit(door_handle, user_handle)
+        self._set_grant_windows(user_handle, None)
+        if user_handle < len(self._user_flags):
+            self._writable_flags()[user_handle] = 0
+
+    def add_door(self, door_handle: int, user_handles: Iterable[int] = ()):
+        """Create a door's row, lighting bits for already-granted eligible users."""
+        if door_handle in self._rows:
+            return
+        self._snapshot = None
+        self._rows[door_handle] = bytearray()
+        flags = self._user_flags
+        for user_handle in user_handles:
+            if user_handle < len(flags) and flags[user_handle] == _ELIGIBLE:
+                self._set_bit(door_handle, user_handle)
+                self._lit.setdefault(user_handle, set()).add(door_handle)
+
+    def remove_door(self, door_handle: int):
+        """Drop a door's row."""
+        row = self._rows.get(door_handle)
+        if row is None:
+            return
+        for user_handle in list(self.allowed_users(door_handle)):
+            lit = self._lit.get(user_handle)
+            if lit is not None:
+                lit.discard(door_handle)
+                if not lit:
+                    del self._lit[user_handle]
+        if door_handle in self._door_windows or self._grant_windows:
+            self._writable_windows()
+            self._door_windows.pop(door_handle, None)
+            for user_handle, doors in list(self._user_windows.items()):
+                if door_handle in doors:
+                    del self._grant_windows[(user_handle, door_handle)]
+                    doors.discard(door_handle)
+                    if not doors:
+                        del self._user_windows[user_handle]
+        self._snapshot = None
+        self._shared_rows.discard(door_handle)
+        del self._rows[door_handle]
+
+    def _set_bit(self, door_handle: int, user_handle: int):
+        row = self._writable_row(door_handle)
+        index = user_handle >> 3
+        if index >= len(row):
+            # Grow geometrically so bulk loads don't reallocate per user
+            row.extend(bytes(max(index + 1 - len(row), len(row))))
+        row[index] |= 1 << (user_handle & 7)
+
+    def _clear_bit(self, door_handle: int, user_handle: int):
+        if door_handle not in self._rows:
+            return
+        row = self._writable_row(door_handle)
+        index = user_handle >> 3
+        if index < len(row):
+            row[index] &= ~(1 << (user_handle & 7)) & 0xFF
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Admission Control
+Token-bucket rate limits and in-flight bounds for face recognition events,
+keyed by door and by source, so one noisy camera can't starve the rest.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from src.utils.metrics import Counter
+
+ADMISSION_REJECTED = Counter(
+    "visage_admission_rejected_total", "Face recognition events shed by admission control.",
+    ("scope", "door_id"))
+
+
+class AdmissionRejected(Exception):
+    """An event was shed; retry_after is the suggested wait in seconds."""
+
+    def __init__(self, scope: str, key: str, retry_after: float):
+        super().__init__(f"Too many face recognition events for {scope} {key}")
+        self.scope = scope
+        self.key = key
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets refilled lazily: each key holds up to `burst`
+    tokens and regains `rate` per second. A rate of 0 disables the limit.
+
+    Keys can come from clients, so once more than `max_keys` are tracked
+    the buckets that have refilled completely (i.e. idle keys) are dropped.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        # key -> [tokens, time of last refill]
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key. Returns 0 if admitted, else seconds until a token is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0.0
+            return (1.0 - bucket[0]) / self.rate
+
+    def _prune(self, now: float):
+        full = [key for key, (tokens, last) in self._buckets.items()
+                if tokens + (now - last) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+
+class AdmissionController:
+    """
+    Admission for face recognition events: a token bucket per door and per
+    source (camera), plus a bound on events in flight per door. Events over
+    any limit are rejected immediately instead of queuing behind the rest.
+    """
+
+    def __init__(self, door_rate: float, door_burst: float, source_rate: float, source_burst: float,
+                 max_in_flight: int):
+        self.doors = TokenBucketLimiter(door_rate, door_burst)
+        self.sources = TokenBucketLimiter(source_rate, source_burst)
+        self.max_in_flight = max_in_flight
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, door_key: Optional[str], source: str) -> Iterator[None]:
+        """
+        Run the with-block as an admitted event, or raise AdmissionRejected.
+        An event without a door (door_key None) is limited by its source
+        only, so one camera can't use up a bucket every other camera shares.
+        """
+        wait = self.sources.acquire(source)
+        if wait:
+            ADMISSION_REJECTED.inc("source", door_key or "<any>")
+            raise AdmissionRejected("source", source, wait)
+        if door_key is None:
+            yield
+            return
+        wait = self.doors.acquire(door_key)
+        if wait:
+            ADMISSION_REJECTED.inc("door", door_key)
+            raise AdmissionRejected("door", door_key, wait)
+
+        with self._lock:
+            in_flight = self._in_flight.get(door_key, 0)
+            if self.max_in_flight and in_flight >= self.max_in_flight:
+                admitted = False
+            else:
+                admitted = True
+                self._in_flight[door_key] = in_flight + 1
+        if not admitted:
+            ADMISSION_REJECTED.inc("in_flight", door_key)
+            raise AdmissionRejected("door", door_key, 1.0)
+        try:
+            yield
+        finally:
+            with self._lock:
+                remaining = self._in_flight[door_key] - 1
+                if remaining:
+                    self._in_flight[door_key] = remaining
+                else:
+                    del self._in_flight[door_key]
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After value: whole seconds, at least 1."""
+    return str(max(1, math.ceil(seconds)))
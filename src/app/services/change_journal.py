@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Change Journal
+Append-only log of entity mutations with periodic compact snapshots.
+"""
+import itertools
+import json
+import logging
+import os
+import re
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Who is making the current change; set per request by the API layer
+current_actor: ContextVar[str] = ContextVar("current_actor", default="system")
+
+_COMPACT = (",", ":")
+_SEGMENT_NAME = re.compile(r"changes-(\d+)-(\d+)\.jsonl$")
+
+
+class ChangeJournal:
+    """
+    Append-only journal of entity changes.
+
+    Every committed mutation becomes an event
+    {"version", "timestamp", "actor", "collection", "entity_id", "op", "data"}
+    appended to changes.jsonl, where op is "put" (data is the full entity)
+    or "delete" (data is None). Periodically the full state is written to
+    snapshot.json and the journal segment it covers is moved to journal/,
+    so a restart reads one snapshot plus a short tail and older history is
+    kept for auditing.
+
+    A small manifest records the fingerprints of the JSON data files as of
+    the last commit, so a restart can tell whether they were edited while
+    the service was down. Because the manifest is replaced on every commit,
+    other worker processes can stat it to notice new changes cheaply and
+    then follow() the journal from where they last read.
+    """
+
+    def __init__(self, data_dir: str, retain: int = 10000):
+        self.journal_file = os.path.join(data_dir, "changes.jsonl")
+        self.snapshot_file = os.path.join(data_dir, "snapshot.json")
+        self.manifest_file = os.path.join(data_dir, "manifest.json")
+        self.archive_dir = os.path.join(data_dir, "journal")
+
+        self.version = 0
+        self.snapshot_version = 0
+        # Most recent events, kept in memory for change feeds
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=retain)
+        
+        # Read position in the live journal file, for follow()
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._manifest_seen: Optional[Tuple[int, int]] = None
+
+    @property
+    def pending(self) -> int:
+        """Number of events written since the last snapshot."""
+        return self.version - self.snapshot_version
+
+    # ==================== Reading ====================
+
+    def has_snapshot(self) -> bool:
+        return os.path.exists(self.snapshot_file)
+
+    def load(self, decode: Callable[[bytes], Dict[str, Any]] = json.loads
+             ) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Return the latest snapshot (or None) and the events written after it.
+        decode turns the raw snapshot bytes into a mapping with a "version" key.
+        """
+        snapshot = None
+        self.version = self.snapshot_version = 0
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'rb') as f:
+                snapshot = decode(f.read())
+            self.snapshot_version = self.version = snapshot["version"]
+
+        self._offset, self._inode = 0, None
+        self.recent.clear()
+        tail = self.follow()
+        
+        # Drop a torn final record left by a crash mid-append, so the next
+        # append starts on a fresh line (callers hold the write lock here)
+        if self._inode is not None and os.path.getsize(self.journal_file) > self._offset:
+            logger.warning("Truncating incomplete journal record")
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(self._offset)
+        return snapshot, tail
+
+    def follow(self) -> List[Dict[str, Any]]:
+        """
+        Read the events appended since this journal last read or wrote,
+        including ones another process wrote. If the journal was rotated by
+        a snapshot in the meantime, the archived segment is read first.
+        """
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            stat = None
+        
+        events: List[Dict[str, Any]] = []
+        if stat is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Not the file we were reading; anything we missed has been archived
+            events.extend(self._read_archived(self.version))
+            self._offset = 0
+            self._inode = stat.st_ino if stat is not None else None
+        if stat is not None:
+            live, self._offset = self._read_segment(self.journal_file, self._offset)
+            events.extend(live)
+        
+        events = [e for e in events if e["version"] > self.version]
+        if events:
+            self.version = events[-1]["version"]
+            self.recent.extend(events)
+        return events
+
+    @staticmethod
+    def _read_segment(path: str, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Read complete records from a journal file. Returns (events, end offset)."""
+        events = []
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Incomplete record: still being written, or torn by a crash
+                    break
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping corrupt journal record")
+        return events, offset
+
+    def _read_archived(self, after: int) -> List[Dict[str, Any]]:
+        """Read archived events with version > after, oldest segment first."""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        segments = []
+        for name in os.listdir(self.archive_dir):
+            match = _SEGMENT_NAME.match(name)
+            if match and int(match.group(2)) > after:
+                segments.append((int(match.group(1)), int(match.group(2)), name))
+        events = []
+        for _, last, name in sorted(segments):
+            segment, _ = self._read_segment(os.path.join(self.archive_dir, name))
+            events.extend(segment)
+            self.snapshot_version = max(self.snapshot_version, last)
+        return events
+
+    def events_since(self, version: int, until: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return the retained events with version > `version` (and <= `until`),
+        or None if some of them are no longer held in memory (the caller
+        must resync fully). Safe to call while another thread appends.
+        """
+        until = self.version if until is None else until
+        if version >= until:
+            return []
+        # deque.copy() runs without releasing the GIL, so a concurrent
+        # append can't invalidate the iteration below
+        recent = self.recent.copy()
+        if not recent or recent[0]["version"] > version + 1:
+            return None
+        # Retained versions are contiguous, so the bounds are offsets
+        first = recent[0]["version"]
+        return list(itertools.islice(recent, version + 1 - first, until + 1 - first))
+
+    # ==================== Writing ====================
+
+    def append(self, changes: List[Tuple[str, str, Optional[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Append (collection, entity_id, data-or-None) changes as one group."""
+        timestamp = datetime.now().isoformat()
+        actor = current_actor.get()
+        events = []
+        for collection, entity_id, data in changes:
+            self.version += 1
+            events.append({
+                "version": self.version,
+                "timestamp": timestamp,
+                "actor": actor,
+                "collection": collection,
+                "entity_id": entity_id,
+                "op": "delete" if data is None else "put",
+                "data": data,
+            })
+        with open(self.journal_file, 'ab') as f:
+            f.write("".join(json.dumps(e, separators=_COMPACT) + "\n" for e in events).encode())
+            self._offset = f.tell()
+            self._inode = os.fstat(f.fileno()).st_ino
+        self.recent.extend(events)
+        return events
+
+    def write_snapshot(self, state: Dict[str, List[Dict[str, Any]]]):
+        """Write the full state at the current version and archive the journal segment."""
+        document = {"version": self.version, "created_at": datetime.now().isoformat(), **state}
+        tmp_path = f"{self.snapshot_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(document, f, separators=_COMPACT)
+        os.replace(tmp_path, self.snapshot_file)
+
+        if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > 0:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            segment = f"changes-{self.snapshot_version + 1:010d}-{self.version:010d}.jsonl"
+            os.replace(self.journal_file, os.path.join(self.archive_dir, segment))
+        self._offset, self._inode = 0, None
+        self.snapshot_version = self.version
+        logger.info(f"Wrote snapshot at version {self.version}")
+
+    def reset(self):
+        """
+        Start a new baseline after the data files were replaced externally.
+        Bumps the version so feed consumers holding older versions resync.
+        """
+        self.version += 1
+        self.recent.clear()
+
+    # ==================== Data File Manifest ====================
+
+    @staticmethod
+    def _fingerprint(path: str) -> Optional[List[int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def record_files(self, paths: List[str]):
+        """Remember the data files' fingerprints as of the current version."""
+        manifest = {
+            "version": self.version,
+            "files": {os.path.basename(p): self._fingerprint(p) for p in paths},
+        }
+        tmp_path = f"{self.manifest_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_file)
+        self.mark_manifest_seen()
+
+    def _manifest_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.manifest_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def manifest_changed(self) -> bool:
+        """True if some process committed since mark_manifest_seen (one stat call)."""
+        return self._manifest_stat() != self._manifest_seen
+
+    def mark_manifest_seen(self):
+        self._manifest_seen = self._manifest_stat()
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.manifest_file):
+            return None
+        try:
+            with open(self.manifest_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def files_version(self, paths: List[str]) -> Optional[int]:
+        """
+        Return the version the data files were last written at, or None if
+        they no longer match the manifest (edited or restored externally).
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            return None
+        for path in paths:
+            if manifest["files"].get(os.path.basename(path)) != self._fingerprint(path):
+                return None
+        return manifest["version"]
+
+    def modified_files(self, paths: List[str]) -> List[str]:
+        """The data files that no longer match the manifest (all of them if there is none)."""
+        manifest = self._read_manifest()
+        if manifest is None:
+            return list(paths)
+        return [path for path in paths
+                if manifest["files"].get(os.path.basename(path)) != self._fingerprint(path)]
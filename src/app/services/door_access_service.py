@@ -4,22 +4,151 @@
 Door Access Control Service
 Manages groups, doors, users, and access permissions.
 """
+import gc
 import json
 import os
 import logging
+import time
 import uuid
 import asyncio
 import aiohttp
-from datetime import datetime
-from typing import Dict, List, Optional, Any
-from threading import Lock
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional, Any, Set, Tuple, Iterator
+from threading import Lock, RLock
 
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import NotRequired, TypedDict
+
+from src.app.core.config import settings
 from src.app.models.door_access import (
-    Door, User, Building, AccessLog, DoorStatus, AccessLogType
+    Door, User, Building, AccessGroup, AccessSchedule, AccessLog, DoorDirection, DoorStatus, AccessLogType,
+    AccessReason
 )
+from src.app.services.access_matrix import AccessMatrix
+from src.app.services.change_journal import ChangeJournal, current_actor
+from src.app.services.embedding_index import EmbeddingIndex
+from src.app.services.file_watcher import DataFileWatcher
+from src.app.services.log_shards import AccessLogShards
+from src.app.services.occupancy import OccupancyTracker
+from src.app.services.id_interner import IdInterner
+from src.app.services.outbox import DeferredDelivery, Outbox, PermanentDeliveryError
+from src.app.services.schedules import compile_schedule
+from src.app.services.user_search import UserSearchIndex
+from src.app.services.rollups import HourlyRollups
+from src.app.services.score_stats import BINS as SCORE_BINS, ScoreStats
+from src.utils.file_lock import InterProcessLock
+from src.utils.metrics import CallbackGauge, Counter, Histogram, timed
+from src.utils.timing import phase
 
 logger = logging.getLogger(__name__)
 
+# Metrics exposed on /metrics
+FACE_RECOGNITION_SECONDS = Histogram(
+    "visage_face_recognition_seconds", "Latency of process_face_recognition_access.")
+SAVE_SECONDS = Histogram(
+    "visage_save_seconds", "Time to write a collection to its JSON file.", ("collection",))
+CONTROLLER_SECONDS = Histogram(
+    "visage_controller_request_seconds", "Door controller unlock call latency by outcome.", ("outcome",))
+EMBEDDING_SEARCH_SECONDS = Histogram(
+    "visage_embedding_search_seconds", "Face embedding gallery search latency.")
+ACCESS_DECISIONS = Counter(
+    "visage_access_decisions_total", "Face-recognition access decisions by door and result.",
+    ("door_id", "result"))
+
+# Human-readable messages for denial reason codes
+ACCESS_REASON_MESSAGES = {
+    AccessReason.USER_NOT_FOUND: "User not found",
+    AccessReason.DOOR_NOT_FOUND: "Door not found",
+    AccessReason.USER_INACTIVE: "User account is inactive",
+    AccessReason.FACE_NOT_REGISTERED: "Face not registered",
+    AccessReason.NOT_AUTHORIZED: "User not authorized for this door",
+    AccessReason.OUTSIDE_SCHEDULE: "Access not allowed at this time",
+    AccessReason.ANTI_PASSBACK: "Anti-passback: entry or exit out of sequence",
+}
+_GRANTED = AccessReason.GRANTED
+_ANTI_PASSBACK = AccessReason.ANTI_PASSBACK
+
+
+class BatchError(Exception):
+    """Raised when a batch of mutations fails and has been rolled back."""
+    
+    def __init__(self, message: str, index: Optional[int] = None):
+        super().__init__(message if index is None else f"Operation {index}: {message}")
+        self.index = index
+
+
+class _Snapshot(TypedDict):
+    """Layout of snapshot.json."""
+    version: int
+    buildings: List[Building]
+    doors: List[Door]
+    users: List[User]
+    # Absent from snapshots written before access groups existed
+    access_groups: NotRequired[List[AccessGroup]]
+    schedules: NotRequired[List[AccessSchedule]]
+
+
+# Decodes and validates a snapshot straight from bytes in pydantic-core
+_SNAPSHOT_ADAPTER = TypeAdapter(_Snapshot)
+# Likewise for the entity files, without building the rows as dicts first
+_FILE_ADAPTERS = {model_cls: TypeAdapter(List[model_cls])
+                  for model_cls in (Building, Door, User, AccessGroup, AccessSchedule)}
+# Validates the retained access log rows in one call rather than one model call per row
+_LOG_ADAPTER = TypeAdapter(List[AccessLog])
+
+
+class _UnitOfWork:
+    """Pending changes of an open DoorAccessService.batch() block."""
+    
+    def __init__(self):
+        # (collection, entity_id) -> the entity as it was before the batch
+        # touched it, or None if the entity did not exist yet
+        self.originals: Dict[Tuple[str, str], Optional[BaseModel]] = {}
+        # Collections whose save was requested while the batch was open
+        self.dirty: Set[str] = set()
+        # Changes outside the entity stores (the embedding index), made
+        # only once the batch has committed
+        self.after_commit: List[Callable[[], Any]] = []
+
+
+class _ReadView(NamedTuple):
+    """
+    Immutable state published for readers. Read methods take the current
+    view once and work only from it, so they see one consistent version
+    and never race with (or wait for) writers building the next one.
+    """
+    version: int
+    buildings: Dict[str, Building]
+    doors: Dict[str, Door]
+    users: Dict[str, User]
+    access_groups: Dict[str, AccessGroup]
+    schedules: Dict[str, AccessSchedule]
+    building_doors: Dict[int, FrozenSet[int]]
+    door_users: Dict[int, FrozenSet[int]]
+    matrix: AccessMatrix
+
+
+def _retryable_status(status: int) -> bool:
+    """Whether an HTTP error status may succeed on retry (server errors, timeouts, throttling)."""
+    return status >= 500 or status in (408, 429)
+
+
+def _freeze_index(index: Dict[int, Set[int]], previous: Optional[Dict[int, FrozenSet[int]]],
+                  changed: Set[int]) -> Dict[int, FrozenSet[int]]:
+    """Frozen copy of an index, reusing the previous copy's unchanged entries."""
+    if previous is None:
+        return {key: frozenset(members) for key, members in index.items()}
+    frozen = dict(previous)
+    for key in changed:
+        members = index.get(key)
+        if members:
+            frozen[key] = frozenset(members)
+        else:
+            frozen.pop(key, None)
+    return frozen
+
 
 class DoorAccessService:
     """Service for managing door access control."""
@@ -27,6 +156,34 @@ class DoorAccessService:
     _instance = None
     _lock = Lock()
     
+    # Journaled entity collections and their model classes
+    COLLECTIONS: Dict[str, type] = {
+        "buildings": Building, "doors": Door, "users": User, "access_groups": AccessGroup,
+        "schedules": AccessSchedule,
+    }
+    
+    # Operations accepted by apply_batch, with the error reported when the
+    # service method returns None/False
+    BATCH_OPERATIONS: Dict[str, str] = {
+        "create_building": "Building could not be created",
+        "update_building": "Building not found",
+        "delete_building": "Building not found",
+        "create_door": "Invalid building ID",
+        "update_door": "Door not found",
+        "delete_door": "Door not found",
+        "create_user": "User could not be created",
+        "update_user": "User not found",
+        "delete_user": "User not found",
+        "authorize_user_for_doors": "User not found",
+        "set_user_face_registered": "User not found",
+        "create_access_group": "Access group could not be created",
+        "update_access_group": "Access group not found",
+        "delete_access_group": "Access group not found",
+        "create_schedule": "Schedule could not be created",
+        "update_schedule": "Schedule not found",
+        "delete_schedule": "Schedule not found",
+    }
+    
     def __new__(cls):
         with cls._lock:
             if cls._instance is None:
@@ -38,110 +195,1168 @@ class DoorAccessService:
         if self._initialized:
             return
             
-        self.data_dir = "Data/door_access"
+        self.data_dir = settings.data_dir
         os.makedirs(self.data_dir, exist_ok=True)
         
         self.buildings_file = os.path.join(self.data_dir, "buildings.json")
         self.doors_file = os.path.join(self.data_dir, "doors.json")
         self.users_file = os.path.join(self.data_dir, "users.json")
+        self.access_groups_file = os.path.join(self.data_dir, "access_groups.json")
+        self.schedules_file = os.path.join(self.data_dir, "schedules.json")
+        self.access_logs_dir = os.path.join(self.data_dir, "access_logs")
+        # Single log file of older versions, split into access_logs_dir on load
         self.access_logs_file = os.path.join(self.data_dir, "access_logs.json")
+        self.score_stats_file = os.path.join(self.data_dir, "score_stats.json")
+        self.occupancy_file = os.path.join(self.data_dir, "occupancy.json")
+        self.rollups_dir = os.path.join(self.data_dir, "rollups")
         
         self.buildings: Dict[str, Building] = {}
         self.doors: Dict[str, Door] = {}
         self.users: Dict[str, User] = {}
+        self.access_groups: Dict[str, AccessGroup] = {}
+        self.schedules: Dict[str, AccessSchedule] = {}
         self.access_logs: List[AccessLog] = []
         
-        self._load_data()
+        # Dense integer handles for string IDs. All internal indexes and log
+        # columns are keyed by handle; the models and files keep string IDs.
+        self._building_keys = IdInterner()
+        self._door_keys = IdInterner()
+        self._user_keys = IdInterner()
+        
+        # Grant indexes: user -> doors, door -> users, building -> doors
+        self._user_doors: Dict[int, Set[int]] = {}
+        self._door_users: Dict[int, Set[int]] = {}
+        self._building_doors: Dict[int, Set[int]] = {}
+        self._door_building: Dict[int, int] = {}
+        
+        # Compiled access groups: membership criteria -> group IDs, each
+        # group's criteria and door handles as last indexed, and users by
+        # role/department so a group edit finds the users it affects.
+        # A user's grants (above) are authorized_doors plus their groups' doors;
+        # those held only under schedules are limited in the access matrix.
+        self._role_groups: Dict[str, Set[str]] = {}
+        self._department_groups: Dict[str, Set[str]] = {}
+        self._member_groups: Dict[str, Set[str]] = {}
+        self._group_criteria: Dict[str, Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]] = {}
+        self._group_doors: Dict[str, FrozenSet[int]] = {}
+        self._group_schedules: Dict[str, str] = {}
+        self._role_users: Dict[str, Set[int]] = {}
+        self._department_users: Dict[str, Set[int]] = {}
+        self._user_criteria: Dict[int, Tuple[str, str]] = {}
+        
+        # Compiled user x door matrix for the face-recognition decision path
+        self._access_matrix = AccessMatrix()
+        
+        # Word index over user ID, name, email and department, built on the first search
+        self._user_search = UserSearchIndex()
+        
+        # Access log columns, parallel to self.access_logs (-1 means None)
+        self._log_doors = array('l')
+        self._log_users = array('l')
+        self._log_buildings = array('l')
+        self._log_ids: Set[str] = set()
+        
+        # Access log persistence, one file and lock per building (the most
+        # recent access_log_retention entries each). Appends only take this
+        # process-local lock, so events in different buildings (or worker
+        # processes) never wait for each other's saves.
+        self._log_shards = AccessLogShards(self.access_logs_dir, retain=settings.access_log_retention)
+        self._log_lock = RLock()
+        
+        # Similarity score distributions over every log entry ever appended,
+        # not just the retained ones; saved every score_stats_save_interval
+        self._score_stats = ScoreStats(settings.access_log_retention)
+        self._next_score_stats_save = 0.0
+        
+        # Hourly event counts for long-range statistics; log entries up to
+        # _rolled_up have been folded in (see compact_access_history())
+        self._rollups = HourlyRollups(settings.access_log_retention)
+        self._rolled_up = 0
+        
+        # Who is inside each building, from granted passages at entry and
+        # exit doors; saved with the rollups (see compact_access_history())
+        self._occupancy = OccupancyTracker()
+        
+        # Registered users' face embeddings, for matching on the dashboard
+        self._embeddings = EmbeddingIndex(
+            os.path.join(self.data_dir, "embeddings"), settings.embedding_dim,
+            ivf_lists=settings.embedding_ivf_lists, ivf_probes=settings.embedding_ivf_probes)
+        
+        # Outbound calls that failed, retried in the background once the
+        # app starts the outbox (see src/app/main.py)
+        self.outbox = Outbox(
+            os.path.join(self.data_dir, "outbox"), base_delay=settings.outbox_base_delay,
+            max_delay=settings.outbox_max_delay, max_attempts=settings.outbox_max_attempts,
+            batch_size=settings.outbox_batch_size)
+        self.outbox.register("unlock", self._deliver_unlock)
+        self.outbox.register("verify_user", self._deliver_user_verification)
+        
+        # Cross-process coherence: writers from every worker process serialize
+        # on this lock, and readers poll for other workers' commits
+        self._file_lock = InterProcessLock(os.path.join(self.data_dir, ".lock"))
+        self._next_sync = 0.0
+        
+        # Open unit of work, if any (see batch())
+        self._batch: Optional[_UnitOfWork] = None
+        
+        # The collections and indexes above are the writers' working state,
+        # only touched under _file_lock. Readers use the published view;
+        # these record what changed since it was published (see _publish())
+        self._view: Optional[_ReadView] = None
+        self._stale: Set[str] = set()
+        self._stale_building_doors: Set[int] = set()
+        self._stale_door_users: Set[int] = set()
+        
+        # Change journal and snapshots (None when disabled)
+        self._journal = ChangeJournal(self.data_dir) if settings.journal_enabled else None
+        
+        # Loading allocates hundreds of thousands of long-lived objects; pause
+        # the cyclic GC so it doesn't repeatedly traverse them mid-load
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        # Seconds spent per loading phase, reported at server start-up
+        self.load_timings: Dict[str, float] = {}
+        mark = time.perf_counter()
+        try:
+            with self._file_lock:
+                self._load_data()
+                # The entity files as loaded, for noticing external edits
+                self._data_files = DataFileWatcher(self._entity_files)
+                self._load_score_stats()
+                self._load_occupancy()
+                self._load_rollups()
+                self._embeddings.load()
+            self.load_timings["data"], mark = time.perf_counter() - mark, time.perf_counter()
+            self._rebuild_indexes()
+            for log in self.access_logs:
+                self._index_access_log(log)
+            self.load_timings["indexes"], mark = time.perf_counter() - mark, time.perf_counter()
+            self._publish(full=True)
+            self.load_timings["publish"] = time.perf_counter() - mark
+        finally:
+            if gc_enabled:
+                gc.enable()
         
         self._initialized = True
         logger.info("Door Access Service initialized")
     
+    @property
+    def _entity_files(self) -> List[str]:
+        return [self.buildings_file, self.doors_file, self.users_file, self.access_groups_file,
+                self.schedules_file]
+    
     def _load_data(self):
-        """Load all data from JSON files."""
-        # Load buildings
-        if os.path.exists(self.buildings_file):
-            try:
-                with open(self.buildings_file, 'r') as f:
-                    data = json.load(f)
-                    self.buildings = {b['id']: Building(**b) for b in data}
-            except Exception as e:
-                logger.error(f"Error loading buildings: {e}")
+        """Load state from the latest snapshot plus journal tail, or from the JSON files."""
+        files_version = self._journal.files_version(self._entity_files) if self._journal else None
+        if files_version is not None and self._journal.has_snapshot():
+            self._load_snapshot()
+            if self._journal.version > files_version:
+                # Crashed between journaling and saving; bring the files up to date
+                self._save_buildings()
+                self._save_doors()
+                self._save_users()
+                self._save_access_groups()
+                self._save_schedules()
+                self._journal.record_files(self._entity_files)
+        else:
+            self._load_json_files()
+            if self._journal is not None:
+                # Continue the version sequence of any existing journal
+                self._journal.load()
+                if self._journal.version:
+                    logger.warning("Data files changed outside the service; rebuilding snapshot from them")
+                    self._journal.reset()
+                self._write_snapshot()
         
-        # Load doors
-        if os.path.exists(self.doors_file):
+        self._load_access_logs()
+    
+    def _load_access_logs(self):
+        """Load every building's retained access log entries, oldest first."""
+        shards = self._log_shards
+        if not shards.exists() and os.path.exists(self.access_logs_file):
+            self._migrate_access_logs()
+        shards.mark_seen()
+        rows = []
+        for shard in shards.shards_on_disk():
             try:
-                with open(self.doors_file, 'r') as f:
-                    data = json.load(f)
-                    self.doors = {d['id']: Door(**d) for d in data}
+                shard_rows = shards.read(shard)
             except Exception as e:
-                logger.error(f"Error loading doors: {e}")
-        
-        # Load users
-        if os.path.exists(self.users_file):
+                logger.error(f"Error loading access logs of {shard}: {e}")
+                continue
+            for row in shard_rows:
+                shards.add(shard, row, dirty=False)
+            rows.extend(shard_rows)
+        logs = _LOG_ADAPTER.validate_python(rows)
+        logs.sort(key=lambda log: log.timestamp)
+        self.access_logs = logs
+    
+    def _migrate_access_logs(self):
+        """Split the single access log file of older versions into per-building files."""
+        try:
+            with open(self.access_logs_file, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading access logs: {e}")
+            return
+        shards = self._log_shards
+        for row in data:
+            shards.add(shards.shard(row.get('building_id')), row)
+        for shard in shards.take_dirty():
+            with shards.lock(shard):
+                shards.write(shard)
+        os.replace(self.access_logs_file, f"{self.access_logs_file}.migrated")
+        logger.info(f"Split {len(data)} access log entries into {self.access_logs_dir}")
+    
+    def _load_snapshot(self):
+        """Load the latest snapshot and replay the journal events after it."""
+        snapshot, tail = self._journal.load(_SNAPSHOT_ADAPTER.validate_json)
+        for collection in self.COLLECTIONS:
+            setattr(self, collection, {m.id: m for m in snapshot.get(collection, [])})
+        # Indexes are rebuilt once after loading, so skip per-event maintenance
+        for event in tail:
+            self._apply_change_event(event, reindex=False)
+        logger.info(f"Loaded snapshot v{self._journal.snapshot_version} + {len(tail)} journal events")
+    
+    def _write_snapshot(self):
+        """Write a snapshot of all entity collections at the current journal version."""
+        self._journal.write_snapshot({
+            collection: [m.model_dump(mode='json') for m in getattr(self, collection).values()]
+            for collection in self.COLLECTIONS
+        })
+        self._journal.record_files(self._entity_files)
+    
+    def _apply_change_event(self, event: Dict[str, Any], reindex: bool = True):
+        """
+        Apply one journal event to memory (without saving or journaling).
+        An event whose entity fails validation is logged and skipped, so one
+        bad record can't stop the service from starting or syncing.
+        """
+        collection, entity_id = event["collection"], event["entity_id"]
+        model_cls = self.COLLECTIONS.get(collection)
+        if model_cls is None:
+            return
+        if event["op"] == "delete":
+            self._remove_entity(collection, entity_id, reindex)
+            return
+        try:
+            entity = model_cls.model_validate(event["data"])
+        except ValueError as e:
+            logger.error(f"Skipping invalid journal event v{event['version']} ({collection} {entity_id}): {e}")
+            return
+        self._put_entity(collection, entity, reindex)
+    
+    def _remove_entity(self, collection: str, entity_id: str, reindex: bool = True):
+        """Remove an entity from memory and (if reindex) the indexes, without saving or journaling."""
+        self._stale.add(collection)
+        if reindex and collection == "doors":
+            self._unindex_door(entity_id)
+        elif reindex and collection == "users":
+            self._unindex_user(entity_id)
+            self._occupancy.forget(entity_id)
+        elif reindex and collection == "access_groups":
+            self._unindex_group(entity_id)
+        elif reindex and collection == "schedules":
+            self._unindex_schedule(entity_id)
+        getattr(self, collection).pop(entity_id, None)
+    
+    def _put_entity(self, collection: str, entity: BaseModel, reindex: bool = True):
+        """Add or replace an entity in memory and (if reindex) the indexes, without saving or journaling."""
+        self._stale.add(collection)
+        entity_id = entity.id
+        getattr(self, collection)[entity_id] = entity
+        if not reindex:
+            return
+        if collection == "buildings":
+            self._building_keys.intern(entity_id)
+        elif collection == "doors":
+            self._index_door(entity)
+        elif collection == "users":
+            self._index_user(entity)
+        elif collection == "access_groups":
+            self._index_group(entity)
+        else:
+            self._index_schedule(entity)
+    
+    def _load_json_files(self):
+        """Load buildings, doors, users, access groups and schedules from their JSON files."""
+        files = (("buildings", self.buildings_file), ("doors", self.doors_file), ("users", self.users_file),
+                 ("access_groups", self.access_groups_file), ("schedules", self.schedules_file))
+        for collection, path in files:
+            if not os.path.exists(path):
+                continue
             try:
-                with open(self.users_file, 'r') as f:
-                    data = json.load(f)
-                    for u in data:
-                        # Ensure authorized_doors field exists
-                        if 'authorized_doors' not in u:
-                            u['authorized_doors'] = []
-                        # Remove legacy authorized_groups if present in data but not in model
-                        if 'authorized_groups' in u:
-                            del u['authorized_groups']
-                        self.users[u['id']] = User(**u)
+                with open(path, 'rb') as f:
+                    # Keys the models don't declare (e.g. users' legacy authorized_groups) are ignored
+                    models = _FILE_ADAPTERS[self.COLLECTIONS[collection]].validate_json(f.read())
+                setattr(self, collection, {m.id: m for m in models})
             except Exception as e:
-                logger.error(f"Error loading users: {e}")
+                logger.error(f"Error loading {collection.replace('_', ' ')}: {e}")
+    
+    # ==================== Indexes ====================
+    
+    def _rebuild_indexes(self):
+        """Rebuild all interned indexes from the loaded collections."""
+        self._user_doors.clear()
+        self._door_users.clear()
+        self._building_doors.clear()
+        self._door_building.clear()
+        for index in (self._role_groups, self._department_groups, self._member_groups, self._group_criteria,
+                      self._group_doors, self._group_schedules, self._role_users, self._department_users,
+                      self._user_criteria):
+            index.clear()
+        self._access_matrix = AccessMatrix()
+        self._user_search.clear()
+        for schedule in self.schedules.values():
+            self._index_schedule(schedule)
+        for building_id in self.buildings:
+            self._building_keys.intern(building_id)
+        for door in self.doors.values():
+            self._index_door(door)
+        # Groups before users, so users are compiled once with their groups' doors
+        for group in self.access_groups.values():
+            self._index_group(group, regrant=False)
         
-        # Load access logs (last 1000)
-        if os.path.exists(self.access_logs_file):
-            try:
-                with open(self.access_logs_file, 'r') as f:
-                    data = json.load(f)
-                    self.access_logs = [AccessLog(**l) for l in data[-1000:]]
-            except Exception as e:
-                logger.error(f"Error loading access logs: {e}")
+        # Bulk equivalent of _index_user for every user, without per-user diffing
+        intern_user = self._user_keys.intern
+        door_users = self._door_users
+        set_user = self._access_matrix.set_user
+        for user in self.users.values():
+            user_handle = intern_user(user.id)
+            self._user_criteria[user_handle] = (user.role, user.department)
+            self._role_users.setdefault(user.role, set()).add(user_handle)
+            self._department_users.setdefault(user.department, set()).add(user_handle)
+            doors, windows = self._granted_doors(user)
+            self._user_doors[user_handle] = doors
+            for door_handle in doors:
+                users = door_users.get(door_handle)
+                if users is None:
+                    door_users[door_handle] = {user_handle}
+                else:
+                    users.add(user_handle)
+            set_user(user_handle, user.is_active, user.face_registered, doors, windows)
+    
+    def _granted_doors(self, user: User) -> Tuple[Set[int], Dict[int, FrozenSet[str]]]:
+        """
+        Door handles granted to a user directly or through their access
+        groups, and for the doors granted only under schedules, the IDs of
+        those schedules.
+        """
+        intern_door = self._door_keys.intern
+        doors = {intern_door(d) for d in user.authorized_doors}
+        group_ids = set(self._member_groups.get(user.id, ()))
+        group_ids.update(self._role_groups.get(user.role, ()))
+        group_ids.update(self._department_groups.get(user.department, ()))
+        group_schedules = self._group_schedules
+        if user.schedule_id is None and not any(g in group_schedules for g in group_ids):
+            for group_id in group_ids:
+                doors |= self._group_doors[group_id]
+            return doors, {}
+        
+        if user.schedule_id is None:
+            unconditional = set(doors)
+            scheduled: Dict[int, Set[str]] = {}
+        else:
+            unconditional = set()
+            scheduled = {door_handle: {user.schedule_id} for door_handle in doors}
+        for group_id in group_ids:
+            group_doors = self._group_doors[group_id]
+            doors |= group_doors
+            schedule_id = group_schedules.get(group_id)
+            if schedule_id is None:
+                unconditional |= group_doors
+            else:
+                for door_handle in group_doors:
+                    scheduled.setdefault(door_handle, set()).add(schedule_id)
+        return doors, {door_handle: frozenset(ids) for door_handle, ids in scheduled.items()
+                       if door_handle not in unconditional}
+    
+    def _index_user(self, user: User):
+        """Bring the grant and search indexes in line with a user."""
+        user_handle = self._user_keys.intern(user.id)
+        self._user_search.set(user_handle, user.id, user.name, user.email, user.department)
+        criteria = (user.role, user.department)
+        old_criteria = self._user_criteria.get(user_handle)
+        if old_criteria != criteria:
+            if old_criteria is not None:
+                self._discard_user_criteria(user_handle, old_criteria)
+            self._role_users.setdefault(user.role, set()).add(user_handle)
+            self._department_users.setdefault(user.department, set()).add(user_handle)
+            self._user_criteria[user_handle] = criteria
+        
+        new_doors, windows = self._granted_doors(user)
+        old_doors = self._user_doors.get(user_handle)
+        
+        if old_doors:
+            removed = old_doors - new_doors
+            for door_handle in removed:
+                self._door_users[door_handle].discard(user_handle)
+            self._stale_door_users.update(removed)
+            added = new_doors - old_doors
+        else:
+            added = new_doors
+        for door_handle in added:
+            self._door_users.setdefault(door_handle, set()).add(user_handle)
+        self._stale_door_users.update(added)
+        self._user_doors[user_handle] = new_doors
+        self._access_matrix.set_user(user_handle, user.is_active, user.face_registered, new_doors, windows)
+    
+    def _discard_user_criteria(self, user_handle: int, criteria: Tuple[str, str]):
+        role, department = criteria
+        for index, key in ((self._role_users, role), (self._department_users, department)):
+            users = index.get(key)
+            if users is not None:
+                users.discard(user_handle)
+                if not users:
+                    del index[key]
+    
+    def _unindex_user(self, user_id: str):
+        """Remove a user from the grant and search indexes."""
+        user_handle = self._user_keys.get(user_id)
+        if user_handle is None:
+            return
+        self._user_search.remove(user_handle)
+        criteria = self._user_criteria.pop(user_handle, None)
+        if criteria is not None:
+            self._discard_user_criteria(user_handle, criteria)
+        for door_handle in self._user_doors.pop(user_handle, ()):
+            self._door_users[door_handle].discard(user_handle)
+            self._stale_door_users.add(door_handle)
+        self._access_matrix.remove_user(user_handle)
+    
+    def _group_users(self, criteria: Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]) -> Set[int]:
+        """Handles of the existing users matching a group's (roles, departments, members)."""
+        roles, departments, members = criteria
+        handles: Set[int] = set()
+        for role in roles:
+            handles.update(self._role_users.get(role, ()))
+        for department in departments:
+            handles.update(self._department_users.get(department, ()))
+        for user_id in members:
+            if user_id in self.users:
+                handles.add(self._user_keys.intern(user_id))
+        return handles
+    
+    def _set_group_criteria(self, group_id: str,
+                            criteria: Optional[Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]]):
+        """Move a group between the role/department/member indexes (None removes it)."""
+        old = self._group_criteria.pop(group_id, None)
+        indexes = (self._role_groups, self._department_groups, self._member_groups)
+        if old is not None:
+            for index, keys in zip(indexes, old):
+                for key in keys:
+                    groups = index[key]
+                    groups.discard(group_id)
+                    if not groups:
+                        del index[key]
+        if criteria is not None:
+            for index, keys in zip(indexes, criteria):
+                for key in keys:
+                    index.setdefault(key, set()).add(group_id)
+            self._group_criteria[group_id] = criteria
+    
+    def _regrant(self, user_handles: Set[int]):
+        """Recompile the grants of the given users."""
+        key = self._user_keys.key
+        for user_handle in user_handles:
+            user = self.users.get(key(user_handle))
+            if user is not None:
+                self._index_user(user)
+    
+    def _index_group(self, group: AccessGroup, regrant: bool = True):
+        """
+        Compile an access group into the grant indexes. Only the users who
+        matched the group before or match it now are recompiled.
+        """
+        criteria = (frozenset(group.roles), frozenset(group.departments), frozenset(group.members))
+        doors = frozenset(self._door_keys.intern(d) for d in group.door_ids)
+        old_criteria = self._group_criteria.get(group.id)
+        if (old_criteria == criteria and self._group_doors.get(group.id) == doors
+                and self._group_schedules.get(group.id) == group.schedule_id):
+            return
+        affected = self._group_users(old_criteria) if regrant and old_criteria is not None else set()
+        self._set_group_criteria(group.id, criteria)
+        self._group_doors[group.id] = doors
+        if group.schedule_id is None:
+            self._group_schedules.pop(group.id, None)
+        else:
+            self._group_schedules[group.id] = group.schedule_id
+        if regrant:
+            affected |= self._group_users(criteria)
+            self._regrant(affected)
+    
+    def _unindex_group(self, group_id: str):
+        """Remove an access group from the grant indexes and recompile its members."""
+        criteria = self._group_criteria.get(group_id)
+        if criteria is None:
+            return
+        affected = self._group_users(criteria)
+        self._set_group_criteria(group_id, None)
+        del self._group_doors[group_id]
+        self._group_schedules.pop(group_id, None)
+        self._regrant(affected)
+    
+    def _index_schedule(self, schedule: AccessSchedule):
+        """Compile a schedule into the access matrix (the doors and grants using it follow at once)."""
+        self._access_matrix.set_schedule(schedule.id, compile_schedule(schedule))
+    
+    def _unindex_schedule(self, schedule_id: str):
+        """Drop a schedule from the access matrix; anything still limited by it is never open."""
+        self._access_matrix.set_schedule(schedule_id, None)
+    
+    def _index_door(self, door: Door):
+        """Bring the building index and door schedule in line with a door."""
+        door_handle = self._door_keys.intern(door.id)
+        building_handle = self._building_keys.intern(door.building_id)
+        self._access_matrix.set_door_schedule(door_handle, door.schedule_id)
+        old_building = self._door_building.get(door_handle)
+        if old_building == building_handle:
+            return
+        if old_building is None:
+            self._access_matrix.add_door(door_handle, self._door_users.get(door_handle, ()))
+        else:
+            self._building_doors[old_building].discard(door_handle)
+            self._stale_building_doors.add(old_building)
+        self._building_doors.setdefault(building_handle, set()).add(door_handle)
+        self._stale_building_doors.add(building_handle)
+        self._door_building[door_handle] = building_handle
+    
+    def _unindex_door(self, door_id: str):
+        """Remove a door from the building and grant indexes."""
+        door_handle = self._door_keys.get(door_id)
+        if door_handle is None:
+            return
+        building_handle = self._door_building.pop(door_handle, None)
+        if building_handle is not None:
+            self._building_doors[building_handle].discard(door_handle)
+            self._stale_building_doors.add(building_handle)
+        for user_handle in self._door_users.pop(door_handle, ()):
+            self._user_doors[user_handle].discard(door_handle)
+        self._stale_door_users.add(door_handle)
+        self._access_matrix.remove_door(door_handle)
+    
+    def _index_access_log(self, log: AccessLog):
+        """Append a log entry's interned IDs to the log columns."""
+        self._log_doors.append(self._door_keys.intern(log.door_id))
+        self._log_users.append(self._user_keys.intern(log.user_id) if log.user_id else -1)
+        self._log_buildings.append(self._building_keys.intern(log.building_id) if log.building_id else -1)
+        self._log_ids.add(log.id)
+        self._score_stats.add(log.id, log.building_id, log.door_id, log.event_type.value, log.similarity_score)
+        # Only a passage through one known door moves the user: a door-less
+        # event grants every door the user holds, whichever they walk through
+        if log.event_type == AccessLogType.GRANTED and log.user_id and log.building_id and not log.multi_door:
+            door = self.doors.get(log.door_id)
+            if door is not None:
+                self._occupancy.record(log.user_id, log.building_id, log.door_id, door.direction, log.timestamp)
+    
+    def _append_access_log(self, log: AccessLog, dirty: bool = True):
+        """Add a log entry to memory (without saving); dirty=False for entries already on disk."""
+        with self._log_lock:
+            # Columns first: readers only index entries below len(access_logs)
+            self._index_access_log(log)
+            self.access_logs.append(log)
+            self._log_shards.add(self._log_shards.shard(log.building_id), log.model_dump(mode='json'), dirty)
+    
+    def _write_json(self, path: str, rows: Any):
+        """Write rows to a JSON file atomically (temp file + rename)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(rows, f, indent=2, default=str)
+        os.replace(tmp_path, path)
     
     def _save_buildings(self):
         """Save buildings to JSON file."""
+        if self._batch is not None:
+            self._batch.dirty.add("buildings")
+            return
         try:
-            with open(self.buildings_file, 'w') as f:
-                json.dump([b.model_dump(mode='json') for b in self.buildings.values()], f, indent=2, default=str)
+            with SAVE_SECONDS.time("buildings"):
+                self._write_json(self.buildings_file, [b.model_dump(mode='json') for b in self.buildings.values()])
         except Exception as e:
             logger.error(f"Error saving buildings: {e}")
     
     def _save_doors(self):
         """Save doors to JSON file."""
+        if self._batch is not None:
+            self._batch.dirty.add("doors")
+            return
         try:
-            with open(self.doors_file, 'w') as f:
-                json.dump([d.model_dump(mode='json') for d in self.doors.values()], f, indent=2, default=str)
+            with SAVE_SECONDS.time("doors"):
+                self._write_json(self.doors_file, [d.model_dump(mode='json') for d in self.doors.values()])
         except Exception as e:
             logger.error(f"Error saving doors: {e}")
     
     def _save_users(self):
         """Save users to JSON file."""
+        if self._batch is not None:
+            self._batch.dirty.add("users")
+            return
         try:
-            with open(self.users_file, 'w') as f:
-                json.dump([u.model_dump(mode='json') for u in self.users.values()], f, indent=2, default=str)
+            with SAVE_SECONDS.time("users"):
+                self._write_json(self.users_file, [u.model_dump(mode='json') for u in self.users.values()])
         except Exception as e:
             logger.error(f"Error saving users: {e}")
     
+    def _save_access_groups(self):
+        """Save access groups to JSON file."""
+        if self._batch is not None:
+            self._batch.dirty.add("access_groups")
+            return
+        try:
+            with SAVE_SECONDS.time("access_groups"):
+                self._write_json(self.access_groups_file,
+                                 [g.model_dump(mode='json') for g in self.access_groups.values()])
+        except Exception as e:
+            logger.error(f"Error saving access groups: {e}")
+    
+    def _save_schedules(self):
+        """Save schedules to JSON file."""
+        if self._batch is not None:
+            self._batch.dirty.add("schedules")
+            return
+        try:
+            with SAVE_SECONDS.time("schedules"):
+                self._write_json(self.schedules_file, [s.model_dump(mode='json') for s in self.schedules.values()])
+        except Exception as e:
+            logger.error(f"Error saving schedules: {e}")
+    
     def _save_access_logs(self):
-        """Save access logs to JSON file."""
+        """Save the access logs of the buildings with new entries, each under its own lock."""
         try:
-            with open(self.access_logs_file, 'w') as f:
-                json.dump([l.model_dump(mode='json') for l in self.access_logs[-1000:]], f, indent=2, default=str)
+            with phase("persistence"), SAVE_SECONDS.time("access_logs"):
+                shards = self._log_shards
+                for shard in shards.take_dirty():
+                    try:
+                        with shards.lock(shard):
+                            # Keep entries other workers appended since we last looked
+                            self._merge_log_shard(shard)
+                            shards.write(shard)
+                    except Exception as e:
+                        # Still unsaved: retry on the next save
+                        shards.mark_dirty(shard)
+                        logger.error(f"Error saving access logs of shard {shard!r}: {e}")
+                now = time.monotonic()
+                if now >= self._next_score_stats_save:
+                    self._next_score_stats_save = now + settings.score_stats_save_interval
+                    self._save_score_stats()
         except Exception as e:
             logger.error(f"Error saving access logs: {e}")
     
+    def _save_score_stats(self):
+        """Save the similarity score sketches to JSON file."""
+        try:
+            with SAVE_SECONDS.time("score_stats"):
+                with self._log_lock:
+                    data = self._score_stats.to_dict()
+                # Every worker saves; the lock keeps them off each other's temp file
+                with self._file_lock:
+                    self._write_json(self.score_stats_file, data)
+        except Exception as e:
+            logger.error(f"Error saving score stats: {e}")
+    
+    def _load_score_stats(self):
+        """
+        Load the saved score sketches. Log entries loaded from the log file
+        that the sketches don't include yet are counted when indexed.
+        """
+        if not os.path.exists(self.score_stats_file):
+            return
+        try:
+            with open(self.score_stats_file, 'r') as f:
+                self._score_stats = ScoreStats.from_dict(json.load(f), settings.access_log_retention)
+        except Exception as e:
+            logger.error(f"Error loading score stats: {e}")
+    
+    def _load_occupancy(self):
+        """Load the saved occupancy. Loaded log entries newer than it are recorded when indexed."""
+        if not os.path.exists(self.occupancy_file):
+            return
+        try:
+            with open(self.occupancy_file, 'r') as f:
+                self._occupancy = OccupancyTracker.from_dict(json.load(f))
+        except Exception as e:
+            logger.error(f"Error loading occupancy: {e}")
+    
+    def _load_rollups(self):
+        """Load saved hourly rollups. Loaded log entries they don't include yet are folded later."""
+        try:
+            self._rollups = HourlyRollups.load(self.rollups_dir, settings.access_log_retention)
+        except Exception as e:
+            logger.error(f"Error loading rollups: {e}")
+    
+    # ==================== Access History Rollups ====================
+    
+    def _fold_rollups(self):
+        """Fold the access log entries appended since the last fold into the hourly rollups."""
+        with self._rollups.lock:
+            logs = self.access_logs
+            count = len(logs)
+            for log in logs[self._rolled_up:count]:
+                self._rollups.add(log.id, log.timestamp, log.door_id, log.building_id, log.event_type.value)
+            self._rolled_up = count
+    
+    def compact_access_history(self):
+        """
+        Fold new access log entries into the hourly rollups and save the
+        changed days; expire stale presences and save the occupancy.
+        """
+        self._fold_rollups()
+        self._occupancy.expire(datetime.now() - timedelta(seconds=settings.occupancy_timeout))
+        try:
+            with SAVE_SECONDS.time("rollups"), self._file_lock:
+                self._rollups.save(self.rollups_dir)
+        except Exception as e:
+            logger.error(f"Error saving rollups: {e}")
+        try:
+            with SAVE_SECONDS.time("occupancy"):
+                data = self._occupancy.to_dict()
+                # Every worker compacts; the lock keeps them off each other's temp file
+                with self._file_lock:
+                    self._write_json(self.occupancy_file, data)
+        except Exception as e:
+            logger.error(f"Error saving occupancy: {e}")
+    
+    async def run_history_compaction(self):
+        """Background task: compact access history every rollup_interval seconds until cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(settings.rollup_interval)
+                await asyncio.to_thread(self.compact_access_history)
+        finally:
+            self.compact_access_history()
+    
+    def get_traffic_stats(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                          interval: str = "day", group_by: Optional[str] = None,
+                          door_id: Optional[str] = None, building_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Access event counts and denial rates over [start, end) (default: the
+        last 7 days), per interval and optionally per door or building,
+        answered from the hourly rollups.
+        """
+        self._fold_rollups()
+        end = end or datetime.now()
+        start = start or end - timedelta(days=7)
+        return self._rollups.query(start, end, interval=interval, group_by=group_by,
+                                   door_ids={door_id} if door_id else None, building_id=building_id)
+    
+    # ==================== Multi-Worker Coherence ====================
+    
+    @staticmethod
+    def _file_stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def sync(self, force: bool = False):
+        """
+        Pick up changes other worker processes committed. Costs a couple of
+        stat() calls, at most once per sync_interval unless forced; only the
+        journal events written since the last sync are read and applied.
+        """
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        self._next_sync = now + settings.sync_interval
+        
+        journal_changed = self._journal is not None and self._journal.manifest_changed()
+        logs_changed = self._log_shards.changed()
+        if journal_changed or logs_changed or self._embeddings.changed():
+            with self._file_lock:
+                self._sync_shared_state()
+    
+    def _sync_shared_state(self):
+        """Apply other workers' committed changes. Caller holds the file lock."""
+        if self._journal is not None and self._journal.manifest_changed():
+            events = self._journal.follow()
+            for event in events:
+                self._apply_change_event(event)
+            files_version = self._journal.files_version(self._entity_files)
+            if files_version is not None and files_version > self._journal.version:
+                # Another worker rebaselined from externally edited files
+                logger.info("Shared state was rebaselined; reloading snapshot")
+                self._load_snapshot()
+                self._rebuild_indexes()
+                self._publish(full=True)
+            elif events:
+                self._publish()
+            self._journal.mark_manifest_seen()
+        self._merge_access_logs()
+        if self._embeddings.changed():
+            self._embeddings.load()
+    
+    def _publish(self, full: bool = False):
+        """
+        Publish the working state as the new read view. Only the collections
+        and index entries changed since the previous view are copied; the
+        rest is shared with it. Caller holds the file lock.
+        """
+        previous = None if full or self._view is None else self._view
+        stale, self._stale = self._stale, set()
+        stale_building_doors, self._stale_building_doors = self._stale_building_doors, set()
+        stale_door_users, self._stale_door_users = self._stale_door_users, set()
+        
+        def collection(name: str) -> Dict[str, Any]:
+            if previous is None or name in stale:
+                return dict(getattr(self, name))
+            return getattr(previous, name)
+        
+        self._view = _ReadView(
+            version=self.version,
+            buildings=collection("buildings"),
+            doors=collection("doors"),
+            users=collection("users"),
+            access_groups=collection("access_groups"),
+            schedules=collection("schedules"),
+            building_doors=_freeze_index(self._building_doors, previous and previous.building_doors,
+                                         stale_building_doors),
+            door_users=_freeze_index(self._door_users, previous and previous.door_users, stale_door_users),
+            matrix=self._access_matrix.snapshot(),
+        )
+    
+    def _merge_access_logs(self):
+        """Append log entries other workers saved to any building's log file."""
+        shards = self._log_shards
+        if not shards.changed():
+            return
+        # Marked before reading, so saves racing with this merge are seen next time
+        shards.mark_seen()
+        for shard in shards.changed_shards():
+            self._merge_log_shard(shard)
+    
+    def _merge_log_shard(self, shard: str):
+        """Append the entries of one building's log file that this process doesn't have yet."""
+        if not self._log_shards.file_changed(shard):
+            return
+        try:
+            data = self._log_shards.read(shard)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error merging access logs of {shard}: {e}")
+            return
+        for row in data:
+            if row['id'] not in self._log_ids:
+                self._append_access_log(AccessLog(**row), dirty=False)
+    
+    # ==================== External File Edits ====================
+    
+    def reload_data_files(self) -> int:
+        """
+        Apply edits made to the entity JSON files outside the service (by an
+        operator, a restore or a provisioning script) without a restart.
+        Returns the number of entities changed. Costs one stat() per file
+        when nothing changed.
+        """
+        if not self._data_files.changed():
+            return 0
+        with self._file_lock:
+            self._sync_shared_state()
+            return self._reload_data_files()
+    
+    def _reload_data_files(self) -> int:
+        """
+        Parse only the entity files that were edited externally, diff them
+        against memory and apply the differences as one journaled unit of
+        work, which maintains the indexes like any API change and publishes
+        a new read view. Caller holds the file lock.
+        """
+        watcher = self._data_files
+        if self._journal is not None:
+            # Files saved by another worker match the manifest; the rest were edited externally
+            modified = set(self._journal.modified_files(self._entity_files))
+        else:
+            modified = set(watcher.changed())
+        watcher.mark_seen([path for path in watcher.changed() if path not in modified])
+        
+        # Schedules and doors before the users and groups that reference them
+        edits: List[Tuple[str, str, Dict[str, BaseModel]]] = []
+        for collection in ("schedules", "buildings", "doors", "users", "access_groups"):
+            path = getattr(self, f"{collection}_file")
+            if path not in modified:
+                continue
+            if not os.path.exists(path):
+                logger.warning(f"{os.path.basename(path)} was removed; keeping the {collection} in memory")
+                watcher.mark_seen([path])
+                continue
+            content = watcher.read(path)
+            if content is None:
+                continue
+            store, model_cls = getattr(self, collection), self.COLLECTIONS[collection]
+            try:
+                entities: Dict[str, BaseModel] = {}
+                for row in json.loads(content):
+                    current = store.get(row['id'])
+                    if current is None:
+                        entities[row['id']] = model_cls.model_validate(row)
+                        continue
+                    # Compare only the fields in the file: missing ones keep their values
+                    fields = row.keys() & model_cls.model_fields.keys()
+                    dumped = current.model_dump(mode='json', include=fields)
+                    entity = current
+                    if dumped != {field: row[field] for field in fields}:
+                        entity = model_cls.model_validate({**current.model_dump(), **row})
+                        if entity.model_dump(mode='json', include=fields) == dumped:
+                            entity = current
+                    entities[row['id']] = entity
+            except (KeyError, TypeError, ValueError) as e:
+                # ValueError includes JSON decoding and model validation errors
+                logger.error(f"Ignoring edit of {os.path.basename(path)}: {e}")
+                watcher.accept(path)
+                continue
+            edits.append((collection, path, entities))
+        if not edits:
+            return 0
+        
+        changed = 0
+        token = current_actor.set("data-files")
+        try:
+            with self._unit_of_work() as unit:
+                for collection, _, entities in edits:
+                    store = getattr(self, collection)
+                    for entity_id in [e for e in store if e not in entities]:
+                        self._touch(collection, entity_id)
+                        self._remove_entity(collection, entity_id)
+                    for entity_id, entity in entities.items():
+                        current = store.get(entity_id)
+                        if current is entity or current == entity:
+                            continue
+                        self._touch(collection, entity_id)
+                        self._put_entity(collection, entity)
+            changed = len(unit.originals)
+        except BatchError as e:
+            logger.error(f"Ignoring edit of {', '.join(os.path.basename(p) for _, p, _ in edits)}: {e}")
+        finally:
+            current_actor.reset(token)
+            for _, path, _ in edits:
+                watcher.accept(path)
+        if self._journal is not None:
+            # Accept the files as they are now, even if unchanged or rejected, so a
+            # restart loads the snapshot rather than rebaselining from them
+            self._journal.record_files(self._entity_files)
+        if changed:
+            logger.info(f"Applied {changed} entity changes from edited data files")
+        return changed
+    
+    async def run_file_watcher(self):
+        """Background task: apply external data file edits every data_watch_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(settings.data_watch_interval)
+            try:
+                await asyncio.to_thread(self.reload_data_files)
+            except Exception as e:
+                logger.error(f"Error reloading data files: {e}")
+    
+    # ==================== Batch Mutations ====================
+    
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Unit of work: mutations made inside the block are applied in memory,
+        validated on exit and committed with one save per affected collection.
+        If the block raises (or validation fails) every touched entity is
+        restored and nothing is written. Nested blocks join the outer one.
+        """
+        if self._batch is not None:
+            yield
+            return
+        
+        # Hold the inter-process lock for the whole unit and start from the
+        # latest shared state (and external file edits), so saving whole
+        # collections can't clobber another worker's changes
+        with self._file_lock:
+            self._sync_shared_state()
+            if self._data_files.changed():
+                self._reload_data_files()
+            with self._unit_of_work():
+                yield
+    
+    @contextmanager
+    def _unit_of_work(self) -> Iterator[_UnitOfWork]:
+        """Open a unit of work and validate, roll back or commit it (see batch()). Caller holds the file lock."""
+        unit = self._batch = _UnitOfWork()
+        try:
+            yield unit
+            self._validate_batch(unit)
+        except BaseException:
+            self._batch = None
+            self._rollback_batch(unit)
+            self._publish()
+            raise
+        
+        self._batch = None
+        with phase("persistence"):
+            if self._journal is not None:
+                self._journal_batch(unit)
+            for collection in self.COLLECTIONS:
+                if collection in unit.dirty:
+                    getattr(self, f"_save_{collection}")()
+            if self._journal is not None and unit.originals:
+                self._journal.record_files(self._entity_files)
+                if self._journal.pending >= settings.journal_snapshot_interval:
+                    self._write_snapshot()
+            self._data_files.mark_seen([getattr(self, f"{c}_file") for c in self.COLLECTIONS if c in unit.dirty])
+        self._publish()
+        for action in unit.after_commit:
+            action()
+    
+    def apply_batch(self, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Apply a list of {"op": name, "args": {...}} operations as one unit of work.
+        String arguments of the form "$N" are replaced by the ID of the entity
+        produced by operation N, so a batch can create a building and its doors.
+        Raises BatchError (after rolling back) if any operation fails.
+        """
+        results: List[Dict[str, Any]] = []
+        
+        def resolve(value: Any, index: int) -> Any:
+            if isinstance(value, list):
+                return [resolve(v, index) for v in value]
+            if isinstance(value, str) and value.startswith("$") and value[1:].isdigit():
+                ref = int(value[1:])
+                if ref >= index:
+                    raise BatchError(f"Reference {value} must point to an earlier operation", index)
+                return results[ref]["id"]
+            return value
+        
+        with self.batch():
+            for index, operation in enumerate(operations):
+                name = operation.get("op")
+                if name not in self.BATCH_OPERATIONS:
+                    raise BatchError(f"Unknown operation: {name}", index)
+                args = {k: resolve(v, index) for k, v in (operation.get("args") or {}).items()}
+                if name == "create_user" and args.get("user_id") in self.users:
+                    raise BatchError("User with this ID already exists", index)
+                
+                try:
+                    result = getattr(self, name)(**args)
+                except BatchError as e:
+                    if e.index is not None:
+                        raise
+                    raise BatchError(str(e), index) from e
+                except TypeError as e:
+                    raise BatchError(f"Invalid arguments: {e}", index)
+                except ValueError as e:
+                    # Includes pydantic's ValidationError, e.g. an invalid schedule window
+                    raise BatchError(str(e), index) from e
+                if result is None or result is False:
+                    raise BatchError(self.BATCH_OPERATIONS[name], index)
+                
+                if isinstance(result, BaseModel):
+                    results.append({"op": name, "id": result.id, "data": result.model_dump(mode='json')})
+                else:
+                    entity_id = (args.get("user_id") or args.get("door_id") or args.get("building_id")
+                                 or args.get("group_id") or args.get("schedule_id"))
+                    results.append({"op": name, "id": entity_id})
+        return results
+    
+    def _journal_batch(self, unit: _UnitOfWork):
+        """Append one event per entity a committed batch created, changed or deleted."""
+        changes = []
+        for (collection, entity_id), original in unit.originals.items():
+            current = getattr(self, collection).get(entity_id)
+            if current is None:
+                if original is not None:
+                    changes.append((collection, entity_id, None))
+            else:
+                data = current.model_dump(mode='json')
+                if original is None or data != original.model_dump(mode='json'):
+                    changes.append((collection, entity_id, data))
+        if changes:
+            self._journal.append(changes)
+    
+    def _after_commit(self, action: Callable[[], Any]):
+        """Run action once the open batch commits (never, if it rolls back), or now outside a batch."""
+        if self._batch is None:
+            action()
+        else:
+            self._batch.after_commit.append(action)
+    
+    def _touch(self, collection: str, entity_id: str):
+        """
+        Record an entity's pre-batch state before it is first modified.
+        The working store gets a private copy to modify, so the published
+        object (which readers may hold) is never changed in place.
+        """
+        if self._batch is None:
+            return
+        key = (collection, entity_id)
+        if key not in self._batch.originals:
+            store = getattr(self, collection)
+            current = store.get(entity_id)
+            self._batch.originals[key] = current
+            if current is not None:
+                store[entity_id] = current.model_copy(deep=True)
+            self._stale.add(collection)
+    
+    def _validate_batch(self, unit: _UnitOfWork):
+        """
+        Re-validate the entities touched by a batch (updates set raw values
+        on them) and check their referential integrity.
+        """
+        for (collection, entity_id) in unit.originals:
+            entity = getattr(self, collection).get(entity_id)
+            if entity is not None:
+                try:
+                    validated = type(entity).model_validate(entity.model_dump(warnings=False))
+                except ValueError as e:
+                    raise BatchError(f"{entity_id} is invalid: {e}")
+                if validated != entity:
+                    # Coerced (e.g. "false" to False); index the typed values
+                    self._put_entity(collection, validated)
+                    entity = validated
+            schedule_id = getattr(entity, "schedule_id", None)
+            if schedule_id is not None and schedule_id not in self.schedules:
+                raise BatchError(f"{entity_id} references unknown schedule {schedule_id}")
+            if collection == "doors" and entity_id in self.doors:
+                building_id = self.doors[entity_id].building_id
+                if building_id not in self.buildings:
+                    raise BatchError(f"Door {entity_id} references unknown building {building_id}")
+            elif collection == "users" and entity_id in self.users:
+                missing = [d for d in self.users[entity_id].authorized_doors if d not in self.doors]
+                if missing:
+                    raise BatchError(f"User {entity_id} references unknown doors: {', '.join(missing)}")
+            elif collection == "access_groups" and entity_id in self.access_groups:
+                missing = [d for d in self.access_groups[entity_id].door_ids if d not in self.doors]
+                if missing:
+                    raise BatchError(f"Access group {entity_id} references unknown doors: {', '.join(missing)}")
+    
+    def _rollback_batch(self, unit: _UnitOfWork):
+        """Restore every entity touched by a batch and re-sync the indexes."""
+        for (collection, entity_id), original in unit.originals.items():
+            store = getattr(self, collection)
+            if original is None:
+                store.pop(entity_id, None)
+            else:
+                store[entity_id] = original
+        
+        # Schedules and doors first so restored users can light matrix rows
+        # for restored doors; groups last so they recompile the users they affect
+        for collection, index, unindex in (
+            ("schedules", self._index_schedule, self._unindex_schedule),
+            ("buildings", None, None),
+            ("doors", self._index_door, self._unindex_door),
+            ("users", self._index_user, self._unindex_user),
+            ("access_groups", self._index_group, self._unindex_group),
+        ):
+            for (touched, entity_id) in unit.originals:
+                if touched != collection:
+                    continue
+                if collection == "buildings":
+                    self._building_keys.intern(entity_id)
+                elif entity_id in getattr(self, collection):
+                    index(getattr(self, collection)[entity_id])
+                else:
+                    unindex(entity_id)
+        logger.warning(f"Rolled back batch touching {len(unit.originals)} entities")
+    
     # ==================== Building Operations ====================
     
     def get_all_buildings(self) -> List[Building]:
         """Get all buildings with their door and user counts."""
-        return list(self.buildings.values())
+        return list(self._view.buildings.values())
     
     def get_building(self, building_id: str) -> Optional[Building]:
         """Get a specific building by ID."""
-        return self.buildings.get(building_id)
+        return self._view.buildings.get(building_id)
     
     def create_building(self, name: str, description: str = "", color: str = "#667eea", icon: str = "building") -> Building:
         """Create a new building."""
@@ -153,8 +1368,11 @@ class DoorAccessService:
             color=color,
             icon=icon
         )
-        self.buildings[building_id] = building
-        self._save_buildings()
+        with self.batch():
+            self._touch("buildings", building_id)
+            self.buildings[building_id] = building
+            self._building_keys.intern(building_id)
+            self._save_buildings()
         logger.info(f"Created building: {name} ({building_id})")
         return building
     
@@ -163,45 +1381,55 @@ class DoorAccessService:
         if building_id not in self.buildings:
             return None
         
-        building = self.buildings[building_id]
-        for key, value in kwargs.items():
-            if hasattr(building, key) and key not in ['id', 'created_at']:
-                setattr(building, key, value)
-        building.updated_at = datetime.now()
-        self._save_buildings()
-        return building
+        with self.batch():
+            self._touch("buildings", building_id)
+            building = self.buildings[building_id]
+            for key, value in kwargs.items():
+                if hasattr(building, key) and key not in ['id', 'created_at']:
+                    setattr(building, key, value)
+            building.updated_at = datetime.now()
+            self._save_buildings()
+        return self.buildings[building_id]
     
     def delete_building(self, building_id: str) -> bool:
         """Delete a building and its doors."""
         if building_id not in self.buildings:
             return False
         
-        # Remove doors from this building
-        # Create a copy of the list because delete_door modifies the building's door list
-        door_ids = list(self.buildings[building_id].doors)
-        for door_id in door_ids:
-            self.delete_door(door_id)
-        
-        del self.buildings[building_id]
-        self._save_buildings()
+        with self.batch():
+            # Remove doors from this building
+            # Create a copy of the list because delete_door modifies the building's door list
+            door_ids = list(self.buildings[building_id].doors)
+            for door_id in door_ids:
+                self.delete_door(door_id)
+            
+            self._touch("buildings", building_id)
+            del self.buildings[building_id]
+            self._save_buildings()
         return True
     
     # ==================== Door Operations ====================
     
     def get_all_doors(self) -> List[Door]:
         """Get all doors."""
-        return list(self.doors.values())
+        return list(self._view.doors.values())
     
     def get_door(self, door_id: str) -> Optional[Door]:
         """Get a specific door by ID."""
-        return self.doors.get(door_id)
+        return self._view.doors.get(door_id)
     
     def get_doors_by_building(self, building_id: str) -> List[Door]:
         """Get all doors in a specific building."""
-        return [d for d in self.doors.values() if d.building_id == building_id]
+        view = self._view
+        building_handle = self._building_keys.get(building_id)
+        if building_handle is None:
+            return []
+        door_handles = sorted(view.building_doors.get(building_handle, ()))
+        return [view.doors[self._door_keys.key(h)] for h in door_handles]
     
     def create_door(self, name: str, building_id: str, location: str = "", 
-                   ip_address: str = "", port: int = 80) -> Optional[Door]:
+                   ip_address: str = "", port: int = 80, schedule_id: Optional[str] = None,
+                   direction: DoorDirection = DoorDirection.INTERNAL) -> Optional[Door]:
         """Create a new door in a building."""
         if building_id not in self.buildings:
             return None
@@ -213,12 +1441,18 @@ class DoorAccessService:
             location=location,
             ip_address=ip_address,
             port=port,
-            building_id=building_id
+            building_id=building_id,
+            schedule_id=schedule_id,
+            direction=direction
         )
-        self.doors[door_id] = door
-        self.buildings[building_id].doors.append(door_id)
-        self._save_doors()
-        self._save_buildings()
+        with self.batch():
+            self._touch("doors", door_id)
+            self._touch("buildings", building_id)
+            self.doors[door_id] = door
+            self._index_door(door)
+            self.buildings[building_id].doors.append(door_id)
+            self._save_doors()
+            self._save_buildings()
         logger.info(f"Created door: {name} ({door_id}) in building {building_id}")
         return door
     
@@ -226,112 +1460,246 @@ class DoorAccessService:
         """Update an existing door."""
         if door_id not in self.doors:
             return None
+        if 'direction' in kwargs:
+            try:
+                kwargs['direction'] = DoorDirection(kwargs['direction'])
+            except ValueError:
+                raise BatchError(f"Unknown door direction {kwargs['direction']}")
         
-        door = self.doors[door_id]
-        old_building_id = door.building_id
-        
-        for key, value in kwargs.items():
-            if hasattr(door, key) and key not in ['id', 'created_at']:
-                setattr(door, key, value)
-        
-        # Handle building change
-        if 'building_id' in kwargs and kwargs['building_id'] != old_building_id:
-            if old_building_id in self.buildings:
-                self.buildings[old_building_id].doors.remove(door_id)
-            if door.building_id in self.buildings:
-                self.buildings[door.building_id].doors.append(door_id)
-            self._save_buildings()
-        
-        door.updated_at = datetime.now()
-        self._save_doors()
-        return door
+        with self.batch():
+            self._touch("doors", door_id)
+            door = self.doors[door_id]
+            old_building_id = door.building_id
+            
+            for key, value in kwargs.items():
+                if hasattr(door, key) and key not in ['id', 'created_at']:
+                    setattr(door, key, value)
+            
+            # Handle building change
+            if 'building_id' in kwargs and kwargs['building_id'] != old_building_id:
+                if old_building_id in self.buildings:
+                    self._touch("buildings", old_building_id)
+                    if door_id in self.buildings[old_building_id].doors:
+                        self.buildings[old_building_id].doors.remove(door_id)
+                if door.building_id in self.buildings:
+                    self._touch("buildings", door.building_id)
+                    self.buildings[door.building_id].doors.append(door_id)
+                self._save_buildings()
+            
+            door.updated_at = datetime.now()
+            self._index_door(door)
+            self._save_doors()
+        return self.doors[door_id]
     
     def delete_door(self, door_id: str) -> bool:
         """Delete a door."""
         if door_id not in self.doors:
             return False
         
-        door = self.doors[door_id]
-        if door.building_id in self.buildings:
-            # Check if door is in the list before trying to remove it
-            if door_id in self.buildings[door.building_id].doors:
-                self.buildings[door.building_id].doors.remove(door_id)
-                self._save_buildings()
-        
-        # Remove door from users' authorized_doors
-        for user in self.users.values():
-            if hasattr(user, 'authorized_doors') and door_id in user.authorized_doors:
-                user.authorized_doors.remove(door_id)
-        self._save_users()
-        
-        del self.doors[door_id]
-        self._save_doors()
+        with self.batch():
+            door = self.doors[door_id]
+            if door.building_id in self.buildings:
+                # Check if door is in the list before trying to remove it
+                if door_id in self.buildings[door.building_id].doors:
+                    self._touch("buildings", door.building_id)
+                    self.buildings[door.building_id].doors.remove(door_id)
+                    self._save_buildings()
+            
+            # Remove door from the authorized_doors of the users the index says hold it
+            door_handle = self._door_keys.get(door_id)
+            holders = [self._user_keys.key(h) for h in self._door_users.get(door_handle, ())]
+            for user_id in holders:
+                user = self.users.get(user_id)
+                if user is not None and door_id in user.authorized_doors:
+                    self._touch("users", user_id)
+                    self.users[user_id].authorized_doors.remove(door_id)
+            if holders:
+                self._save_users()
+            
+            groups = [g.id for g in self.access_groups.values() if door_id in g.door_ids]
+            for group_id in groups:
+                self._touch("access_groups", group_id)
+                group = self.access_groups[group_id]
+                group.door_ids.remove(door_id)
+                self._index_group(group)
+            if groups:
+                self._save_access_groups()
+            
+            self._touch("doors", door_id)
+            self._unindex_door(door_id)
+            del self.doors[door_id]
+            self._save_doors()
         return True
     
     async def trigger_door_open(self, door_id: str, user_id: Optional[str] = None, 
                                 reason: str = "authorized") -> Dict[str, Any]:
         """Trigger a door to open (send HTTP request to door controller)."""
-        if door_id not in self.doors:
+        view = self._view
+        if door_id not in view.doors:
             return {"success": False, "message": "Door not found"}
         
-        door = self.doors[door_id]
+        door = view.doors[door_id]
         
         # Log the access attempt
         log_entry = AccessLog(
             id=str(uuid.uuid4()),
             door_id=door_id,
             user_id=user_id,
-            user_name=self.users[user_id].name if user_id and user_id in self.users else None,
+            user_name=view.users[user_id].name if user_id and user_id in view.users else None,
             event_type=AccessLogType.GRANTED if user_id else AccessLogType.MANUAL_UNLOCK,
             building_id=door.building_id,
             details=f"Door opened: {reason}"
         )
-        self.access_logs.append(log_entry)
+        self._append_access_log(log_entry)
         self._save_access_logs()
         
         # If door has IP address, try to send open command
         if door.ip_address:
+            start = time.perf_counter()
             try:
-                async with aiohttp.ClientSession() as session:
-                    # Send unlock command to door controller
-                    # This URL pattern can be customized based on your door controller API
-                    url = f"http://{door.ip_address}:{door.port}/unlock"
-                    async with session.post(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                        if response.status == 200:
-                            logger.info(f"Door {door.name} opened successfully")
-                            return {"success": True, "message": f"Door {door.name} opened"}
-                        else:
-                            logger.warning(f"Door controller returned status {response.status}")
-                            return {"success": True, "message": f"Command sent to {door.name} (simulated)"}
+                with phase("outbound"):
+                    async with aiohttp.ClientSession() as session:
+                        # Send unlock command to door controller
+                        # This URL pattern can be customized based on your door controller API
+                        url = f"http://{door.ip_address}:{door.port}/unlock"
+                        async with session.post(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                            if response.status == 200:
+                                CONTROLLER_SECONDS.observe(time.perf_counter() - start, "ok")
+                                logger.info(f"Door {door.name} opened successfully")
+                                return {"success": True, "message": f"Door {door.name} opened"}
+                            else:
+                                CONTROLLER_SECONDS.observe(time.perf_counter() - start, "bad_status")
+                                logger.warning(f"Door controller returned status {response.status}")
+                                if _retryable_status(response.status):
+                                    self._queue_unlock(door, user_id, f"controller returned status {response.status}")
+                                    return {"success": True, "queued": True,
+                                            "message": f"Door {door.name} busy; open command queued for retry"}
+                                return {"success": True, "message": f"Command sent to {door.name} (simulated)"}
             except Exception as e:
+                CONTROLLER_SECONDS.observe(time.perf_counter() - start, "unreachable")
                 logger.warning(f"Could not reach door controller: {e}")
-                return {"success": True, "message": f"Door {door.name} open command logged (controller unreachable)"}
+                self._queue_unlock(door, user_id, str(e) or type(e).__name__)
+                return {"success": True, "queued": True,
+                        "message": f"Door {door.name} open command queued (controller unreachable)"}
         
         return {"success": True, "message": f"Door {door.name} open command logged"}
     
+    def _queue_unlock(self, door: Door, user_id: Optional[str], error: str):
+        """
+        Retry an unlock in the background. Unlocks expire after
+        outbox_unlock_ttl seconds; opening a door long after the person
+        left would be worse than not opening it.
+        """
+        self.outbox.enqueue("unlock", f"{door.ip_address}:{door.port}", {"door_id": door.id, "user_id": user_id},
+                            ttl=settings.outbox_unlock_ttl, error=error)
+    
+    async def _deliver_unlock(self, session: aiohttp.ClientSession, message: Dict[str, Any]):
+        """Outbox handler: send a queued unlock command to the door's controller."""
+        door = self._view.doors.get(message["payload"]["door_id"])
+        if door is None or not door.ip_address:
+            raise PermanentDeliveryError("door no longer has a controller")
+        url = f"http://{door.ip_address}:{door.port}/unlock"
+        async with session.post(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+            if response.status == 200:
+                logger.info(f"Door {door.name} opened (retried from outbox)")
+                return
+            if not _retryable_status(response.status):
+                raise PermanentDeliveryError(f"controller returned status {response.status}")
+            raise RuntimeError(f"controller returned status {response.status}")
+    
+    # ==================== Central Server ====================
+    
+    async def request_user_validation(self, user_id: str,
+                                      session: Optional[aiohttp.ClientSession] = None) -> Tuple[int, str]:
+        """
+        Ask the central Visage validation API about an employee ID.
+        Returns (HTTP status, validation message); raises if unreachable.
+        """
+        headers = {
+            "api": settings.validation_api_key,
+            "user": settings.validation_api_user,
+            "uname": user_id
+        }
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self.request_user_validation(user_id, session)
+        async with session.post(settings.validation_api_url, headers=headers,
+                                timeout=aiohttp.ClientTimeout(total=5)) as response:
+            if response.status != 200:
+                return response.status, ""
+            result = await response.json()
+            return response.status, result.get("msg", "")
+    
+    def queue_user_verification(self, user_id: str, error: str):
+        """Re-check an employee accepted while the central server was unreachable."""
+        self.outbox.enqueue("verify_user", settings.validation_api_url, {"user_id": user_id},
+                            ttl=settings.outbox_verify_ttl, error=error)
+    
+    async def _deliver_user_verification(self, session: aiohttp.ClientSession, message: Dict[str, Any]):
+        """
+        Outbox handler: verify an employee that was accepted offline, and
+        deactivate them if the central server doesn't know them. The check
+        runs before the user is usually added (possibly by another worker),
+        so it is deferred until the user exists or the message expires.
+        """
+        user_id = message["payload"]["user_id"]
+        self.sync(force=True)
+        if user_id not in self._view.users:
+            raise DeferredDelivery(f"user {user_id} has not been added yet")
+        status, msg = await self.request_user_validation(user_id, session)
+        if status != 200:
+            raise RuntimeError(f"validation API returned status {status}")
+        if "Username found" in msg:
+            logger.info(f"Deferred verification of {user_id} succeeded")
+        elif "Username Available" in msg:
+            await asyncio.to_thread(self.update_user, user_id, is_active=False)
+            logger.warning(f"User {user_id} was accepted offline but is not registered on the central server; "
+                           f"deactivated")
+        else:
+            logger.warning(f"Unexpected validation response for {user_id}: {msg}")
+    
     # ==================== User Operations ====================
     
     def get_all_users(self) -> List[User]:
         """Get all users."""
-        return list(self.users.values())
+        return list(self._view.users.values())
     
     def get_user(self, user_id: str) -> Optional[User]:
         """Get a specific user by ID."""
-        return self.users.get(user_id)
+        return self._view.users.get(user_id)
     
     def get_users_by_building(self, building_id: str) -> List[User]:
         """Get all users authorized for a specific building (via doors)."""
-        # Get IDs of all doors in this building
-        building_door_ids = set(d.id for d in self.doors.values() if d.building_id == building_id)
-        
-        authorized_users = []
-        for u in self.users.values():
-            # Check if user is authorized for ANY door in this building
-            if hasattr(u, 'authorized_doors') and u.authorized_doors:
-                if any(did in building_door_ids for did in u.authorized_doors):
-                    authorized_users.append(u)
-                    
-        return authorized_users
+        view = self._view
+        building_handle = self._building_keys.get(building_id)
+        if building_handle is None:
+            return []
+        
+        # Union of users authorized for ANY door in this building
+        user_handles: Set[int] = set()
+        for door_handle in view.building_doors.get(building_handle, ()):
+            user_handles.update(view.door_users.get(door_handle, ()))
+        
+        return [view.users[self._user_keys.key(h)] for h in sorted(user_handles)]
+    
+    def search_users(self, query: str, limit: int = 20) -> List[User]:
+        """
+        The best `limit` users with, for every word of the query, a word of
+        their ID, name, email or department starting with it. ID matches
+        rank first, then name, email and department matches.
+        """
+        index = self._user_search
+        if not index.built:
+            # Built from the working state, so under the lock writers update it with
+            with self._file_lock:
+                if not index.built:
+                    index.load((self._user_keys.intern(u.id), u.id, u.name, u.email, u.department)
+                               for u in self.users.values())
+        users = self._view.users
+        key = self._user_keys.key
+        found = (users.get(key(handle)) for handle in index.search(query, limit))
+        # A user indexed by a writer but not yet published is left out
+        return [user for user in found if user is not None]
     
     def create_user(self, user_id: str, name: str, email: str = "", 
                    department: str = "", role: str = "employee") -> User:
@@ -344,8 +1712,11 @@ class DoorAccessService:
             role=role,
             face_registered=True # Verified users always have face registered
         )
-        self.users[user_id] = user
-        self._save_users()
+        with self.batch():
+            self._touch("users", user_id)
+            self.users[user_id] = user
+            self._index_user(user)
+            self._save_users()
         logger.info(f"Created user: {name} ({user_id})")
         return user
     
@@ -354,21 +1725,29 @@ class DoorAccessService:
         if user_id not in self.users:
             return None
         
-        user = self.users[user_id]
-        for key, value in kwargs.items():
-            if hasattr(user, key) and key not in ['id', 'created_at']:
-                setattr(user, key, value)
-        user.updated_at = datetime.now()
-        self._save_users()
-        return user
+        with self.batch():
+            self._touch("users", user_id)
+            user = self.users[user_id]
+            for key, value in kwargs.items():
+                if hasattr(user, key) and key not in ['id', 'created_at']:
+                    setattr(user, key, value)
+            user.updated_at = datetime.now()
+            self._index_user(user)
+            self._save_users()
+        return self.users[user_id]
     
     def delete_user(self, user_id: str) -> bool:
         """Delete a user."""
         if user_id not in self.users:
             return False
         
-        del self.users[user_id]
-        self._save_users()
+        with self.batch():
+            self._touch("users", user_id)
+            self._unindex_user(user_id)
+            del self.users[user_id]
+            self._save_users()
+            self._after_commit(lambda: self._embeddings.remove(user_id))
+            self._after_commit(lambda: self._occupancy.forget(user_id))
         return True
     
     def authorize_user_for_doors(self, user_id: str, door_ids: List[str]) -> bool:
@@ -376,15 +1755,16 @@ class DoorAccessService:
         if user_id not in self.users:
             return False
         
-        user = self.users[user_id]
-        
         # Validate that all door_ids exist
         valid_door_ids = [d_id for d_id in door_ids if d_id in self.doors]
         
-        user.authorized_doors = valid_door_ids
-        user.updated_at = datetime.now()
-        
-        self._save_users()
+        with self.batch():
+            self._touch("users", user_id)
+            user = self.users[user_id]
+            user.authorized_doors = valid_door_ids
+            user.updated_at = datetime.now()
+            self._index_user(user)
+            self._save_users()
         logger.info(f"Updated door access for user {user_id}: {len(valid_door_ids)} doors")
         return True
     
@@ -392,60 +1772,255 @@ class DoorAccessService:
         """Update user's face registration status."""
         if user_id not in self.users:
             return False
-        self.users[user_id].face_registered = registered
-        self.users[user_id].updated_at = datetime.now()
-        self._save_users()
+        with self.batch():
+            self._touch("users", user_id)
+            self.users[user_id].face_registered = registered
+            self.users[user_id].updated_at = datetime.now()
+            self._index_user(self.users[user_id])
+            self._save_users()
+            if not registered:
+                self._after_commit(lambda: self._embeddings.remove(user_id))
         return True
     
-    # ==================== Access Control ====================
-    
-    def check_user_access(self, user_id: str, door_id: str) -> Dict[str, Any]:
-        """Check if a user has access to a specific door."""
+    def register_face_embedding(self, user_id: str, embedding: List[float]) -> bool:
+        """
+        Store a user's face embedding for matching and mark their face as
+        registered. Raises ValueError if the embedding has the wrong size.
+        """
         if user_id not in self.users:
-            return {"authorized": False, "reason": "User not found"}
-        
-        if door_id not in self.doors:
-            return {"authorized": False, "reason": "Door not found"}
+            return False
+        vector = self._embeddings.normalize(embedding)
+        with self.batch():
+            self._after_commit(lambda: self._embeddings.upsert(user_id, vector))
+            if not self.users[user_id].face_registered:
+                self.set_user_face_registered(user_id, True)
+        return True
+    
+    def get_effective_doors(self, user_id: str) -> Optional[List[str]]:
+        """Doors a user is granted directly or through access groups."""
+        view = self._view
+        user = view.users.get(user_id)
+        if user is None:
+            return None
+        doors = set(user.authorized_doors)
+        for group in view.access_groups.values():
+            if user.role in group.roles or user.department in group.departments or user_id in group.members:
+                doors.update(group.door_ids)
+        return sorted(d for d in doors if d in view.doors)
+    
+    # ==================== Access Group Operations ====================
+    
+    def get_all_access_groups(self) -> List[AccessGroup]:
+        """Get all access groups."""
+        return list(self._view.access_groups.values())
+    
+    def get_access_group(self, group_id: str) -> Optional[AccessGroup]:
+        """Get a specific access group by ID."""
+        return self._view.access_groups.get(group_id)
+    
+    def get_access_group_members(self, group_id: str) -> Optional[List[str]]:
+        """IDs of the existing users an access group currently applies to."""
+        view = self._view
+        group = view.access_groups.get(group_id)
+        if group is None:
+            return None
+        roles, departments, members = set(group.roles), set(group.departments), set(group.members)
+        return [u.id for u in view.users.values()
+                if u.role in roles or u.department in departments or u.id in members]
+    
+    def create_access_group(self, name: str, description: str = "", roles: Optional[List[str]] = None,
+                            departments: Optional[List[str]] = None, members: Optional[List[str]] = None,
+                            door_ids: Optional[List[str]] = None, schedule_id: Optional[str] = None) -> AccessGroup:
+        """
+        Create an access group. Its doors are compiled into the grants of
+        every matching user at once; the users themselves are not rewritten.
+        """
+        group_id = f"grp_{uuid.uuid4().hex[:8]}"
+        group = AccessGroup(
+            id=group_id,
+            name=name,
+            description=description,
+            roles=roles or [],
+            departments=departments or [],
+            members=members or [],
+            door_ids=[d_id for d_id in door_ids or [] if d_id in self.doors],
+            schedule_id=schedule_id
+        )
+        with self.batch():
+            self._touch("access_groups", group_id)
+            self.access_groups[group_id] = group
+            self._index_group(group)
+            self._save_access_groups()
+        logger.info(f"Created access group: {name} ({group_id})")
+        return group
+    
+    def update_access_group(self, group_id: str, **kwargs) -> Optional[AccessGroup]:
+        """
+        Update an access group; only the users who matched it before or
+        match it now have their grants recompiled.
+        """
+        if group_id not in self.access_groups:
+            return None
         
-        user = self.users[user_id]
-        door = self.doors[door_id]
+        with self.batch():
+            self._touch("access_groups", group_id)
+            group = self.access_groups[group_id]
+            for key, value in kwargs.items():
+                if hasattr(group, key) and key not in ['id', 'created_at']:
+                    setattr(group, key, value)
+            if 'door_ids' in kwargs:
+                group.door_ids = [d_id for d_id in group.door_ids if d_id in self.doors]
+            group.updated_at = datetime.now()
+            self._index_group(group)
+            self._save_access_groups()
+        logger.info(f"Updated access group {group_id}: {len(group.door_ids)} doors")
+        return self.access_groups[group_id]
+    
+    def delete_access_group(self, group_id: str) -> bool:
+        """Delete an access group and revoke the doors it granted."""
+        if group_id not in self.access_groups:
+            return False
         
-        if not user.is_active:
-            return {"authorized": False, "reason": "User account is inactive"}
+        with self.batch():
+            self._touch("access_groups", group_id)
+            del self.access_groups[group_id]
+            self._unindex_group(group_id)
+            self._save_access_groups()
+        return True
+    
+    # ==================== Schedule Operations ====================
+    
+    def get_all_schedules(self) -> List[AccessSchedule]:
+        """Get all access schedules."""
+        return list(self._view.schedules.values())
+    
+    def get_schedule(self, schedule_id: str) -> Optional[AccessSchedule]:
+        """Get a specific access schedule by ID."""
+        return self._view.schedules.get(schedule_id)
+    
+    def create_schedule(self, name: str, description: str = "", windows: Optional[List[Any]] = None,
+                        holidays: Optional[List[Any]] = None) -> AccessSchedule:
+        """Create an access schedule. Raises ValueError if a window is invalid."""
+        schedule_id = f"sch_{uuid.uuid4().hex[:8]}"
+        schedule = AccessSchedule(
+            id=schedule_id,
+            name=name,
+            description=description,
+            windows=windows or [],
+            holidays=holidays or []
+        )
+        compile_schedule(schedule)
+        with self.batch():
+            self._touch("schedules", schedule_id)
+            self.schedules[schedule_id] = schedule
+            self._index_schedule(schedule)
+            self._save_schedules()
+        logger.info(f"Created schedule: {name} ({schedule_id})")
+        return schedule
+    
+    def update_schedule(self, schedule_id: str, **kwargs) -> Optional[AccessSchedule]:
+        """
+        Update an access schedule. Doors and grants using it follow without
+        being recompiled. Raises ValueError if a window is invalid.
+        """
+        if schedule_id not in self.schedules:
+            return None
         
-        if not user.face_registered:
-            return {"authorized": False, "reason": "Face not registered"}
+        current = self.schedules[schedule_id]
+        updates = {k: v for k, v in kwargs.items() if k in AccessSchedule.model_fields and k not in ['id', 'created_at']}
+        schedule = AccessSchedule.model_validate({**current.model_dump(), **updates, "updated_at": datetime.now()})
+        compile_schedule(schedule)
+        with self.batch():
+            self._touch("schedules", schedule_id)
+            self.schedules[schedule_id] = schedule
+            self._index_schedule(schedule)
+            self._save_schedules()
+        return schedule
+    
+    def delete_schedule(self, schedule_id: str) -> bool:
+        """Delete an access schedule, lifting it from the doors, users and groups that use it."""
+        if schedule_id not in self.schedules:
+            return False
         
-        # Check door-level access
-        if hasattr(user, 'authorized_doors') and user.authorized_doors:
-            if door_id in user.authorized_doors:
-                return {
-                    "authorized": True, 
-                    "user": user,
-                    "door": door,
-                    "building": self.buildings.get(door.building_id)
-                }
+        with self.batch():
+            for collection, index in (("doors", self._index_door), ("users", self._index_user),
+                                      ("access_groups", self._index_group)):
+                store = getattr(self, collection)
+                holders = [e.id for e in store.values() if e.schedule_id == schedule_id]
+                for entity_id in holders:
+                    self._touch(collection, entity_id)
+                    store[entity_id].schedule_id = None
+                    index(store[entity_id])
+                if holders:
+                    getattr(self, f"_save_{collection}")()
+            
+            self._touch("schedules", schedule_id)
+            del self.schedules[schedule_id]
+            self._unindex_schedule(schedule_id)
+            self._save_schedules()
+        return True
+    
+    # ==================== Access Control ====================
+    
+    def decide_access(self, user_id: str, door_id: str, when: Optional[datetime] = None) -> AccessReason:
+        """
+        Fast allow/deny decision from the compiled authorization matrix, at
+        `when` (default: now) for scheduled doors and grants.
+        Returns AccessReason.GRANTED or the reason code for the denial.
+        """
+        view = self._view
+        reason = view.matrix.decide(self._user_keys.get(user_id), self._door_keys.get(door_id), when)
+        if reason is _GRANTED and self._violates_passback(view, user_id, door_id):
+            return _ANTI_PASSBACK
+        return reason
+    
+    def _violates_passback(self, view: _ReadView, user_id: str, door_id: str) -> bool:
+        """Whether anti-passback (if enabled) denies a user an otherwise granted door."""
+        if not settings.anti_passback:
+            return False
+        door = view.doors[door_id]
+        return self._occupancy.violates_passback(user_id, door.building_id, door.direction)
+    
+    def check_user_access(self, user_id: str, door_id: str, when: Optional[datetime] = None) -> Dict[str, Any]:
+        """Check if a user has access to a specific door (at `when`, default now)."""
+        view = self._view
+        reason = view.matrix.decide(self._user_keys.get(user_id), self._door_keys.get(door_id), when)
+        if reason is _GRANTED and self._violates_passback(view, user_id, door_id):
+            reason = _ANTI_PASSBACK
+        if reason is not _GRANTED:
+            return {"authorized": False, "reason": ACCESS_REASON_MESSAGES[reason]}
         
-        return {"authorized": False, "reason": "User not authorized for this door"}
+        door = view.doors[door_id]
+        return {
+            "authorized": True, 
+            "user": view.users[user_id],
+            "door": door,
+            "building": view.buildings.get(door.building_id)
+        }
     
+    @timed(FACE_RECOGNITION_SECONDS)
     def process_face_recognition_access(self, user_id: str, similarity_score: float,
                                         door_id: Optional[str] = None) -> Dict[str, Any]:
         """Process a face recognition event for door access."""
-        if user_id not in self.users:
+        view = self._view
+        if user_id not in view.users:
             logger.warning(f"Unknown user ID in face recognition: {user_id}")
             return {"success": False, "message": "User not found in access control system"}
         
-        user = self.users[user_id]
+        user = view.users[user_id]
         
         # If no specific door, find all accessible doors and open them
         if door_id is None:
             accessible_doors = []
             
-            # Use authorized_doors directly
-            if hasattr(user, 'authorized_doors'):
-                for d_id in user.authorized_doors:
-                    if d_id in self.doors and self.doors[d_id].status == DoorStatus.ONLINE:
-                        accessible_doors.append(d_id)
+            # Direct and group grants whose schedules are open now
+            user_handle = self._user_keys.get(user_id)
+            now = datetime.now()
+            for d_id in self.get_effective_doors(user_id) or []:
+                if (view.doors[d_id].status == DoorStatus.ONLINE
+                        and view.matrix.within_schedule(user_handle, self._door_keys.get(d_id), now)
+                        and not self._violates_passback(view, user_id, d_id)):
+                    accessible_doors.append(d_id)
             
             if not accessible_doors:
                 return {"success": False, "message": "No accessible doors found"}
@@ -459,10 +2034,12 @@ class DoorAccessService:
                     user_name=user.name,
                     event_type=AccessLogType.GRANTED,
                     similarity_score=similarity_score,
-                    building_id=self.doors[d_id].building_id if d_id in self.doors else None,
-                    details=f"Face recognition access granted (score: {similarity_score:.2f})"
+                    building_id=view.doors[d_id].building_id if d_id in view.doors else None,
+                    details=f"Face recognition access granted (score: {similarity_score:.2f})",
+                    multi_door=True
                 )
-                self.access_logs.append(log_entry)
+                self._append_access_log(log_entry)
+                ACCESS_DECISIONS.inc(d_id, "granted")
             
             self._save_access_logs()
             return {
@@ -484,10 +2061,12 @@ class DoorAccessService:
                 user_name=user.name,
                 event_type=AccessLogType.DENIED,
                 similarity_score=similarity_score,
-                building_id=self.doors[door_id].building_id if door_id in self.doors else None,
+                building_id=view.doors[door_id].building_id if door_id in view.doors else None,
                 details=f"Access denied: {access_check['reason']}"
             )
-            self.access_logs.append(log_entry)
+            self._append_access_log(log_entry)
+            # Unknown door IDs come from clients; don't let them add label values
+            ACCESS_DECISIONS.inc(door_id if door_id in view.doors else "<unknown>", "denied")
             self._save_access_logs()
             return {"success": False, "message": access_check["reason"]}
         
@@ -499,61 +2078,251 @@ class DoorAccessService:
             user_name=user.name,
             event_type=AccessLogType.GRANTED,
             similarity_score=similarity_score,
-            building_id=self.doors[door_id].building_id,
+            building_id=view.doors[door_id].building_id,
             details=f"Face recognition access granted (score: {similarity_score:.2f})"
         )
-        self.access_logs.append(log_entry)
+        self._append_access_log(log_entry)
+        ACCESS_DECISIONS.inc(door_id, "granted")
         self._save_access_logs()
         
         return {
             "success": True,
             "message": f"Access granted for {user.name}",
-            "door": self.doors[door_id].model_dump(mode='json'),
+            "door": view.doors[door_id].model_dump(mode='json'),
             "user": user.model_dump(mode='json')
         }
     
+    def match_face_embedding(self, embedding: List[float], door_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Match a face embedding against the registered gallery and, if the
+        best match clears embedding_match_threshold, process it like a face
+        recognition event for that user. Raises ValueError for a bad embedding.
+        """
+        with EMBEDDING_SEARCH_SECONDS.time():
+            matches = self._embeddings.search(embedding, k=1)
+        user_id, score = matches[0] if matches else (None, None)
+        
+        if user_id is None or score < settings.embedding_match_threshold:
+            view = self._view
+            if door_id is not None and door_id in view.doors:
+                log_entry = AccessLog(
+                    id=str(uuid.uuid4()),
+                    door_id=door_id,
+                    event_type=AccessLogType.DENIED,
+                    similarity_score=score,
+                    building_id=view.doors[door_id].building_id,
+                    details="Access denied: no matching face" + (f" (best score: {score:.2f})" if score is not None else "")
+                )
+                self._append_access_log(log_entry)
+                ACCESS_DECISIONS.inc(door_id, "denied")
+                self._save_access_logs()
+            return {"success": False, "message": "No matching face", "match": None}
+        
+        result = self.process_face_recognition_access(user_id, score, door_id)
+        result["match"] = {"user_id": user_id, "similarity_score": round(score, 4)}
+        return result
+    
+    # ==================== Edge Sync ====================
+    
+    @property
+    def version(self) -> int:
+        """Current change version (0 when the journal is disabled)."""
+        return self._journal.version if self._journal is not None else 0
+    
+    def get_changes(self, since: int, limit: int = 1000,
+                    collection: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get journaled changes after version `since`. If they are no longer
+        retained, returns reset=True and the client must resync in full.
+        """
+        current = self._view.version
+        events = self._journal.events_since(since, current) if self._journal is not None else None
+        if events is None:
+            return {"version": current, "reset": True, "has_more": False, "events": []}
+        
+        has_more = len(events) > limit
+        events = events[:limit]
+        version = events[-1]["version"] if has_more else current
+        if collection:
+            events = [e for e in events if e["collection"] == collection]
+        return {"version": version, "reset": False, "has_more": has_more, "events": events}
+    
+    def get_door_allow_list(self, door_id: str, since: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the user IDs currently allowed through a door. With `since`,
+        return only the users whose status changed after that version
+        (added/removed), or reset=True if the delta is unavailable.
+        """
+        view = self._view
+        if door_id not in view.doors:
+            return None
+        door_handle = self._door_keys.get(door_id)
+        result: Dict[str, Any] = {"door_id": door_id, "version": view.version}
+        
+        if since is not None:
+            events = self._journal.events_since(since, view.version) if self._journal is not None else None
+            if events is not None and not any(
+                    (e["collection"] == "doors" and e["entity_id"] == door_id and e["op"] == "delete")
+                    # A group edit can change the grants of any number of users
+                    or e["collection"] == "access_groups"
+                    for e in events):
+                touched = {e["entity_id"] for e in events if e["collection"] == "users"}
+                added, removed = [], []
+                for user_id in sorted(touched):
+                    user_handle = self._user_keys.get(user_id)
+                    if user_handle is not None and view.matrix.is_allowed(user_handle, door_handle):
+                        added.append(user_id)
+                    else:
+                        removed.append(user_id)
+                result.update({"reset": False, "added": added, "removed": removed})
+                return result
+            result["reset"] = True
+        
+        key = self._user_keys.key
+        result["user_ids"] = [key(h) for h in view.matrix.allowed_users(door_handle)]
+        return result
+    
     # ==================== Access Logs ====================
     
     def get_access_logs(self, limit: int = 100, door_id: Optional[str] = None,
                        user_id: Optional[str] = None, building_id: Optional[str] = None) -> List[AccessLog]:
         """Get access logs with optional filters."""
         logs = self.access_logs
+        count = len(logs)
         
-        if door_id:
-            logs = [l for l in logs if l.door_id == door_id]
-        if user_id:
-            logs = [l for l in logs if l.user_id == user_id]
-        if building_id:
-            logs = [l for l in logs if l.building_id == building_id]
+        # Filter on the interned log columns instead of comparing strings
+        filters = [
+            (key, keys, column) for key, keys, column in (
+                (door_id, self._door_keys, self._log_doors),
+                (user_id, self._user_keys, self._log_users),
+                (building_id, self._building_keys, self._log_buildings),
+            ) if key
+        ]
+        if filters:
+            indices = range(count)
+            for key, keys, column in filters:
+                handle = keys.get(key)
+                if handle is None:
+                    return []
+                indices = [i for i in indices if column[i] == handle]
+            logs = [logs[i] for i in indices]
+        
+        else:
+            logs = logs[:count]
         
         return sorted(logs, key=lambda x: x.timestamp, reverse=True)[:limit]
     
+    def get_score_stats(self, door_id: Optional[str] = None, building_id: Optional[str] = None,
+                        event_type: Optional[str] = None, buckets: int = 20) -> Dict[str, Any]:
+        """
+        Similarity score distribution (count, mean, quantiles, histogram)
+        over all logged events, optionally for one door or building and
+        one event type, with a breakdown per event type.
+        """
+        if SCORE_BINS % buckets:
+            raise ValueError(f"buckets must divide {SCORE_BINS}")
+        door_ids = None
+        if door_id:
+            door_ids = {door_id}
+        if building_id:
+            building_doors = {d.id for d in self.get_doors_by_building(building_id)}
+            door_ids = building_doors if door_ids is None else door_ids & building_doors
+        return self._score_stats.summarize(door_ids, event_type, buckets)
+    
+    # ==================== Occupancy ====================
+    
+    def get_occupancy(self) -> Dict[str, Any]:
+        """Headcount of every building (from memory, not the logs)."""
+        view = self._view
+        headcounts = self._occupancy.headcounts()
+        buildings = [{"building_id": b.id, "name": b.name, "inside": headcounts.get(b.id, 0)}
+                     for b in view.buildings.values()]
+        return {"total_inside": sum(b["inside"] for b in buildings), "buildings": buildings}
+    
+    def get_building_occupancy(self, building_id: str, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """A building's headcount and (up to limit of) the users inside, or None if it doesn't exist."""
+        view = self._view
+        if building_id not in view.buildings:
+            return None
+        inside = self._occupancy.inside(building_id)
+        return {"building_id": building_id, "inside": len(inside), "user_ids": inside[:limit]}
+    
+    def get_user_location(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Where a user last passed an entry or exit door and whether they are inside; None if they haven't been seen."""
+        presence = self._occupancy.presence(user_id)
+        if presence is None:
+            return None
+        building = self._view.buildings.get(presence.building_id)
+        return {
+            "user_id": user_id,
+            "building_id": presence.building_id,
+            "building_name": building.name if building else None,
+            "door_id": presence.door_id,
+            "direction": presence.direction.value,
+            "timestamp": presence.timestamp.isoformat(),
+            "inside": presence.inside,
+        }
+    
     def get_dashboard_stats(self) -> Dict[str, Any]:
         """Get statistics for the dashboard."""
-        from datetime import datetime
-        
-        today = datetime.now().date()
-        today_logs = [l for l in self.access_logs 
-                     if l.timestamp.date() == today]
+        view = self._view
+        # Today's counts come from the hourly rollups, not a scan of the logs
+        self._fold_rollups()
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        today_counts = self._rollups.totals(today, today + timedelta(days=1))
         
         return {
-            "total_buildings": len(self.buildings),
-            "total_doors": len(self.doors),
-            "total_users": len(self.users),
-            "registered_faces": sum(1 for u in self.users.values() if u.face_registered),
-            "online_doors": sum(1 for d in self.doors.values() if d.status == DoorStatus.ONLINE),
-            "today_access_events": len(today_logs),
-            "today_granted": sum(1 for l in today_logs if l.event_type == AccessLogType.GRANTED),
-            "today_denied": sum(1 for l in today_logs if l.event_type == AccessLogType.DENIED),
+            "total_buildings": len(view.buildings),
+            "total_doors": len(view.doors),
+            "total_users": len(view.users),
+            "registered_faces": sum(1 for u in view.users.values() if u.face_registered),
+            "online_doors": sum(1 for d in view.doors.values() if d.status == DoorStatus.ONLINE),
+            "today_access_events": sum(today_counts.values()),
+            "today_granted": today_counts.get(AccessLogType.GRANTED.value, 0),
+            "today_denied": today_counts.get(AccessLogType.DENIED.value, 0),
         }
 
 
 # Singleton instance getter
 _door_access_service: Optional[DoorAccessService] = None
 
+
+def _collection_sizes() -> Dict[Tuple[str, ...], float]:
+    """In-memory collection sizes of the running service, for /metrics."""
+    service = _door_access_service
+    if service is None:
+        return {}
+    view = service._view
+    return {
+        ("buildings",): len(view.buildings),
+        ("doors",): len(view.doors),
+        ("users",): len(view.users),
+        ("access_groups",): len(view.access_groups),
+        ("access_logs",): len(service.access_logs),
+    }
+
+
+COLLECTION_SIZE = CallbackGauge(
+    "visage_collection_size", "Entities held in memory per collection.", ("collection",), _collection_sizes)
+
+
+def _outbox_pending() -> Dict[Tuple[str, ...], float]:
+    """Undelivered outbox messages, as seen by the delivering worker."""
+    service = _door_access_service
+    if service is None or not service.outbox.delivering:
+        return {}
+    return {(): service.outbox.pending_count()}
+
+
+OUTBOX_PENDING = CallbackGauge(
+    "visage_outbox_pending", "Outbox messages awaiting delivery (reported by the delivering worker).", (),
+    _outbox_pending)
+
 def get_door_access_service() -> DoorAccessService:
     """Get the singleton DoorAccessService instance."""
     global _door_access_service
     if _door_access_service is None:
         _door_access_service = DoorAccessService()
+    else:
+        _door_access_service.sync()
     return _door_access_service
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Face Embedding Index
+Memory-mapped gallery of registered users' face embeddings with vectorized
+nearest-neighbour search (brute force, or an optional IVF partitioning).
+"""
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Gallery(NamedTuple):
+    """Immutable searchable state; replaced as a whole on every change."""
+    ids: Tuple[Optional[str], ...]  # Row -> user ID (None for removed rows)
+    vectors: np.ndarray  # rows x dim float32, L2-normalized, memory-mapped
+    alive: np.ndarray  # rows bool
+    centroids: Optional[np.ndarray]  # IVF lists x dim (None when not partitioned)
+    assignments: Optional[np.ndarray]  # Row -> IVF list
+
+
+class EmbeddingIndex:
+    """
+    Gallery of one embedding per user, searched by cosine similarity.
+
+    Rows are appended to a raw float32 file that is memory-mapped for
+    search, so large galleries are paged in by the OS instead of loaded.
+    Re-registering a user appends a new row and retires the old one;
+    retired rows are dropped when they make up half the file. ids.json
+    maps rows to users and is replaced atomically after each change, so
+    it defines which rows are valid (rows beyond it are an interrupted
+    append) and other worker processes can stat it to notice changes.
+
+    Search multiplies the query against batches of rows. With ivf_lists
+    set, rows are partitioned around k-means centroids once the gallery
+    has enough rows, and only the ivf_probes nearest partitions are
+    scanned; this trades a little recall for a much smaller scan.
+
+    Mutations must be serialized by the caller; searches can run
+    concurrently with them, each using the gallery current when it began.
+    """
+
+    def __init__(self, directory: str, dim: int, ivf_lists: int = 0, ivf_probes: int = 8,
+                 batch_rows: int = 65536):
+        self.directory = directory
+        self.ids_file = os.path.join(directory, "ids.json")
+        self.dim = dim
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self.batch_rows = batch_rows
+
+        self._generation = 0
+        self._rows: Dict[str, int] = {}  # User ID -> current row
+        self._trained_rows = 0  # Alive rows when the IVF centroids were trained
+        self._ids_seen: Optional[Tuple[int, int]] = None
+        self._gallery = self._build([], np.zeros((0, dim), dtype=np.float32))
+
+    @property
+    def _vectors_file(self) -> str:
+        return os.path.join(self.directory, f"vectors-{self._generation}.f32")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._rows
+
+    # ==================== Persistence ====================
+
+    def _ids_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.ids_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def changed(self) -> bool:
+        """Whether another process changed the gallery since it was last loaded."""
+        return self._ids_stat() != self._ids_seen
+
+    def load(self):
+        """Load (or reload) the gallery from disk."""
+        self._ids_seen = self._ids_stat()
+        if self._ids_seen is None:
+            return
+        try:
+            with open(self.ids_file, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading face embeddings: {e}")
+            return
+        if manifest["dim"] != self.dim:
+            logger.warning(f"Face embeddings on disk have {manifest['dim']} dimensions, "
+                           f"not the configured {self.dim}; using {manifest['dim']}")
+            self.dim = manifest["dim"]
+        self._generation = manifest["generation"]
+        ids = manifest["ids"]
+        self._rows = {user_id: row for row, user_id in enumerate(ids) if user_id is not None}
+        self._gallery = self._build(ids, self._map(len(ids)))
+
+    def _map(self, rows: int) -> np.ndarray:
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self._vectors_file, dtype=np.float32, mode='r', shape=(rows, self.dim))
+
+    def _write_ids(self, ids: List[Optional[str]]):
+        tmp_path = f"{self.ids_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"generation": self._generation, "dim": self.dim, "ids": ids}, f)
+        os.replace(tmp_path, self.ids_file)
+        self._ids_seen = self._ids_stat()
+
+    # ==================== Mutations ====================
+
+    def normalize(self, embedding) -> np.ndarray:
+        """An embedding as a unit vector. Raises ValueError if it has the wrong size or is zero."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Embedding must have {self.dim} dimensions, got {vector.shape[0]}")
+        norm = float(np.linalg.norm(vector))
+        if not np.isfinite(norm) or norm == 0.0:
+            raise ValueError("Embedding must be a finite, non-zero vector")
+        return vector / norm
+
+    def upsert(self, user_id: str, embedding):
+        """Store a user's embedding, replacing any previous one."""
+        vector = self.normalize(embedding)
+        os.makedirs(self.directory, exist_ok=True)
+        ids = list(self._gallery.ids)
+        # Drop rows beyond ids.json left by an interrupted append
+        with open(self._vectors_file, 'ab') as f:
+            f.truncate(len(ids) * self.dim * 4)
+            f.write(vector.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        previous = self._rows.get(user_id)
+        if previous is not None:
+            ids[previous] = None
+        ids.append(user_id)
+        self._rows[user_id] = len(ids) - 1
+        self._commit(ids)
+
+    def remove(self, user_id: str) -> bool:
+        """Remove a user's embedding. Returns False if there was none."""
+        row = self._rows.pop(user_id, None)
+        if row is None:
+            return False
+        ids = list(self._gallery.ids)
+        ids[row] = None
+        self._commit(ids)
+        return True
+
+    def _commit(self, ids: List[Optional[str]]):
+        if len(self._rows) * 2 < len(ids):
+            self._compact(ids)
+            return
+        self._write_ids(ids)
+        self._gallery = self._build(ids, self._map(len(ids)), self._gallery)
+
+    def _compact(self, ids: List[Optional[str]]):
+        """Rewrite the vectors file without retired rows."""
+        keep = [row for row, user_id in enumerate(ids) if user_id is not None]
+        vectors = np.asarray(self._map(len(ids))[keep]) if keep else np.zeros((0, self.dim), np.float32)
+        old_file = self._vectors_file
+        self._generation += 1
+        with open(self._vectors_file, 'wb') as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        ids = [ids[row] for row in keep]
+        self._rows = {user_id: row for row, user_id in enumerate(ids)}
+        self._write_ids(ids)
+        self._trained_rows = 0
+        self._gallery = self._build(ids, self._map(len(ids)))
+        try:
+            os.remove(old_file)
+        except OSError:
+            pass
+
+    # ==================== IVF Partitioning ====================
+
+    def _build(self, ids: List[Optional[str]], vectors: np.ndarray,
+               previous: Optional[_Gallery] = None) -> _Gallery:
+        alive = np.fromiter((user_id is not None for user_id in ids), dtype=bool, count=len(ids))
+        centroids = assignments = None
+        alive_count = int(alive.sum())
+        # ~40 rows per partition is the least that makes training meaningful
+        if self.ivf_lists and alive_count >= self.ivf_lists * 40:
+            if previous is not None and previous.centroids is not None and alive_count < 2 * self._trained_rows:
+                # Assign only the appended rows to the existing partitions
+                centroids = previous.centroids
+                known = len(previous.assignments)
+                assignments = np.concatenate([previous.assignments, self._assign(vectors[known:], centroids)])
+            else:
+                centroids = self._train(vectors[alive])
+                assignments = self._assign(vectors, centroids)
+                self._trained_rows = alive_count
+        return _Gallery(tuple(ids), vectors, alive, centroids, assignments)
+
+    def _train(self, vectors: np.ndarray, iterations: int = 10) -> np.ndarray:
+        """Spherical k-means on a sample of the gallery."""
+        rng = np.random.default_rng(0)
+        sample_size = min(len(vectors), self.ivf_lists * 256)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, self.ivf_lists, replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(self.ivf_lists):
+                members = sample[nearest == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+        return centroids
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), self.batch_rows):
+            chunk = np.asarray(vectors[start:start + self.batch_rows])
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+    # ==================== Search ====================
+
+    def search(self, embedding, k: int = 1) -> List[Tuple[str, float]]:
+        """The k most similar users as (user_id, cosine similarity), best first."""
+        query = self.normalize(embedding)
+        gallery = self._gallery
+        if gallery.centroids is not None:
+            probes = np.argsort(gallery.centroids @ query)[-self.ivf_probes:]
+            candidates = np.flatnonzero(np.isin(gallery.assignments, probes) & gallery.alive)
+        else:
+            candidates = None
+
+        best_rows: List[np.ndarray] = []
+        best_scores: List[np.ndarray] = []
+        total = len(gallery.ids) if candidates is None else len(candidates)
+        for start in range(0, total, self.batch_rows):
+            if candidates is None:
+                rows = np.arange(start, min(start + self.batch_rows, total))
+                scores = np.asarray(gallery.vectors[start:start + self.batch_rows]) @ query
+                scores[~gallery.alive[start:start + self.batch_rows]] = -np.inf
+            else:
+                rows = candidates[start:start + self.batch_rows]
+                scores = np.asarray(gallery.vectors[rows]) @ query
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+                rows, scores = rows[top], scores[top]
+            best_rows.append(rows)
+            best_scores.append(scores)
+
+        if not best_rows:
+            return []
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(scores)[::-1][:k]
+        return [(gallery.ids[rows[i]], float(scores[i])) for i in order if np.isfinite(scores[i])]
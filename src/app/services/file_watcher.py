@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Data File Watcher
+Notices data files edited or replaced while the service runs, so only the
+files that actually changed are re-read.
+"""
+import hashlib
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (mtime_ns, size); None when the file doesn't exist
+Fingerprint = Optional[Tuple[int, int]]
+
+
+def fingerprint(path: str) -> Fingerprint:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DataFileWatcher:
+    """
+    Tracks the (mtime, size) of a set of files as last seen, so changed()
+    costs one stat call per file. A file whose fingerprint moved is then
+    hashed by read(); if its content is the same as the last content read
+    (the file was only touched, or rewritten unchanged) it is not parsed
+    again.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        self.paths = list(paths)
+        self._seen: Dict[str, Fingerprint] = {path: fingerprint(path) for path in self.paths}
+        self._digests: Dict[str, bytes] = {}
+        # Fingerprint and hash of content read but not yet accepted
+        self._pending: Dict[str, Tuple[Fingerprint, bytes]] = {}
+
+    def changed(self) -> List[str]:
+        """The files whose fingerprint differs from the one last seen."""
+        return [path for path in self.paths if fingerprint(path) != self._seen.get(path)]
+
+    def mark_seen(self, paths: Iterable[str]):
+        """Record the files' current fingerprints, e.g. after this process wrote them."""
+        for path in paths:
+            self._seen[path] = fingerprint(path)
+            self._digests.pop(path, None)
+
+    def read(self, path: str) -> Optional[bytes]:
+        """
+        Read a changed file, or return None if its content is the same as
+        the last content accepted (the file is then marked seen). The
+        fingerprint is taken before reading, so an edit racing with the
+        read is noticed again.
+        """
+        seen = fingerprint(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        if self._digests.get(path) == digest:
+            self._seen[path] = seen
+            return None
+        self._pending[path] = (seen, digest)
+        return content
+
+    def accept(self, path: str):
+        """Mark the content last returned by read() as seen, whether it was applied or rejected."""
+        pending = self._pending.pop(path, None)
+        if pending is not None:
+            self._seen[path], self._digests[path] = pending
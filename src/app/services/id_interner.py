@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ID Interning
+Maps string identifiers (user, door and building IDs) to dense integer handles.
+"""
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class IdInterner:
+    """
+    Bidirectional mapping between string IDs and dense integer handles.
+
+    Handles are assigned sequentially starting at 0 and are never reused, so
+    a handle stored in an index or log column stays valid even after the
+    entity it refers to has been deleted.
+
+    Assigning a handle is locked, since access log appends intern IDs
+    without holding the writers' lock; lookups are not.
+    """
+
+    __slots__ = ("_handles", "_keys", "_lock", "get")
+
+    def __init__(self):
+        self._handles: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+        # get(key) -> Optional[int]: return the handle for a key without
+        # assigning one. Bound directly to dict.get to keep lookups on the
+        # decision path free of Python-level call overhead.
+        self.get: Callable[[Optional[str]], Optional[int]] = self._handles.get
+
+    def intern(self, key: str) -> int:
+        """Return the handle for a key, assigning a new one if needed."""
+        handle = self._handles.get(key)
+        if handle is None:
+            with self._lock:
+                handle = self._handles.get(key)
+                if handle is None:
+                    handle = len(self._keys)
+                    self._keys.append(key)
+                    self._handles[key] = handle
+        return handle
+
+    def key(self, handle: int) -> str:
+        """Return the string ID for a handle."""
+        return self._keys[handle]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._handles
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
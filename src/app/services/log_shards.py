@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Access Log Shards
+Access log storage partitioned by building: one file and one lock per
+building, so saving one building's events never waits on another's.
+"""
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+from src.utils.file_lock import InterProcessLock
+
+try:
+    import orjson
+except ImportError:  # Optional: faster decoding of the shard files at start-up
+    orjson = None
+
+# Shard of log entries without a building (e.g. events for unknown doors)
+UNASSIGNED = "_unassigned"
+
+# Compact output lets json use its C encoder; logs are rewritten on every event
+_COMPACT = (",", ":")
+
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class AccessLogShards:
+    """
+    The most recent `retain` log entries of each building, kept in memory
+    and saved to <directory>/<building_id>.json under that building's own
+    <building_id>.lock, so workers recording events in different
+    buildings save in parallel.
+
+    Files are replaced atomically, which also updates the directory's
+    mtime; changed() therefore detects another worker's save with a single
+    stat, and changed_shards() then finds which buildings it touched.
+    """
+
+    def __init__(self, directory: str, retain: int = 1000):
+        self.directory = directory
+        self.retain = retain
+        self._recent: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._dirty: Set[str] = set()
+        self._locks: Dict[str, InterProcessLock] = {}
+        self._seen: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._directory_seen: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shard(building_id: Optional[str]) -> str:
+        return quote(building_id, safe="") if building_id else UNASSIGNED
+
+    def _path(self, shard: str) -> str:
+        return os.path.join(self.directory, f"{shard}.json")
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.directory)
+
+    def lock(self, shard: str) -> InterProcessLock:
+        """The inter-process lock serializing saves of one building's log."""
+        with self._lock:
+            lock = self._locks.get(shard)
+            if lock is None:
+                os.makedirs(self.directory, exist_ok=True)
+                lock = self._locks[shard] = InterProcessLock(os.path.join(self.directory, f"{shard}.lock"))
+            return lock
+
+    # ==================== In-Memory Retention ====================
+
+    def add(self, shard: str, row: Dict[str, Any], dirty: bool = True):
+        """Retain a log entry (as its JSON row) and, if dirty, schedule its shard for saving."""
+        with self._lock:
+            recent = self._recent.get(shard)
+            if recent is None:
+                recent = self._recent[shard] = deque(maxlen=self.retain)
+            recent.append(row)
+            if dirty:
+                self._dirty.add(shard)
+
+    def mark_dirty(self, shard: str):
+        with self._lock:
+            self._dirty.add(shard)
+
+    def take_dirty(self) -> Set[str]:
+        """The shards with unsaved entries, which are now considered saved by the caller."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    def retained(self) -> int:
+        return sum(len(recent) for recent in self._recent.values())
+
+    # ==================== Files ====================
+
+    def shards_on_disk(self) -> List[str]:
+        if not self.exists():
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def read(self, shard: str) -> List[Dict[str, Any]]:
+        """Read a shard file and remember its version (not the retained entries)."""
+        path = self._path(shard)
+        stat = _stat(path)
+        if stat is None:
+            return []
+        with open(path, 'rb') as f:
+            data = f.read()
+        rows = orjson.loads(data) if orjson is not None else json.loads(data)
+        self._seen[shard] = stat
+        return rows
+
+    def write(self, shard: str):
+        """Save a shard's retained entries. Caller holds the shard's lock."""
+        with self._lock:
+            rows = list(self._recent.get(shard, ()))
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(shard)
+        tmp_path = f"{path}.tmp"
+        data = json.dumps(rows, separators=_COMPACT, default=str)
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._seen[shard] = _stat(path)
+
+    def changed(self) -> bool:
+        """Whether any shard file may have been saved since mark_seen() (one stat call)."""
+        return _stat(self.directory) != self._directory_seen
+
+    def mark_seen(self):
+        self._directory_seen = _stat(self.directory)
+
+    def file_changed(self, shard: str) -> bool:
+        """Whether a shard's file differs from the version this process last read or wrote."""
+        return _stat(self._path(shard)) != self._seen.get(shard)
+
+    def changed_shards(self) -> List[str]:
+        return [shard for shard in self.shards_on_disk() if self.file_changed(shard)]
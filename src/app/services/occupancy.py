@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Building Occupancy
+Who is inside each building, kept current from the granted passages at
+entry and exit doors, for live headcounts and anti-passback checks.
+"""
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from src.app.models.door_access import DoorDirection
+
+
+class Presence(NamedTuple):
+    """A user's last granted passage and whether it left them inside the building."""
+    building_id: str
+    door_id: str
+    direction: DoorDirection
+    timestamp: datetime
+    inside: bool
+
+
+class OccupancyTracker:
+    """
+    Each user's last passage, and per building the set of users inside.
+
+    A passage through an entry door puts the user inside that building
+    (and out of any other); one through an exit door puts them outside.
+    Internal doors don't move anyone. Recording is a couple of dict and
+    set operations, so a headcount is the size of a set and never needs
+    the access logs. Passages older than the user's last one are ignored,
+    which makes replaying log entries that were already recorded (at
+    start-up, or when merging another worker's logs) harmless.
+
+    Anti-passback: a user may not enter a building they are inside, nor
+    leave through an exit door when their last passage was an exit. Users
+    never seen are let through either way.
+    """
+
+    def __init__(self):
+        self._presence: Dict[str, Presence] = {}
+        self._inside: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+
+    def record(self, user_id: str, building_id: str, door_id: str, direction: str, timestamp: datetime):
+        """Record a granted passage through a door of building_id."""
+        direction = DoorDirection(direction)
+        if direction == DoorDirection.INTERNAL:
+            return
+        with self.lock:
+            last = self._presence.get(user_id)
+            if last is not None:
+                if timestamp < last.timestamp:
+                    return
+                if last.inside:
+                    self._leave(user_id, last.building_id)
+            inside = direction == DoorDirection.ENTRY
+            self._presence[user_id] = Presence(building_id, door_id, direction, timestamp, inside)
+            if inside:
+                users = self._inside.get(building_id)
+                if users is None:
+                    users = self._inside[building_id] = set()
+                users.add(user_id)
+
+    def _leave(self, user_id: str, building_id: str):
+        users = self._inside.get(building_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self._inside[building_id]
+
+    def violates_passback(self, user_id: str, building_id: str, direction: str) -> bool:
+        """Whether passing through a door of building_id in this direction breaks anti-passback."""
+        last = self._presence.get(user_id)
+        if last is None or direction == DoorDirection.INTERNAL:
+            return False
+        if direction == DoorDirection.ENTRY:
+            return last.inside and last.building_id == building_id
+        return last.direction == DoorDirection.EXIT
+
+    def expire(self, before: datetime) -> int:
+        """
+        Count users whose last passage is older than `before` as no longer
+        inside (they left without passing an exit door). Their last
+        location is kept. Returns the number expired.
+        """
+        expired = 0
+        with self.lock:
+            for building_id, users in list(self._inside.items()):
+                for user_id in [u for u in users if self._presence[u].timestamp < before]:
+                    self._presence[user_id] = self._presence[user_id]._replace(inside=False)
+                    self._leave(user_id, building_id)
+                    expired += 1
+        return expired
+
+    def forget(self, user_id: str) -> bool:
+        """Drop a user's presence, e.g. to let them through after an anti-passback lockout."""
+        with self.lock:
+            last = self._presence.pop(user_id, None)
+            if last is not None and last.inside:
+                self._leave(user_id, last.building_id)
+            return last is not None
+
+    # ==================== Queries ====================
+
+    def presence(self, user_id: str) -> Optional[Presence]:
+        return self._presence.get(user_id)
+
+    def headcount(self, building_id: str) -> int:
+        return len(self._inside.get(building_id, ()))
+
+    def headcounts(self) -> Dict[str, int]:
+        with self.lock:
+            return {building_id: len(users) for building_id, users in self._inside.items()}
+
+    def inside(self, building_id: str) -> List[str]:
+        with self.lock:
+            return sorted(self._inside.get(building_id, ()))
+
+    # ==================== Persistence ====================
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "presence": {
+                    user_id: [p.building_id, p.door_id, p.direction.value, p.timestamp.isoformat(), p.inside]
+                    for user_id, p in self._presence.items()
+                },
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OccupancyTracker":
+        tracker = cls()
+        for user_id, (building_id, door_id, direction, timestamp, inside) in data.get("presence", {}).items():
+            tracker._presence[user_id] = Presence(building_id, door_id, DoorDirection(direction),
+                                                  datetime.fromisoformat(timestamp), inside)
+            if inside:
+                tracker._inside.setdefault(building_id, set()).add(user_id)
+        return tracker
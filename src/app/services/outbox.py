@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Outbox
+Durable queue of outbound calls (door unlocks, central-server checks) that
+failed, retried in the background with per-destination backoff.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import aiohttp
+
+from src.utils.file_lock import InterProcessLock
+from src.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+_COMPACT = (",", ":")
+
+Handler = Callable[[aiohttp.ClientSession, Dict[str, Any]], Awaitable[None]]
+
+OUTBOX_DELIVERIES = Counter(
+    "visage_outbox_deliveries_total", "Outbox delivery attempts by message kind and outcome.",
+    ("kind", "outcome"))
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a handler when retrying cannot succeed; the message is dead-lettered at once."""
+
+
+class DeferredDelivery(Exception):
+    """
+    Raised by a handler when a message can't be delivered yet (the
+    destination is fine). Only that message waits `delay` seconds; no
+    attempt is counted and the destination doesn't back off.
+    """
+
+    def __init__(self, reason: str = "", delay: float = 10.0):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class _Backoff:
+    __slots__ = ("failures", "next_attempt")
+
+    def __init__(self):
+        self.failures = 0
+        self.next_attempt = 0.0
+
+
+class Outbox:
+    """
+    Durable outbox with background retry.
+
+    Messages {"id", "kind", "destination", "payload", "created_at",
+    "expires_at", "not_before", "attempts", "last_error"} are appended to
+    outbox.jsonl together with "done" and "dead" records, so pending work
+    survives a restart. Any worker process can enqueue; one of them
+    (whichever holds the .leader lock) follows the file and delivers.
+
+    Delivery is grouped by destination: each pass sends a destination's
+    due messages in order over one client session, and stops at the first
+    failure. The destination then backs off exponentially (with jitter), so
+    an unreachable controller is probed once per backoff period rather than
+    once per queued message, and a recovering one isn't flooded. Messages
+    that expire, run out of attempts or fail permanently are moved to
+    dead_letters.jsonl. A message whose handler defers it waits until its
+    own not_before without holding up the rest of its destination.
+    """
+
+    def __init__(self, directory: str, base_delay: float = 1.0, max_delay: float = 300.0,
+                 max_attempts: int = 10, batch_size: int = 50, poll_interval: float = 1.0):
+        self.directory = directory
+        self.outbox_file = os.path.join(directory, "outbox.jsonl")
+        self.dead_letter_file = os.path.join(directory, "dead_letters.jsonl")
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = InterProcessLock(os.path.join(directory, ".lock"))
+        self._leader = InterProcessLock(os.path.join(directory, ".leader"))
+        self._is_leader = False
+        self._handlers: Dict[str, Handler] = {}
+
+        # Leader state, rebuilt by following outbox.jsonl
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._offset = 0
+        self._inode: Optional[int] = None
+        self._records = 0
+        self._destinations: Dict[str, _Backoff] = {}
+        self._dead_count = 0
+
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def register(self, kind: str, handler: Handler):
+        """Set the coroutine that delivers messages of `kind`; it raises to report failure."""
+        self._handlers[kind] = handler
+
+    # ==================== Enqueue ====================
+
+    def enqueue(self, kind: str, destination: str, payload: Dict[str, Any],
+                ttl: Optional[float] = None, error: str = "") -> str:
+        """Queue a message for background delivery. Returns its ID."""
+        now = time.time()
+        message = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "destination": destination,
+            "payload": payload,
+            "created_at": now,
+            "expires_at": now + ttl if ttl is not None else None,
+            "not_before": None,
+            "attempts": 0,
+            "last_error": error,
+        }
+        self._append([{"op": "put", "message": message}])
+        logger.info(f"Queued {kind} for {destination} in outbox")
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return message["id"]
+
+    def _append(self, records: List[Dict[str, Any]]):
+        data = "".join(json.dumps(r, separators=_COMPACT) + "\n" for r in records)
+        with self._lock:
+            # Opened per append so writers follow the leader's compactions
+            with open(self.outbox_file, 'a') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # ==================== Background Delivery ====================
+
+    async def start(self):
+        """Start the background delivery task on the running event loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run(), name="outbox")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._is_leader:
+            self._leader.release()
+            self._is_leader = False
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._is_leader:
+                    self._is_leader = self._leader.acquire(blocking=False)
+                if self._is_leader:
+                    self._follow()
+                    await self.drain()
+                    self._maybe_compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox delivery pass failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._next_wait())
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _next_wait(self) -> float:
+        """Sleep until the earliest destination comes out of backoff (at most poll_interval)."""
+        now, wall = time.monotonic(), time.time()
+        waits = [max(self._destination(m["destination"]).next_attempt - now, (m.get("not_before") or 0) - wall)
+                 for m in self._pending.values()]
+        return max(0.01, min([self.poll_interval] + waits))
+
+    def _destination(self, destination: str) -> _Backoff:
+        backoff = self._destinations.get(destination)
+        if backoff is None:
+            backoff = self._destinations[destination] = _Backoff()
+        return backoff
+
+    def _follow(self):
+        """Apply the records appended to outbox.jsonl since the last pass."""
+        try:
+            stat = os.stat(self.outbox_file)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode:
+            self._inode, self._offset, self._records = stat.st_ino, 0, 0
+            self._pending.clear()
+        if stat.st_size <= self._offset:
+            return
+        with open(self.outbox_file, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Only whole lines; a partial one is finished by the next pass
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            self._records += 1
+            if record["op"] == "put":
+                self._pending[record["message"]["id"]] = record["message"]
+            else:
+                self._pending.pop(record["id"], None)
+
+    async def drain(self):
+        """Deliver every due message once, grouped by destination."""
+        now, wall = time.monotonic(), time.time()
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        for message in list(self._pending.values()):
+            if self._destination(message["destination"]).next_attempt > now:
+                continue
+            if (message.get("not_before") or 0) > wall:
+                continue
+            batch = batches.setdefault(message["destination"], [])
+            if len(batch) < self.batch_size:
+                batch.append(message)
+        if not batches:
+            return
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(self._deliver_batch(session, destination, batch)
+                                   for destination, batch in batches.items()))
+
+    async def _deliver_batch(self, session: aiohttp.ClientSession, destination: str,
+                             batch: List[Dict[str, Any]]):
+        backoff = self._destination(destination)
+        for message in batch:
+            expires_at = message["expires_at"]
+            if expires_at is not None and time.time() > expires_at:
+                self._dead_letter(message, "expired")
+                continue
+            handler = self._handlers.get(message["kind"])
+            if handler is None:
+                self._dead_letter(message, f"no handler for {message['kind']}")
+                continue
+            try:
+                await handler(session, message)
+            except PermanentDeliveryError as e:
+                self._dead_letter(message, str(e) or "rejected")
+                continue
+            except DeferredDelivery as e:
+                message = {**message, "not_before": time.time() + e.delay, "last_error": str(e) or "deferred"}
+                OUTBOX_DELIVERIES.inc(message["kind"], "deferred")
+                self._pending[message["id"]] = message
+                self._append([{"op": "put", "message": message}])
+                continue
+            except Exception as e:
+                message = {**message, "attempts": message["attempts"] + 1, "last_error": str(e) or type(e).__name__}
+                OUTBOX_DELIVERIES.inc(message["kind"], "retry")
+                if message["attempts"] >= self.max_attempts:
+                    self._dead_letter(message, f"gave up after {message['attempts']} attempts")
+                else:
+                    self._pending[message["id"]] = message
+                    self._append([{"op": "put", "message": message}])
+                backoff.failures += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** (backoff.failures - 1))
+                backoff.next_attempt = time.monotonic() + random.uniform(delay / 2, delay)
+                logger.warning(f"Outbox delivery to {destination} failed ({message['last_error']}); "
+                               f"backing off {delay:.1f}s")
+                return
+            OUTBOX_DELIVERIES.inc(message["kind"], "delivered")
+            self._pending.pop(message["id"], None)
+            self._append([{"op": "done", "id": message["id"]}])
+            backoff.failures = 0
+
+    def _dead_letter(self, message: Dict[str, Any], reason: str):
+        OUTBOX_DELIVERIES.inc(message["kind"], "dead_letter")
+        logger.error(f"Outbox message {message['id']} ({message['kind']} for {message['destination']}) "
+                     f"dead-lettered: {reason}")
+        self._pending.pop(message["id"], None)
+        with self._lock:
+            with open(self.dead_letter_file, 'a') as f:
+                f.write(json.dumps({**message, "reason": reason, "dead_at": time.time()}, separators=_COMPACT) + "\n")
+        self._append([{"op": "dead", "id": message["id"]}])
+        self._dead_count += 1
+
+    def _maybe_compact(self, min_records: int = 1000):
+        """Rewrite outbox.jsonl with only the pending messages once it is mostly finished records."""
+        if self._records < min_records or self._records < 4 * len(self._pending):
+            return
+        with self._lock:
+            # Pick up anything appended since this pass's follow
+            self._follow()
+            tmp_path = f"{self.outbox_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                for message in self._pending.values():
+                    f.write(json.dumps({"op": "put", "message": message}, separators=_COMPACT) + "\n")
+            os.replace(tmp_path, self.outbox_file)
+            stat = os.stat(self.outbox_file)
+            self._inode, self._offset, self._records = stat.st_ino, stat.st_size, len(self._pending)
+
+    # ==================== Inspection ====================
+
+    @property
+    def delivering(self) -> bool:
+        """Whether this process is the one delivering (and so tracking) messages."""
+        return self._is_leader
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pending messages per destination and backoff state (as seen by the delivering worker)."""
+        now = time.monotonic()
+        destinations: Dict[str, Dict[str, Any]] = {}
+        for message in list(self._pending.values()):
+            entry = destinations.setdefault(message["destination"], {"pending": 0})
+            entry["pending"] += 1
+        for destination, entry in destinations.items():
+            backoff = self._destination(destination)
+            entry["failures"] = backoff.failures
+            entry["retry_in_seconds"] = round(max(0.0, backoff.next_attempt - now), 3)
+        return {
+            "delivering": self.delivering,
+            "pending": len(self._pending),
+            "dead_lettered_since_start": self._dead_count,
+            "destinations": destinations,
+        }
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """The most recent dead-lettered messages, newest first."""
+        if not os.path.exists(self.dead_letter_file):
+            return []
+        with open(self.dead_letter_file, 'r') as f:
+            tail: Deque[str] = deque(f, maxlen=limit)
+        return [json.loads(line) for line in reversed(tail)]
+
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recently Counted Log IDs
+The IDs of the log entries a running count has already included, kept per
+building so that entries reloaded from the per-building log files at
+start-up are never counted twice.
+"""
+from collections import deque
+from typing import Deque, Dict, List, Set
+
+
+class RecentIds:
+    """
+    The last `window` counted IDs of each building (shard). Each building's
+    log file retains at most access_log_retention entries, so with the
+    window at that size every entry a restart can reload is remembered,
+    however many buildings there are.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._shards: Dict[str, Deque[str]] = {}
+        self._ids: Set[str] = set()
+
+    def __contains__(self, log_id: str) -> bool:
+        return log_id in self._ids
+
+    def add(self, shard: str, log_id: str):
+        recent = self._shards.get(shard)
+        if recent is None:
+            recent = self._shards[shard] = deque(maxlen=self.window)
+        if len(recent) == recent.maxlen:
+            self._ids.discard(recent[0])
+        recent.append(log_id)
+        self._ids.add(log_id)
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {shard: list(recent) for shard, recent in list(self._shards.items())}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[str]], window: int = 1000) -> "RecentIds":
+        recent = cls(window)
+        for shard, ids in data.items():
+            recent._shards[shard] = deque(ids, maxlen=max(window, len(ids)))
+            recent._ids.update(ids)
+        return recent
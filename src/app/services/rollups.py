@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hourly Rollups
+Access event counts per hour, door, building and event type, so long-range
+statistics cost the number of hours in the range, not the number of events.
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from src.app.services.recent_ids import RecentIds
+
+_COMPACT = (",", ":")
+_DAY_FILE = re.compile(r"(\d{4}-\d{2}-\d{2})\.json$")
+
+# (door_id, building_id, event_type) -> count, for one hour
+_HourCounts = Dict[Tuple[str, str, str], int]
+
+INTERVAL_HOURS = {"hour": 1, "day": 24, "week": 24 * 7}
+
+
+def hour_key(timestamp: datetime) -> int:
+    """Hours since 0001-01-01 of the hour containing timestamp (timezone-naive, like the logs)."""
+    return timestamp.toordinal() * 24 + timestamp.hour
+
+
+def hour_start(key: int) -> datetime:
+    day, hour = divmod(key, 24)
+    return datetime.fromordinal(day) + timedelta(hours=hour)
+
+
+class HourlyRollups:
+    """
+    Event counts bucketed by hour.
+
+    Raw log entries are folded in with add(); like the score statistics,
+    the IDs of the most recent folded entries of each building are kept so
+    entries reloaded from the access log files are not counted twice. Queries walk the hours
+    of the requested range only.
+
+    Rollups are saved as one file per day (YYYY-MM-DD.json) in a
+    directory, and a save rewrites only the days that changed since the
+    previous one, normally just today.
+    """
+
+    def __init__(self, recent_window: int = 1000):
+        self._hours: Dict[int, _HourCounts] = {}
+        self._recent = RecentIds(recent_window)
+        self._dirty_days: Set[int] = set()
+        self.lock = threading.Lock()
+
+    def add(self, log_id: str, timestamp: datetime, door_id: str, building_id: Optional[str], event_type: str):
+        """Fold one log entry. Caller holds self.lock."""
+        if log_id in self._recent:
+            return
+        hour = hour_key(timestamp)
+        counts = self._hours.get(hour)
+        if counts is None:
+            counts = self._hours[hour] = {}
+        key = (door_id, building_id or "", event_type)
+        counts[key] = counts.get(key, 0) + 1
+        self._recent.add(building_id or "", log_id)
+        self._dirty_days.add(hour // 24)
+
+    def _matching(self, start: datetime, end: datetime, door_ids: Optional[Set[str]],
+                  building_id: Optional[str]) -> Iterable[Tuple[int, str, str, str, int]]:
+        """(hour, door_id, building_id, event_type, count) for hours overlapping [start, end)."""
+        first, last = hour_key(start), hour_key(end - timedelta(microseconds=1))
+        hours = self._hours
+        # Walk the range, or the stored hours if there are fewer of them
+        if last - first < len(hours):
+            keys = range(first, last + 1)
+        else:
+            keys = sorted(k for k in list(hours) if first <= k <= last)
+        for hour in keys:
+            counts = hours.get(hour)
+            if not counts:
+                continue
+            for (door, building, event_type), count in list(counts.items()):
+                if door_ids is not None and door not in door_ids:
+                    continue
+                if building_id is not None and building != building_id:
+                    continue
+                yield hour, door, building, event_type, count
+
+    def totals(self, start: datetime, end: datetime, door_ids: Optional[Set[str]] = None,
+               building_id: Optional[str] = None) -> Dict[str, int]:
+        """Event counts per event type in [start, end), at hour granularity."""
+        result: Dict[str, int] = {}
+        for _, _, _, event_type, count in self._matching(start, end, door_ids, building_id):
+            result[event_type] = result.get(event_type, 0) + count
+        return result
+
+    def query(self, start: datetime, end: datetime, interval: str = "day", group_by: Optional[str] = None,
+              door_ids: Optional[Set[str]] = None, building_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Counts per event type in [start, end), as a series of `interval`
+        buckets (hour, day or week, aligned to start's hour) and optionally
+        broken down by "door" or "building".
+        """
+        width = INTERVAL_HOURS[interval]
+        origin = hour_key(start)
+        series: Dict[int, Dict[str, int]] = {}
+        groups: Dict[str, Dict[str, int]] = {}
+        totals: Dict[str, int] = {}
+        for hour, door, building, event_type, count in self._matching(start, end, door_ids, building_id):
+            bucket = series.setdefault((hour - origin) // width, {})
+            bucket[event_type] = bucket.get(event_type, 0) + count
+            totals[event_type] = totals.get(event_type, 0) + count
+            if group_by is not None:
+                group = groups.setdefault(door if group_by == "door" else building, {})
+                group[event_type] = group.get(event_type, 0) + count
+
+        result = {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "interval": interval,
+            "totals": _with_rates(totals),
+            "series": [
+                {"start": hour_start(origin + index * width).isoformat(), **_with_rates(counts)}
+                for index, counts in sorted(series.items())
+            ],
+        }
+        if group_by is not None:
+            result[f"by_{group_by}"] = {key: _with_rates(counts) for key, counts in sorted(groups.items())}
+        return result
+
+    # ==================== Persistence ====================
+
+    def save(self, directory: str):
+        """Write the days changed since the last save, then the folded-entry IDs."""
+        with self.lock:
+            days, self._dirty_days = self._dirty_days, set()
+            rows = {day: [[hour, door, building, event_type, count]
+                          for hour in range(day * 24, day * 24 + 24)
+                          for (door, building, event_type), count in list(self._hours.get(hour, {}).items())]
+                    for day in days}
+            recent = self._recent.to_dict()
+        os.makedirs(directory, exist_ok=True)
+        for day, day_rows in rows.items():
+            _write(os.path.join(directory, f"{datetime.fromordinal(day).date().isoformat()}.json"), day_rows)
+        # Written last, so a crash in between can count entries twice but never lose them
+        _write(os.path.join(directory, "state.json"), {"recent_log_ids": recent})
+
+    @classmethod
+    def load(cls, directory: str, recent_window: int = 1000) -> "HourlyRollups":
+        rollups = cls()
+        if not os.path.isdir(directory):
+            return rollups
+        for name in sorted(os.listdir(directory)):
+            if not _DAY_FILE.match(name):
+                continue
+            with open(os.path.join(directory, name), 'r') as f:
+                for hour, door, building, event_type, count in json.load(f):
+                    rollups._hours.setdefault(hour, {})[(door, building, event_type)] = count
+        state_file = os.path.join(directory, "state.json")
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                rollups._recent = RecentIds.from_dict(json.load(f)["recent_log_ids"], recent_window)
+        return rollups
+
+
+def _write(path: str, data: Any):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=_COMPACT)
+    os.replace(tmp_path, path)
+
+
+def _with_rates(counts: Dict[str, int]) -> Dict[str, Any]:
+    """Counts per event type plus the total and the denial rate among granted/denied decisions."""
+    granted, denied = counts.get("granted", 0), counts.get("denied", 0)
+    return {
+        "total": sum(counts.values()),
+        "counts": dict(sorted(counts.items())),
+        "denial_rate": round(denied / (granted + denied), 4) if granted + denied else None,
+    }
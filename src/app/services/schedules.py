@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Access Schedules
+Weekly time windows and holiday closures compiled into minute-of-week
+bitmaps, so checking whether a schedule is open costs one bit test.
+"""
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from src.app.models.door_access import AccessSchedule
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def parse_time(value: str) -> int:
+    """Minutes since midnight of an "HH:MM" time ("24:00" is the end of the day)."""
+    hours, _, minutes = value.partition(":")
+    minute = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= minute <= MINUTES_PER_DAY or not 0 <= int(minutes or 0) < 60:
+        raise ValueError(f"Invalid time of day: {value}")
+    return minute
+
+
+def _set_range(bits: bytearray, start: int, end: int):
+    for minute in range(start, end):
+        bits[minute >> 3] |= 1 << (minute & 7)
+
+
+class CompiledSchedule:
+    """
+    A schedule (or the union of several) as a bitmap over the minutes of
+    the week, Monday 00:00 first, plus replacement bitmaps for the dates
+    that differ from the weekly pattern (holidays).
+    """
+
+    __slots__ = ("week", "dates")
+
+    def __init__(self, week: bytearray, dates: Dict[date, bytearray]):
+        self.week = week
+        # Date -> bitmap over that day's minutes, used instead of the week
+        self.dates = dates
+
+    def is_open(self, when: datetime) -> bool:
+        minute = when.hour * 60 + when.minute
+        day = self.dates.get(when.date()) if self.dates else None
+        if day is None:
+            minute += when.weekday() * MINUTES_PER_DAY
+            return bool(self.week[minute >> 3] & (1 << (minute & 7)))
+        return bool(day[minute >> 3] & (1 << (minute & 7)))
+
+    def day_bits(self, weekday: int) -> bytearray:
+        """The weekly bitmap of one weekday, as a day bitmap."""
+        day = bytearray(MINUTES_PER_DAY // 8)
+        offset = weekday * MINUTES_PER_DAY
+        for minute in range(MINUTES_PER_DAY):
+            week_minute = offset + minute
+            if self.week[week_minute >> 3] & (1 << (week_minute & 7)):
+                day[minute >> 3] |= 1 << (minute & 7)
+        return day
+
+
+def compile_schedule(schedule: AccessSchedule) -> CompiledSchedule:
+    """
+    Compile a schedule's windows and holidays. A window whose end is not
+    after its start runs past midnight into the next day. Raises
+    ValueError for a time or weekday out of range.
+    """
+    week = bytearray(MINUTES_PER_WEEK // 8)
+    for window in schedule.windows:
+        start, end = parse_time(window.start), parse_time(window.end)
+        for weekday in set(window.days):
+            if not 0 <= weekday <= 6:
+                raise ValueError(f"Invalid weekday: {weekday}")
+            offset = weekday * MINUTES_PER_DAY
+            if end > start:
+                _set_range(week, offset + start, offset + end)
+            else:
+                # Overnight: to midnight, then on from the next day's start (wrapping Sunday -> Monday)
+                _set_range(week, offset + start, offset + MINUTES_PER_DAY)
+                next_day = (weekday + 1) % 7 * MINUTES_PER_DAY
+                _set_range(week, next_day, next_day + end)
+    # Closed all day on holidays
+    dates = {holiday: bytearray(MINUTES_PER_DAY // 8) for holiday in schedule.holidays}
+    return CompiledSchedule(week, dates)
+
+
+def union(schedules: Iterable[Optional[CompiledSchedule]]) -> CompiledSchedule:
+    """A schedule open whenever any of the given ones is (None entries are never open)."""
+    compiled: List[CompiledSchedule] = [s for s in schedules if s is not None]
+    if len(compiled) == 1:
+        return compiled[0]
+    week = bytearray(MINUTES_PER_WEEK // 8)
+    for schedule in compiled:
+        week = bytearray(a | b for a, b in zip(week, schedule.week))
+    dates: Dict[date, bytearray] = {}
+    for holiday in {d for schedule in compiled for d in schedule.dates}:
+        day = bytearray(MINUTES_PER_DAY // 8)
+        for schedule in compiled:
+            bits = schedule.dates.get(holiday) or schedule.day_bits(holiday.weekday())
+            day = bytearray(a | b for a, b in zip(day, bits))
+        dates[holiday] = day
+    return CompiledSchedule(week, dates)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Similarity Score Statistics
+Streaming per-door, per-event-type distributions of face match scores,
+for tuning recognition thresholds without rescanning access logs.
+"""
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.app.services.recent_ids import RecentIds
+
+# Scores are in [0, 1]; 400 bins resolve quantiles to within 0.0025
+BINS = 400
+
+DEFAULT_QUANTILES: Tuple[float, ...] = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+class ScoreSketch:
+    """
+    Fixed-resolution histogram of scores over [0, 1].
+
+    Adding a score is one bin increment, and sketches merge by adding
+    bins, so any set of doors or event types can be summarized on demand.
+    Quantiles interpolate within a bin and are exact to the bin width;
+    count, sum, min and max are exact. Scores outside [0, 1] are counted
+    in the edge bins.
+    """
+
+    __slots__ = ("bins", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.bins = array('I', bytes(4 * BINS))
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def add(self, score: float):
+        index = int(score * BINS)
+        self.bins[0 if index < 0 else BINS - 1 if index >= BINS else index] += 1
+        self.count += 1
+        self.total += score
+        if score < self.min:
+            self.min = score
+        if score > self.max:
+            self.max = score
+
+    def merge(self, other: "ScoreSketch"):
+        bins = self.bins
+        for i, n in enumerate(other.bins):
+            if n:
+                bins[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantiles(self, qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        """Estimated score at each quantile, keyed like "p50"."""
+        # Count from the bins, which a concurrent add() may have run ahead of
+        count = sum(self.bins)
+        result = {}
+        if not count:
+            return result
+        for q in qs:
+            rank = q * count
+            cumulative = 0
+            for i, n in enumerate(self.bins):
+                if n and cumulative + n >= rank:
+                    estimate = (i + (rank - cumulative) / n) / BINS
+                    break
+                cumulative += n
+            else:
+                estimate = self.max
+            result[f"p{q * 100:g}"] = round(min(max(estimate, self.min), self.max), 4)
+        return result
+
+    def histogram(self, buckets: int = 20) -> List[Dict[str, Any]]:
+        """Counts over `buckets` equal-width score ranges (BINS must divide evenly)."""
+        width = BINS // buckets
+        return [
+            {"lower": round(b * width / BINS, 4), "upper": round((b + 1) * width / BINS, 4),
+             "count": sum(self.bins[b * width:(b + 1) * width])}
+            for b in range(buckets)
+        ]
+
+    def summary(self, buckets: int = 20) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 4),
+            "min": self.min,
+            "max": self.max,
+            "quantiles": self.quantiles(),
+            "histogram": self.histogram(buckets),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Sparse serializable form: only non-empty bins are stored."""
+        return {
+            "bins": {str(i): n for i, n in enumerate(self.bins) if n},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ScoreSketch":
+        sketch = cls()
+        for i, n in data["bins"].items():
+            sketch.bins[int(i)] = n
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        return sketch
+
+
+class ScoreStats:
+    """
+    Score sketches keyed by (door_id, event_type), maintained as log
+    entries are appended.
+
+    The IDs of the most recent counted entries of each building are kept
+    (and persisted), so entries reloaded from the access log files at
+    startup are not counted twice.
+    """
+
+    def __init__(self, recent_window: int = 1000):
+        self._sketches: Dict[Tuple[str, str], ScoreSketch] = {}
+        self._recent = RecentIds(recent_window)
+
+    def add(self, log_id: str, building_id: Optional[str], door_id: str, event_type: str,
+            score: Optional[float]):
+        """Count one log entry's score (entries without a score, or already counted, are ignored)."""
+        if score is None or log_id in self._recent:
+            return
+        key = (door_id, event_type)
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = ScoreSketch()
+        sketch.add(score)
+        self._recent.add(building_id or "", log_id)
+
+    def summarize(self, door_ids: Optional[Set[str]] = None, event_type: Optional[str] = None,
+                  buckets: int = 20) -> Dict[str, Any]:
+        """Merged distribution over the matching doors, overall and per event type."""
+        overall = ScoreSketch()
+        by_event_type: Dict[str, ScoreSketch] = {}
+        # list() copies atomically, so appenders can keep adding keys meanwhile
+        for (door_id, kind), sketch in list(self._sketches.items()):
+            if door_ids is not None and door_id not in door_ids:
+                continue
+            if event_type is not None and kind != event_type:
+                continue
+            overall.merge(sketch)
+            by_event_type.setdefault(kind, ScoreSketch()).merge(sketch)
+        result = overall.summary(buckets)
+        result["by_event_type"] = {kind: s.summary(buckets) for kind, s in sorted(by_event_type.items())}
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sketches": [
+                {"door_id": door_id, "event_type": kind, **sketch.to_dict()}
+                for (door_id, kind), sketch in list(self._sketches.items())
+            ],
+            "recent_log_ids": self._recent.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], recent_window: int = 1000) -> "ScoreStats":
+        stats = cls()
+        for row in data.get("sketches", []):
+            stats._sketches[(row["door_id"], row["event_type"])] = ScoreSketch.from_dict(row)
+        stats._recent = RecentIds.from_dict(data.get("recent_log_ids", {}), recent_window)
+        return stats
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User Search
+Sorted word index over users' ID, name, email and department, so the
+employee picker can search 100k users without scanning them.
+"""
+import heapq
+import re
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_WORD = re.compile(r"[^\W_]+")
+# Sorts after every word starting with a given prefix
+_MAX_CHAR = "\U0010ffff"
+
+# A user's distinct words (sorted) and, per word, the rank of the best field it occurs in
+_UserWords = Tuple[Tuple[str, ...], bytes]
+
+# ID, name, email, department
+FIELD_COUNT = 4
+# Score of a missing term, higher than any real one
+_NO_MATCH = 1 << 30
+
+
+def words(text: str) -> List[str]:
+    """Lowercased words of a text: runs of letters and digits (e.g. "EMP-007" -> ["emp", "007"])."""
+    return _WORD.findall(text.lower())
+
+
+def _user_words(fields: Iterable[str]) -> _UserWords:
+    """A user's distinct words, ranked by the first field (ID, name, email, department) they occur in."""
+    ranked: Dict[str, int] = {}
+    for rank, text in enumerate(fields):
+        for word in words(text):
+            ranked.setdefault(word, rank)
+    # Interned, so words many users share (domains, departments) are stored once
+    ordered = [sys.intern(word) for word in sorted(ranked)]
+    return tuple(ordered), bytes(ranked[word] for word in ordered)
+
+
+class UserSearchIndex:
+    """
+    For each searched field (ID, name, email, department), the users'
+    words in one sorted list with the owning handles in a parallel list
+    (ordered by handle within a word), so the users with a word starting
+    with a prefix are a contiguous range found by two binary searches. A
+    word a user has in several fields is indexed under the first one.
+
+    A query matches the users having, for every query word, some word that
+    starts with it. Matches rank by the field each query word matched (ID
+    before name, email, department), a whole word before a prefix. For a
+    one-word query the fields' ranges are already in that order, so the
+    first `limit` distinct users are the answer and nothing else is read.
+    For longer queries the candidates come from the query word with the
+    fewest entries; they are checked against the other words and ties go
+    to the name.
+
+    The index is built on first use with load(); until then set() and
+    remove() do nothing, so a service that never searches never pays for
+    it. Updates diff the user's words, so re-indexing an unchanged user is
+    cheap. Queries and updates take the index lock.
+    """
+
+    def __init__(self):
+        self._fields: List[Tuple[List[str], List[int]]] = []
+        # handle -> its words, and (lowercased name, id) as the tie-break order
+        self._words: Dict[int, _UserWords] = {}
+        self._names: Dict[int, Tuple[str, str]] = {}
+        self.built = False
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def load(self, users: Iterable[Tuple[int, str, str, str, str]]):
+        """Build the index from (handle, id, name, email, department) entries, sorting once."""
+        entries: List[List[Tuple[str, int]]] = [[] for _ in range(FIELD_COUNT)]
+        user_words: Dict[int, _UserWords] = {}
+        names: Dict[int, Tuple[str, str]] = {}
+        for handle, user_id, name, email, department in users:
+            indexed = user_words[handle] = _user_words((user_id, name, email, department))
+            names[handle] = (name.lower(), user_id)
+            for word, rank in zip(*indexed):
+                entries[rank].append((word, handle))
+        fields = []
+        for field_entries in entries:
+            field_entries.sort()
+            fields.append(([word for word, _ in field_entries], [handle for _, handle in field_entries]))
+        with self.lock:
+            self._fields = fields
+            self._words, self._names = user_words, names
+            self.built = True
+
+    def clear(self):
+        """Drop the index; it is built again on next use."""
+        with self.lock:
+            self._fields = []
+            self._words, self._names = {}, {}
+            self.built = False
+
+    def set(self, handle: int, user_id: str, name: str, email: str, department: str):
+        """Index (or re-index) a user's searchable fields."""
+        if not self.built:
+            return
+        indexed = _user_words((user_id, name, email, department))
+        with self.lock:
+            self._names[handle] = (name.lower(), user_id)
+            old = self._words.get(handle)
+            if old == indexed:
+                return
+            self._words[handle] = indexed
+            old_ranks = dict(zip(*old)) if old else {}
+            new_ranks = dict(zip(*indexed))
+            for word, rank in old_ranks.items():
+                if new_ranks.get(word) != rank:
+                    self._delete(rank, word, handle)
+            for word, rank in new_ranks.items():
+                if old_ranks.get(word) != rank:
+                    keys, handles = self._fields[rank]
+                    at = self._position(rank, word, handle)
+                    keys.insert(at, word)
+                    handles.insert(at, handle)
+
+    def remove(self, handle: int):
+        if not self.built:
+            return
+        with self.lock:
+            old = self._words.pop(handle, None)
+            self._names.pop(handle, None)
+            for word, rank in zip(*old) if old else ():
+                self._delete(rank, word, handle)
+
+    def _position(self, rank: int, word: str, handle: int) -> int:
+        """Where (word, handle) is or belongs in a field: sorted by word, then handle."""
+        keys, handles = self._fields[rank]
+        lo, hi = bisect_left(keys, word), bisect_right(keys, word)
+        return lo + bisect_left(range(lo, hi), handle, key=handles.__getitem__)
+
+    def _delete(self, rank: int, word: str, handle: int):
+        keys, handles = self._fields[rank]
+        at = self._position(rank, word, handle)
+        if at < len(keys) and keys[at] == word and handles[at] == handle:
+            del keys[at]
+            del handles[at]
+
+    def _ranges(self, term: str) -> List[Tuple[List[int], int, int]]:
+        """Per field, the (handles, start, end) of the entries whose word starts with term."""
+        ranges = []
+        for keys, handles in self._fields:
+            ranges.append((handles, bisect_left(keys, term), bisect_right(keys, term + _MAX_CHAR)))
+        return ranges
+
+    def search(self, query: str, limit: int = 20) -> List[int]:
+        """The handles of the best `limit` users matching every word of the query, best first."""
+        terms = list(dict.fromkeys(words(query)))
+        if not terms or limit <= 0:
+            return []
+        with self.lock:
+            if len(terms) == 1:
+                # Exact words sort before longer ones, so each field's range is in score order
+                found: List[int] = []
+                seen: Set[int] = set()
+                for handles, lo, hi in self._ranges(terms[0]):
+                    for at in range(lo, hi):
+                        handle = handles[at]
+                        if handle not in seen:
+                            seen.add(handle)
+                            found.append(handle)
+                            if len(found) == limit:
+                                return found
+                return found
+
+            ranges = min((self._ranges(term) for term in terms),
+                         key=lambda field_ranges: sum(hi - lo for _, lo, hi in field_ranges))
+            candidates = {handle for handles, lo, hi in ranges for handle in handles[lo:hi]}
+            buckets: Dict[int, List[int]] = {}
+            for handle in candidates:
+                score = _score(self._words[handle], terms)
+                if score is not None:
+                    buckets.setdefault(score, []).append(handle)
+            found = []
+            for score in sorted(buckets):
+                found.extend(heapq.nsmallest(limit - len(found), buckets[score], key=self._names.__getitem__))
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def _score(user_words: _UserWords, terms: List[str]) -> Optional[int]:
+    """Sum of each term's best (2 * field rank, + 1 if only a prefix matched); None if a term is missing."""
+    user_terms, ranks = user_words
+    total = 0
+    for term in terms:
+        best = _NO_MATCH
+        # Words starting with term are contiguous in the sorted words
+        at = bisect_left(user_terms, term)
+        while at < len(user_terms) and user_terms[at].startswith(term):
+            best = min(best, 2 * ranks[at] + (user_terms[at] != term))
+            at += 1
+        if best == _NO_MATCH:
+            return None
+        total += best
+    return total
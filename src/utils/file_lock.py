@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inter-Process File Lock
+Exclusive lock shared by threads and worker processes through flock().
+"""
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, fall back to a process-local lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class InterProcessLock:
+    """
+    Re-entrant exclusive lock backed by flock() on a lock file.
+
+    The lock is taken per process with flock and per thread with an RLock,
+    so nested acquisitions from the same thread are cheap. On platforms
+    without fcntl only the in-process lock is used.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        if fcntl is None:
+            logger.warning("fcntl unavailable; state is not shared safely between worker processes")
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock. Non-blocking, returns False instead of waiting if it is held."""
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth == 0 and fcntl is not None:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._thread_lock.release()
+                return False
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -6,14 +6,18 @@ This module provides a Logger class for configuring and managing logging
 across the application. It uses the Singleton pattern to ensure a consistent
 logging configuration throughout the system.
 """
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 import threading
 import time
 from datetime import datetime, timedelta
 import json
 import re
+from typing import List, Tuple
 
 from src.app.core.config import settings
 
@@ -49,6 +53,37 @@ class ColoredFormatter(logging.Formatter):
         
         return msg
 
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as one JSON object per line, for log shippers."""
+    
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def start_queue_listener(handlers: List[logging.Handler]
+                         ) -> Tuple[logging.handlers.QueueHandler, logging.handlers.QueueListener]:
+    """
+    Put handlers behind a queue. Logging calls only format the message and
+    enqueue the record; a listener thread does the actual console and file
+    writes, so request handlers never block on I/O.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return logging.handlers.QueueHandler(log_queue), listener
+
+
 class Logger:
     """
     Class to configure and manage logging for the system.
@@ -80,15 +115,38 @@ class Logger:
         os.makedirs(log_dir_abs, exist_ok=True)
 
         self.app_log_path = os.path.join(log_dir_abs, 'application.log')
+        self.listener = None
+        
+        # Like basicConfig, leave an already configured root logger alone
+        root = logging.getLogger()
+        if root.handlers:
+            return
+        
+        formatter = JsonFormatter() if settings.log_json else logging.Formatter(settings.log_format)
+        handlers = [logging.StreamHandler(sys.stdout), self._file_handler(self.app_log_path)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
         
         # Configure logging
-        logging.basicConfig(
-            level=getattr(logging, settings.log_level.upper()),
-            format=settings.log_format,
-            handlers=[
-                logging.StreamHandler(sys.stdout),
-                logging.FileHandler(self.app_log_path, mode='a', encoding='utf-8')
-            ]
-        )
+        queue_handler, self.listener = start_queue_listener(handlers)
+        root.setLevel(getattr(logging, settings.log_level.upper()))
+        root.addHandler(queue_handler)
+        atexit.register(self.stop)
         
         logging.info("Logger initialized")
+    
+    @staticmethod
+    def _file_handler(path: str) -> logging.Handler:
+        """Rotating handler for application.log, by time if log_rotate_when is set, else by size."""
+        if settings.log_rotate_when:
+            return logging.handlers.TimedRotatingFileHandler(
+                path, when=settings.log_rotate_when, backupCount=settings.log_backup_count, encoding='utf-8')
+        return logging.handlers.RotatingFileHandler(
+            path, mode='a', maxBytes=settings.log_max_bytes, backupCount=settings.log_backup_count,
+            encoding='utf-8')
+    
+    def stop(self):
+        """Write out queued records and stop the listener thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
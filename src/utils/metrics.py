@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics Module
+Counters, histograms and callback gauges rendered in the Prometheus text
+exposition format, plus an ASGI middleware that times every request.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, from 10us (in-memory decisions) to 10s (saves, controller calls)
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """Collection of metrics rendered together by /metrics."""
+
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    """
+    Base for metrics whose values are sharded per thread.
+
+    Each thread updates only its own dict of label values, so recording a
+    value takes no lock; a scrape sums the shards of all threads. Shards of
+    finished threads are kept, so counts never go backwards.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Labels, Any]] = []
+        self._shards_lock = threading.Lock()
+        registry.register(self)
+
+    def _shard(self) -> Dict[Labels, Any]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._shards_lock:
+                self._shards.append(values)
+            return values
+
+    def _snapshot(self) -> List[List[Tuple[Labels, Any]]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict.items() copied by list() is atomic under the GIL, so the
+        # owning thread can keep writing while we read
+        return [list(shard.items()) for shard in shards]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. requests or granted decisions."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return sum(dict(shard).get(labels, 0) for shard in self._snapshot())
+
+    def samples(self) -> List[str]:
+        totals: Dict[Labels, float] = {}
+        for shard in self._snapshot():
+            for labels, value in shard:
+                totals[labels] = totals.get(labels, 0) + value
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(totals.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies in seconds) over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket counts (last slot is +Inf), then sum
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe the duration of the with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self) -> List[str]:
+        totals: Dict[Labels, List[float]] = {}
+        for shard in self._snapshot():
+            for labels, state in shard:
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(state)
+                else:
+                    for i, v in enumerate(state):
+                        total[i] += v
+
+        lines = []
+        bucket_names = self.labelnames + ("le",)
+        for labels, state in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_names, labels + (_format_value(bound),))} "
+                             f"{cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose values are computed at scrape time, e.g. collection sizes."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Labels, float]], registry: Registry = REGISTRY):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self.callback().items())]
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable:
+    """Decorator observing each call's duration in `histogram`."""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return decorator
+
+
+# ==================== HTTP Requests ====================
+
+HTTP_REQUESTS = Counter(
+    "visage_http_requests_total", "HTTP requests by method, route and status.",
+    ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = Histogram(
+    "visage_http_request_duration_seconds", "HTTP request latency by method and route.",
+    ("method", "route"))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing HTTP requests per route template
+    (e.g. /api/v1/door-access/users/{user_id:path}), so label cardinality
+    stays bounded by the number of routes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # id(route) -> full path template
+        self._templates: Dict[int, str] = {}
+
+    def _route_template(self, scope) -> str:
+        route = scope.get("route")
+        if route is None:
+            return "<unmatched>"
+        template = self._templates.get(id(route))
+        if template is None:
+            # Routes of an included router only know their path relative to
+            # the router's prefix; find where the route matched to recover it
+            path, template = scope["path"], getattr(route, "path", "") or "<unmatched>"
+            regex = getattr(route, "path_regex", None)
+            if regex is not None and not regex.match(path):
+                for i in range(1, len(path)):
+                    if path[i] == "/" and regex.match(path[i:]):
+                        template = path[:i] + template
+                        break
+            self._templates[id(route)] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self._route_template(scope)
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
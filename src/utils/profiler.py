@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sampling Profiler
+Periodically samples the stacks of all threads and aggregates them into
+the collapsed-stack format used by flame graph tools.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler running on a background thread.
+
+    Every `interval` seconds it records the current stack of every other
+    thread. Only one profiler runs at a time, since each sample briefly
+    holds the GIL and overlapping runs would skew each other.
+    """
+
+    _active = threading.Lock()
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+        self._root = os.getcwd() + os.sep
+
+    def start(self) -> bool:
+        """Start sampling. Returns False if another profile is already running."""
+        if not SamplingProfiler._active.acquire(blocking=False):
+            return False
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            SamplingProfiler._active.release()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            if filename.startswith(self._root):
+                filename = filename[len(self._root):]
+            label = self._labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+        return label
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stack.reverse()
+                self.samples[";".join(stack)] += 1
+            self.sample_count += 1
+
+    def collapsed(self) -> str:
+        """Samples as "root;caller;callee count" lines (input for flamegraph.pl, speedscope, etc.)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Request Phase Timing
+Per-request breakdown of where time goes (handler, service, persistence,
+outbound HTTP), reported to clients in a Server-Timing header.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterator, Optional
+
+from fastapi.routing import APIRoute
+
+
+class RequestTiming:
+    """
+    Exclusive time spent per phase during one request.
+
+    Time is charged to whichever phase is current; entering a nested phase
+    pauses the outer one, so the phases add up to the total. Time outside
+    any explicit phase (routing, validation, serialization) is "handler".
+    """
+
+    __slots__ = ("phases", "current", "mark", "start")
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.current = "handler"
+        self.start = self.mark = time.perf_counter()
+
+    def switch(self, name: str) -> str:
+        """Charge the time so far to the current phase and make `name` current. Returns the previous phase."""
+        now = time.perf_counter()
+        self.phases[self.current] = self.phases.get(self.current, 0.0) + now - self.mark
+        previous, self.current, self.mark = self.current, name, now
+        return previous
+
+    def header(self) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        self.switch(self.current)
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={(self.mark - self.start) * 1000:.3f}")
+        return ", ".join(entries)
+
+
+# Timing of the request being handled in this context (None outside requests)
+request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Charge the time spent in the with-block to `name` (no-op outside a request)."""
+    timing = request_timing.get()
+    if timing is None:
+        yield
+        return
+    previous = timing.switch(name)
+    try:
+        yield
+    finally:
+        timing.switch(previous)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that charges the endpoint function's own execution to the "service" phase."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    # functools.wraps keeps __wrapped__, so FastAPI still sees the original signature
+    if asyncio.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            with phase("service"):
+                return await endpoint(*args, **kwargs)
+    else:
+        @wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            with phase("service"):
+                return endpoint(*args, **kwargs)
+    return wrapper
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that times each HTTP request and adds a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.header().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timing.reset(token)
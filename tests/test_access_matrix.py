@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compiled Authorization Matrix
+Decisions, and the isolation of snapshots from later writes.
+"""
+import unittest
+from datetime import datetime
+
+from src.app.models.door_access import AccessReason, AccessSchedule
+from src.app.services.access_matrix import AccessMatrix
+from src.app.services.schedules import compile_schedule
+
+ADA, GRACE, ALAN = 0, 1, 9
+LOBBY, LAB = 0, 1
+
+# A Monday
+MONDAY_NOON = datetime(2026, 10, 19, 12, 0)
+MONDAY_NIGHT = datetime(2026, 10, 19, 22, 0)
+
+
+def office_hours() -> AccessSchedule:
+    return AccessSchedule(id="sch_office", name="Office",
+                          windows=[{"days": [0, 1, 2, 3, 4], "start": "08:00", "end": "18:00"}])
+
+
+class AccessMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = AccessMatrix()
+        self.matrix.add_door(LOBBY)
+        self.matrix.add_door(LAB)
+        self.matrix.set_user(ADA, True, True, [LOBBY])
+        self.matrix.set_user(GRACE, False, True, [LOBBY])
+        self.matrix.set_user(ALAN, True, False, [LOBBY])
+
+    def test_decisions(self):
+        decide = self.matrix.decide
+        self.assertEqual(decide(ADA, LOBBY), AccessReason.GRANTED)
+        self.assertEqual(decide(ADA, LAB), AccessReason.NOT_AUTHORIZED)
+        self.assertEqual(decide(GRACE, LOBBY), AccessReason.USER_INACTIVE)
+        self.assertEqual(decide(ALAN, LOBBY), AccessReason.FACE_NOT_REGISTERED)
+        self.assertEqual(decide(5, LOBBY), AccessReason.USER_NOT_FOUND)
+        self.assertEqual(decide(None, LOBBY), AccessReason.USER_NOT_FOUND)
+        self.assertEqual(decide(ADA, 7), AccessReason.DOOR_NOT_FOUND)
+        self.assertEqual(list(self.matrix.allowed_users(LOBBY)), [ADA])
+
+    def test_door_added_later_lights_granted_users(self):
+        self.matrix.add_door(2, [ADA, GRACE])
+        self.assertEqual(list(self.matrix.allowed_users(2)), [ADA])
+
+    def test_snapshot_does_not_see_later_writes(self):
+        snapshot = self.matrix.snapshot()
+        self.assertIs(self.matrix.snapshot(), snapshot)
+
+        self.matrix.set_user(ADA, True, True, [LAB])
+        self.matrix.set_user(GRACE, True, True, [LOBBY])
+        self.matrix.remove_user(ALAN)
+        self.matrix.remove_door(LAB)
+
+        self.assertEqual(snapshot.decide(ADA, LOBBY), AccessReason.GRANTED)
+        self.assertEqual(snapshot.decide(ADA, LAB), AccessReason.NOT_AUTHORIZED)
+        self.assertEqual(snapshot.decide(GRACE, LOBBY), AccessReason.USER_INACTIVE)
+        self.assertEqual(snapshot.decide(ALAN, LOBBY), AccessReason.FACE_NOT_REGISTERED)
+
+        current = self.matrix.snapshot()
+        self.assertIsNot(current, snapshot)
+        self.assertEqual(current.decide(ADA, LOBBY), AccessReason.NOT_AUTHORIZED)
+        self.assertEqual(current.decide(ADA, LAB), AccessReason.DOOR_NOT_FOUND)
+        self.assertEqual(current.decide(GRACE, LOBBY), AccessReason.GRANTED)
+        self.assertEqual(current.decide(ALAN, LOBBY), AccessReason.USER_NOT_FOUND)
+
+    def test_snapshot_does_not_see_later_schedules(self):
+        snapshot = self.matrix.snapshot()
+        self.matrix.set_schedule("sch_office", compile_schedule(office_hours()))
+        self.matrix.set_door_schedule(LOBBY, "sch_office")
+
+        self.assertEqual(snapshot.decide(ADA, LOBBY, MONDAY_NIGHT), AccessReason.GRANTED)
+        current = self.matrix.snapshot()
+        self.assertEqual(current.decide(ADA, LOBBY, MONDAY_NOON), AccessReason.GRANTED)
+        self.assertEqual(current.decide(ADA, LOBBY, MONDAY_NIGHT), AccessReason.OUTSIDE_SCHEDULE)
+
+    def test_scheduled_grant(self):
+        self.matrix.set_schedule("sch_office", compile_schedule(office_hours()))
+        self.matrix.set_user(ADA, True, True, [LOBBY, LAB], windows={LAB: frozenset({"sch_office"})})
+        self.assertEqual(self.matrix.decide(ADA, LAB, MONDAY_NOON), AccessReason.GRANTED)
+        self.assertEqual(self.matrix.decide(ADA, LAB, MONDAY_NIGHT), AccessReason.OUTSIDE_SCHEDULE)
+        self.assertEqual(self.matrix.decide(ADA, LOBBY, MONDAY_NIGHT), AccessReason.GRANTED)
+
+        # Editing the schedule recompiles the unions that use it
+        night = AccessSchedule(id="sch_office", name="Night",
+                               windows=[{"days": [0], "start": "20:00", "end": "23:00"}])
+        self.matrix.set_schedule("sch_office", compile_schedule(night))
+        self.assertEqual(self.matrix.decide(ADA, LAB, MONDAY_NIGHT), AccessReason.GRANTED)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Admission Control
+Face recognition events are limited per door and per camera.
+"""
+import unittest
+
+from src.app.services.admission import AdmissionController, AdmissionRejected
+
+
+def admit(controller: AdmissionController, door_key, source: str):
+    with controller.admit(door_key, source):
+        pass
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        # Rates low enough that no tokens refill during a test
+        self.controller = AdmissionController(door_rate=0.001, door_burst=5, source_rate=0.001,
+                                              source_burst=10, max_in_flight=0)
+
+    def test_door_bucket_is_shared_by_sources(self):
+        for i in range(5):
+            admit(self.controller, "door-1", f"camera-{i}")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            admit(self.controller, "door-1", "camera-9")
+        self.assertEqual(rejected.exception.scope, "door")
+
+    def test_doorless_events_are_limited_by_source_only(self):
+        for _ in range(10):
+            admit(self.controller, None, "busy-camera")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            admit(self.controller, None, "busy-camera")
+        self.assertEqual(rejected.exception.scope, "source")
+        # Another camera without a door is unaffected
+        admit(self.controller, None, "quiet-camera")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Units of Work
+Batches commit whole or roll back whole, and only valid entities commit.
+"""
+import tempfile
+import unittest
+
+from benchmarks.common import load_service
+from src.app.core.config import settings
+from src.app.services.door_access_service import BatchError
+
+
+class BatchValidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = settings.data_dir
+        self._tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self._tmp.name
+        self.service = load_service(self.data_dir)
+        self.service.create_user("E1", "Ada")
+
+    def tearDown(self):
+        settings.data_dir = self._saved
+        self._tmp.cleanup()
+
+    def test_invalid_update_is_rolled_back_and_not_journaled(self):
+        version = self.service._journal.version
+        with self.assertRaises(BatchError):
+            self.service.update_user("E1", is_active="garbage")
+        self.assertIs(self.service.get_user("E1").is_active, True)
+        self.assertEqual(self.service._journal.version, version)
+        self.assertIs(load_service(self.data_dir).users["E1"].is_active, True)
+
+    def test_invalid_batch_operation_rolls_back_the_batch(self):
+        with self.assertRaises(BatchError):
+            self.service.apply_batch([
+                {"op": "create_building", "args": {"name": "HQ"}},
+                {"op": "update_user", "args": {"user_id": "E1", "is_active": "garbage"}},
+            ])
+        self.assertEqual(self.service.get_all_buildings(), [])
+
+    def test_coerced_update_stores_typed_values(self):
+        user = self.service.update_user("E1", is_active="false")
+        self.assertIs(user.is_active, False)
+        self.assertIs(self.service.get_user("E1").is_active, False)
+
+
+class BatchRollbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = settings.data_dir
+        self._tmp = tempfile.TemporaryDirectory()
+        self.service = load_service(self._tmp.name)
+
+    def tearDown(self):
+        settings.data_dir = self._saved
+        self._tmp.cleanup()
+
+    def test_rolled_back_delete_keeps_occupancy(self):
+        service = self.service
+        building = service.create_building("HQ")
+        door = service.create_door("Lobby", building.id, direction="entry")
+        service.create_user("E1", "Ada")
+        service.authorize_user_for_doors("E1", [door.id])
+        self.assertTrue(service.process_face_recognition_access("E1", 0.9, door_id=door.id)["success"])
+
+        with self.assertRaises(RuntimeError):
+            with service.batch():
+                service.delete_user("E1")
+                raise RuntimeError("abort")
+        self.assertIsNotNone(service.get_user("E1"))
+        self.assertTrue(service.get_user_location("E1")["inside"])
+
+        service.delete_user("E1")
+        self.assertIsNone(service.get_user_location("E1"))
+
+    def test_failed_batch_restores_entities_and_writes_nothing(self):
+        service = self.service
+        building = service.create_building("HQ")
+        version = service._journal.version
+        with self.assertRaises(RuntimeError):
+            with service.batch():
+                service.update_building(building.id, name="Renamed")
+                service.create_door("Lobby", building.id)
+                service.delete_building(building.id)
+                raise RuntimeError("abort")
+        self.assertEqual(service.get_building(building.id).name, "HQ")
+        self.assertEqual(service.get_all_doors(), [])
+        self.assertEqual(service._journal.version, version)
+
+        reloaded = load_service(self._tmp.name)
+        self.assertEqual(reloaded.get_building(building.id).name, "HQ")
+        self.assertEqual(reloaded.get_all_doors(), [])
+
+    def test_nested_batches_commit_with_the_outer_one(self):
+        service = self.service
+        with self.assertRaises(RuntimeError):
+            with service.batch():
+                building = service.create_building("HQ")  # its own batch joins this one
+                self.assertIsNotNone(service.buildings.get(building.id))
+                raise RuntimeError("abort")
+        self.assertIsNone(service.get_building(building.id))
+
+    def test_rolled_back_grant_restores_access_decisions(self):
+        service = self.service
+        building = service.create_building("HQ")
+        door = service.create_door("Lobby", building.id)
+        service.create_user("E1", "Ada")
+        service.authorize_user_for_doors("E1", [door.id])
+        with self.assertRaises(RuntimeError):
+            with service.batch():
+                service.authorize_user_for_doors("E1", [])
+                raise RuntimeError("abort")
+        self.assertTrue(service.check_user_access("E1", door.id)["authorized"])
+
+
+class ApplyBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = settings.data_dir
+        self._tmp = tempfile.TemporaryDirectory()
+        self.service = load_service(self._tmp.name)
+
+    def tearDown(self):
+        settings.data_dir = self._saved
+        self._tmp.cleanup()
+
+    def test_references_resolve_to_earlier_results(self):
+        results = self.service.apply_batch([
+            {"op": "create_building", "args": {"name": "HQ"}},
+            {"op": "create_door", "args": {"name": "Lobby", "building_id": "$0"}},
+            {"op": "create_user", "args": {"user_id": "E1", "name": "Ada"}},
+            {"op": "authorize_user_for_doors", "args": {"user_id": "$2", "door_ids": ["$1"]}},
+        ])
+        building_id, door_id = results[0]["id"], results[1]["id"]
+        self.assertEqual(self.service.get_door(door_id).building_id, building_id)
+        self.assertEqual(results[3], {"op": "authorize_user_for_doors", "id": "E1"})
+        self.assertEqual(self.service.get_user("E1").authorized_doors, [door_id])
+
+    def test_forward_reference_is_rejected(self):
+        with self.assertRaises(BatchError) as error:
+            self.service.apply_batch([
+                {"op": "create_door", "args": {"name": "Lobby", "building_id": "$1"}},
+                {"op": "create_building", "args": {"name": "HQ"}},
+            ])
+        self.assertEqual(error.exception.index, 0)
+
+    def test_failure_rolls_back_earlier_operations(self):
+        cases = [
+            ({"op": "drop_everything", "args": {}}, "Unknown operation"),
+            ({"op": "create_door", "args": {"name": "Lobby", "building_id": "bld_missing"}}, "Invalid building ID"),
+            ({"op": "create_building", "args": {"name": "HQ", "floors": 3}}, "Invalid arguments"),
+            ({"op": "create_schedule", "args": {"name": "S", "windows": [
+                {"days": [7], "start": "08:00", "end": "17:00"}]}}, "validation error"),
+        ]
+        for operation, message in cases:
+            with self.subTest(op=operation["op"]):
+                with self.assertRaises(BatchError) as error:
+                    self.service.apply_batch([{"op": "create_building", "args": {"name": "Annex"}}, operation])
+                self.assertEqual(error.exception.index, 1)
+                self.assertIn(message, str(error.exception))
+                self.assertEqual(self.service.get_all_buildings(), [])
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Change Journal
+Restarts rebuild the entities from the snapshot and the journal tail.
+"""
+import os
+import tempfile
+import unittest
+
+from benchmarks.common import load_service
+from src.app.core.config import settings
+from src.app.services.change_journal import ChangeJournal
+
+
+def user(user_id: str):
+    return {"id": user_id, "name": user_id}
+
+
+class ChangeJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.journal = ChangeJournal(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_load_returns_the_events_after_the_snapshot(self):
+        self.journal.append([("users", "E1", user("E1")), ("users", "E2", user("E2"))])
+        self.journal.write_snapshot({"users": [user("E1"), user("E2")]})
+        self.journal.append([("users", "E1", None)])
+
+        archived = os.listdir(self.journal.archive_dir)
+        self.assertEqual(archived, ["changes-0000000001-0000000002.jsonl"])
+
+        reopened = ChangeJournal(self._tmp.name)
+        snapshot, tail = reopened.load()
+        self.assertEqual(snapshot["version"], 2)
+        self.assertEqual([(e["version"], e["op"], e["entity_id"]) for e in tail], [(3, "delete", "E1")])
+        self.assertEqual((reopened.version, reopened.snapshot_version, reopened.pending), (3, 2, 1))
+
+        # Versions continue after a restart
+        (event,) = reopened.append([("users", "E3", user("E3"))])
+        self.assertEqual(event["version"], 4)
+
+    def test_torn_final_record_is_dropped(self):
+        self.journal.append([("users", "E1", user("E1"))])
+        with open(self.journal.journal_file, 'ab') as f:
+            f.write(b'{"version": 2, "collec')
+
+        reopened = ChangeJournal(self._tmp.name)
+        _, tail = reopened.load()
+        self.assertEqual([e["version"] for e in tail], [1])
+        (event,) = reopened.append([("users", "E2", user("E2"))])
+        self.assertEqual(event["version"], 2)
+        self.assertEqual([e["version"] for e in ChangeJournal(self._tmp.name).load()[1]], [1, 2])
+
+    def test_follow_reads_across_a_rotation(self):
+        follower = ChangeJournal(self._tmp.name)
+        self.journal.append([("users", "E1", user("E1"))])
+        self.assertEqual([e["version"] for e in follower.follow()], [1])
+
+        self.journal.append([("users", "E2", user("E2"))])
+        self.journal.write_snapshot({"users": [user("E1"), user("E2")]})
+        self.journal.append([("users", "E3", user("E3"))])
+        self.assertEqual([e["version"] for e in follower.follow()], [2, 3])
+        self.assertEqual(follower.follow(), [])
+
+    def test_events_since(self):
+        journal = ChangeJournal(self._tmp.name, retain=2)
+        for user_id in ("E1", "E2", "E3"):
+            journal.append([("users", user_id, user(user_id))])
+        self.assertEqual([e["version"] for e in journal.events_since(1)], [2, 3])
+        self.assertEqual([e["version"] for e in journal.events_since(1, until=2)], [2])
+        self.assertEqual(journal.events_since(3), [])
+        # Version 1 is no longer held in memory: the caller must resync
+        self.assertIsNone(journal.events_since(0))
+
+
+class JournalReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (settings.data_dir, settings.journal_snapshot_interval)
+        self._tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self._tmp.name
+        self.service = load_service(self.data_dir)
+
+    def tearDown(self):
+        settings.data_dir, settings.journal_snapshot_interval = self._saved
+        self._tmp.cleanup()
+
+    def test_restart_replays_snapshot_and_tail(self):
+        settings.journal_snapshot_interval = 3
+        building = self.service.create_building("HQ")
+        for user_id in ("E1", "E2", "E3", "E4"):
+            self.service.create_user(user_id, user_id)
+        self.service.delete_user("E2")
+        self.service.update_building(building.id, name="Head Office")
+        journal = self.service._journal
+        self.assertGreater(journal.snapshot_version, 0)
+        self.assertTrue(os.listdir(journal.archive_dir))
+
+        service = load_service(self.data_dir)
+        self.assertEqual(sorted(service.users), ["E1", "E3", "E4"])
+        self.assertEqual(service.get_building(building.id).name, "Head Office")
+        self.assertEqual(service._journal.version, journal.version)
+
+    def test_restart_replays_a_tail_the_data_files_missed(self):
+        self.service.create_user("E1", "Ada")
+        # As if the process died after journaling but before saving users.json
+        self.service._journal.append([("users", "E2", {"id": "E2", "name": "Grace"})])
+
+        service = load_service(self.data_dir)
+        self.assertEqual(sorted(service.users), ["E1", "E2"])
+        with open(service.users_file) as f:
+            self.assertIn('"E2"', f.read())
+
+    def test_invalid_event_is_skipped_on_restart(self):
+        self.service.create_user("E1", "Ada")
+        self.service.create_user("E2", "Grace")
+        data = self.service.users["E1"].model_dump(mode='json')
+        self.service._journal.append([("users", "E1", {**data, "is_active": "garbage"})])
+
+        service = load_service(self.data_dir)
+        self.assertEqual(sorted(service.users), ["E1", "E2"])
+        self.assertTrue(service.users["E1"].is_active)
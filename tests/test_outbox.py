@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Outbox
+Queued outbound calls are retried per destination, and a deferred message
+waits on its own.
+"""
+import asyncio
+import tempfile
+import time
+import unittest
+
+from benchmarks.common import load_service
+from src.app.core.config import settings
+from src.app.services.outbox import Outbox, PermanentDeliveryError
+
+CONTROLLER = "http://door-1.invalid/open"
+OTHER = "http://door-2.invalid/open"
+
+
+class OutboxBackoffTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.outbox = Outbox(self._tmp.name, base_delay=60.0, max_delay=600.0, max_attempts=3)
+        self.delivered = []
+        self.failing = set()
+
+        async def send(session, message):
+            if message["destination"] in self.failing:
+                raise ConnectionError("unreachable")
+            self.delivered.append(message["payload"]["n"])
+        self.outbox.register("send", send)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def drain(self):
+        self.outbox._follow()
+        asyncio.run(self.outbox.drain())
+
+    def test_failure_backs_off_only_its_destination(self):
+        self.failing.add(CONTROLLER)
+        for n in (1, 2):
+            self.outbox.enqueue("send", CONTROLLER, {"n": n})
+        self.outbox.enqueue("send", OTHER, {"n": 3})
+        self.drain()
+
+        self.assertEqual(self.delivered, [3])
+        state = self.outbox.stats()["destinations"][CONTROLLER]
+        self.assertEqual((state["pending"], state["failures"]), (2, 1))
+        self.assertGreater(state["retry_in_seconds"], 0)
+        # The batch stopped at the first failure: only that message used an attempt
+        self.assertEqual(sorted(m["attempts"] for m in self.outbox._pending.values()), [0, 1])
+
+        # Still backing off: recovering doesn't help until the delay has passed
+        self.failing.clear()
+        self.drain()
+        self.assertEqual(self.delivered, [3])
+
+        self.outbox._destination(CONTROLLER).next_attempt = 0
+        self.drain()
+        self.assertEqual(self.delivered, [3, 1, 2])
+        self.assertEqual(self.outbox.pending_count(), 0)
+        self.assertEqual(self.outbox._destination(CONTROLLER).failures, 0)
+
+    def test_delay_doubles_up_to_the_maximum(self):
+        self.failing.add(CONTROLLER)
+        self.outbox.max_attempts = 10
+        self.outbox.enqueue("send", CONTROLLER, {"n": 1})
+        backoff = self.outbox._destination(CONTROLLER)
+        for failures, delay in ((1, 60), (2, 120), (3, 240), (4, 480), (5, 600)):
+            backoff.next_attempt = 0
+            self.drain()
+            self.assertEqual(backoff.failures, failures)
+            # Jittered into [delay / 2, delay]
+            wait = backoff.next_attempt - time.monotonic()
+            self.assertTrue(delay / 2 - 1 <= wait <= delay, (failures, wait))
+
+    def test_exhausted_attempts_are_dead_lettered(self):
+        self.failing.add(CONTROLLER)
+        self.outbox.enqueue("send", CONTROLLER, {"n": 1})
+        for _ in range(3):
+            self.outbox._destination(CONTROLLER).next_attempt = 0
+            self.drain()
+        self.assertEqual(self.outbox.pending_count(), 0)
+        (dead,) = self.outbox.dead_letters()
+        self.assertEqual((dead["attempts"], dead["reason"]), (3, "gave up after 3 attempts"))
+
+    def test_expired_and_rejected_messages_are_dead_lettered(self):
+        async def reject(session, message):
+            raise PermanentDeliveryError("door removed")
+        self.outbox.register("reject", reject)
+        self.outbox.enqueue("send", CONTROLLER, {"n": 1}, ttl=-1)
+        self.outbox.enqueue("reject", OTHER, {"n": 2})
+        self.drain()
+
+        self.assertEqual(self.delivered, [])
+        self.assertEqual(sorted(d["reason"] for d in self.outbox.dead_letters()), ["door removed", "expired"])
+        # A permanent failure doesn't back the destination off
+        self.assertEqual(self.outbox._destination(OTHER).failures, 0)
+
+    def test_pending_messages_survive_a_restart(self):
+        self.failing.add(CONTROLLER)
+        self.outbox.enqueue("send", CONTROLLER, {"n": 1})
+        self.outbox.enqueue("send", OTHER, {"n": 2})
+        self.drain()
+
+        restarted = Outbox(self._tmp.name)
+        restarted._follow()
+        (message,) = restarted._pending.values()
+        self.assertEqual((message["payload"], message["attempts"]), ({"n": 1}, 1))
+
+
+class DeferredVerificationTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (settings.data_dir, settings.validation_api_url)
+        settings.validation_api_url = "http://central.invalid/validate"
+        self._tmp = tempfile.TemporaryDirectory()
+        self.service = load_service(self._tmp.name)
+        self.checked = []
+
+        async def validate(user_id, session):
+            self.checked.append(user_id)
+            return 200, "Username found"
+        self.service.request_user_validation = validate
+
+    def tearDown(self):
+        settings.data_dir, settings.validation_api_url = self._saved
+        self._tmp.cleanup()
+
+    def test_other_verifications_go_out_while_one_is_deferred(self):
+        outbox = self.service.outbox
+        self.service.queue_user_verification("PENDING", "offline")
+        for user_id in ("E1", "E2"):
+            self.service.create_user(user_id, user_id)
+            self.service.queue_user_verification(user_id, "offline")
+
+        outbox._follow()
+        asyncio.run(outbox.drain())
+
+        self.assertEqual(self.checked, ["E1", "E2"])
+        (deferred,) = outbox._pending.values()
+        self.assertEqual(deferred["payload"], {"user_id": "PENDING"})
+        self.assertEqual(deferred["attempts"], 0)
+        self.assertIsNotNone(deferred["not_before"])
+        self.assertEqual(outbox.stats()["destinations"][settings.validation_api_url]["failures"], 0)
+
+        # Not due again until not_before, even though the destination is healthy
+        asyncio.run(outbox.drain())
+        self.assertEqual(self.checked, ["E1", "E2"])
+
+        self.service.create_user("PENDING", "Late")
+        deferred["not_before"] = 0
+        asyncio.run(outbox.drain())
+        self.assertEqual(self.checked, ["E1", "E2", "PENDING"])
+        self.assertEqual(outbox.pending_count(), 0)
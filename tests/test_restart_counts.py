@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Restart Regression
+Log entries reloaded from the per-building log files at start-up must not
+be counted again in the hourly rollups or the score statistics.
+"""
+import tempfile
+import unittest
+import uuid
+from datetime import datetime
+
+from benchmarks.common import load_service
+from src.app.core.config import settings
+from src.app.models.door_access import AccessLog, AccessLogType
+
+BUILDINGS = 3
+EVENTS_PER_BUILDING = 800
+
+
+class RestartCountsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._saved = (settings.data_dir, settings.access_log_retention)
+        settings.access_log_retention = 1000
+        self._tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self._tmp.name
+
+    def tearDown(self):
+        settings.data_dir, settings.access_log_retention = self._saved
+        self._tmp.cleanup()
+
+    def _populate(self):
+        service = load_service(self.data_dir)
+        for b in range(BUILDINGS):
+            building = service.create_building(f"Building {b}")
+            door = service.create_door(f"Door {b}", building.id)
+            for _ in range(EVENTS_PER_BUILDING):
+                service._append_access_log(AccessLog(
+                    id=str(uuid.uuid4()), timestamp=datetime.now(), door_id=door.id, building_id=building.id,
+                    event_type=AccessLogType.GRANTED, similarity_score=0.9))
+        service._save_access_logs()
+        service.compact_access_history()
+        service._save_score_stats()
+
+    def _counts(self):
+        service = load_service(self.data_dir)
+        today = service.get_dashboard_stats()["today_access_events"]
+        scored = service.get_score_stats()["count"]
+        service.compact_access_history()
+        service._save_score_stats()
+        return today, scored
+
+    def test_restarts_do_not_recount_retained_logs(self):
+        self._populate()
+        expected = BUILDINGS * EVENTS_PER_BUILDING
+        for _ in range(3):
+            self.assertEqual(self._counts(), (expected, expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Access Schedules
+Compiled minute bitmaps: window bounds, overnight windows, holidays and unions.
+"""
+import unittest
+from datetime import date, datetime, time, timedelta
+
+from src.app.models.door_access import AccessSchedule, ScheduleWindow
+from src.app.services.schedules import compile_schedule, parse_time, union
+
+# 2026-10-19 is a Monday
+MONDAY = date(2026, 10, 19)
+
+
+def at(day: date, hour: int, minute: int = 0, days_later: int = 0) -> datetime:
+    return datetime.combine(day + timedelta(days=days_later), time(hour, minute))
+
+
+def schedule(*windows, holidays=()) -> AccessSchedule:
+    return AccessSchedule(id="sch_test", name="Test", holidays=list(holidays),
+                          windows=[{"days": days, "start": start, "end": end} for days, start, end in windows])
+
+
+class ParseTimeTest(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(parse_time("00:00"), 0)
+        self.assertEqual(parse_time("08:30"), 510)
+        self.assertEqual(parse_time("24:00"), 1440)
+
+    def test_invalid(self):
+        for value in ("24:01", "25:00", "08:60", "-1:00", "noon"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_time(value)
+
+
+class CompileScheduleTest(unittest.TestCase):
+
+    def test_window_is_open_from_start_until_end(self):
+        compiled = compile_schedule(schedule(([0, 2], "08:00", "17:30")))
+        self.assertFalse(compiled.is_open(at(MONDAY, 7, 59)))
+        self.assertTrue(compiled.is_open(at(MONDAY, 8, 0)))
+        self.assertTrue(compiled.is_open(at(MONDAY, 17, 29)))
+        self.assertFalse(compiled.is_open(at(MONDAY, 17, 30)))
+        self.assertFalse(compiled.is_open(at(MONDAY, 12, days_later=1)))
+        self.assertTrue(compiled.is_open(at(MONDAY, 12, days_later=2)))
+
+    def test_whole_day(self):
+        compiled = compile_schedule(schedule(([6], "00:00", "24:00")))
+        self.assertTrue(compiled.is_open(at(MONDAY, 0, 0, days_later=6)))
+        self.assertTrue(compiled.is_open(at(MONDAY, 23, 59, days_later=6)))
+        self.assertFalse(compiled.is_open(at(MONDAY, 0, 0, days_later=7)))
+
+    def test_overnight_window_wraps_from_sunday_to_monday(self):
+        compiled = compile_schedule(schedule(([6], "22:00", "06:00")))
+        sunday = at(MONDAY, 0, days_later=6).date()
+        self.assertTrue(compiled.is_open(at(sunday, 23)))
+        self.assertTrue(compiled.is_open(at(MONDAY, 5, 59)))
+        self.assertFalse(compiled.is_open(at(MONDAY, 6, 0)))
+        self.assertFalse(compiled.is_open(at(sunday, 5)))
+
+    def test_holiday_is_closed(self):
+        holiday = at(MONDAY, 0, days_later=1).date()
+        compiled = compile_schedule(schedule(([0, 1, 2, 3, 4], "08:00", "17:00"), holidays=[holiday]))
+        self.assertTrue(compiled.is_open(at(MONDAY, 9)))
+        self.assertFalse(compiled.is_open(at(holiday, 9)))
+
+    def test_union_is_open_when_any_schedule_is(self):
+        holiday = MONDAY
+        office = compile_schedule(schedule(([0], "08:00", "12:00"), holidays=[holiday]))
+        evening = compile_schedule(schedule(([0], "18:00", "20:00")))
+        combined = union([office, evening, None])
+        self.assertTrue(combined.is_open(at(MONDAY, 19, days_later=7)))
+        self.assertTrue(combined.is_open(at(MONDAY, 9, days_later=7)))
+        # The holiday closes only the schedule that lists it
+        self.assertFalse(combined.is_open(at(holiday, 9)))
+        self.assertTrue(combined.is_open(at(holiday, 19)))
+
+    def test_weekday_out_of_range_is_rejected(self):
+        for days in ([7], [-1]):
+            with self.subTest(days=days):
+                with self.assertRaises(ValueError):
+                    schedule((days, "08:00", "17:00"))
+        unchecked = AccessSchedule.model_construct(
+            id="sch_test", name="Test", holidays=[],
+            windows=[ScheduleWindow.model_construct(days=[7], start="08:00", end="17:00")])
+        with self.assertRaises(ValueError):
+            compile_schedule(unchecked)